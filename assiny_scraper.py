@@ -1,20 +1,41 @@
 # assiny_scraper.py
+import abc
 import json
+import math
 import os
 import re
+import signal
+import subprocess
+import sqlite3
+import argparse
+import base64
+import csv
+import fnmatch
+import functools
 import hashlib
-from datetime import datetime, timezone
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+import weakref
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
 
 from playwright.sync_api import sync_playwright
-from datetime import datetime, timedelta, timezone
 import sys
 
+TZ_BRASILIA = timezone(timedelta(hours=-3))
+
 def now_brasilia_str() -> str:
     """Retorna timestamp no formato 'dd/mm/aaaa - HH:MM' em horário de Brasília (UTC-3)."""
-    tz_brasilia = timezone(timedelta(hours=-3))
-    return datetime.now(tz_brasilia).strftime("%d/%m/%Y - %H:%M")
+    return datetime.now(TZ_BRASILIA).strftime("%d/%m/%Y - %H:%M")
 
 # ====================== CONFIG ======================
 ASSINY_URL = "https://admin.assiny.com.br"           # ajuste se necessário
@@ -22,6 +43,7 @@ TRANSACOES_PATH = "/organizations"            # caminho das transações (exempl
 STORAGE_STATE_FILE = "google_login.json"             # login persistido
 OUTPUT_CSV = "valor_assiny.csv"
 STATE_FILE = "state/latest.json"
+ACCOUNT_NAME = "default"                             # conta gravada no armazenamento
 
 # Se quiser rastrear por produto, liste aqui:
 PRODUTOS = [
@@ -49,7 +71,8 @@ def brl_to_float(txt: str) -> float:
         return 0.0
 
 def ensure_dirs():
-    Path("state").mkdir(exist_ok=True, parents=True)
+    Path(STATE_FILE).parent.mkdir(exist_ok=True, parents=True)
+    Path(OUTPUT_CSV).parent.mkdir(exist_ok=True, parents=True)
 
 def load_last_snapshot() -> Optional[Dict]:
     if not Path(STATE_FILE).exists():
@@ -66,459 +89,4145 @@ def snapshot_hash(snapshot: Dict) -> str:
     payload = json.dumps(snapshot, ensure_ascii=False, sort_keys=True)
     return hashlib.md5(payload.encode("utf-8")).hexdigest()
 
-def append_csv_row(row: Dict[str, str | float]):
-    # Cria CSV (cabeçalho) se não existir
-    header_cols = ["timestamp", "total"] + [f"prod_{i+1}" for i in range(len(PRODUTOS))]
-    if not Path(OUTPUT_CSV).exists():
-        with open(OUTPUT_CSV, "w", encoding="utf-8") as f:
+# ====================== DETECÇÃO DE MUDANÇAS ======================
+# Tolerância absoluta (R$) por campo do snapshot ("total", "prod_N"); JSON no env
+CHANGE_TOLERANCE_DEFAULT = 0.005
+CHANGE_TOLERANCES: Dict[str, float] = json.loads(os.environ.get("ASSINY_TOLERANCES", "{}"))
+# Grava uma linha completa mesmo sem mudança quando a última gravação é mais antiga que isso
+HEARTBEAT_INTERVAL_S = int(os.environ.get("ASSINY_HEARTBEAT_S", str(6 * 3600)))
+
+# Metadados do snapshot que não contam como mudança de valor
+META_FIELDS = ("timestamp", "confidence")
+
+def value_fields(snapshot: Dict) -> List[str]:
+    """Campos de valor do snapshot (tudo exceto timestamp e confiança)."""
+    return [k for k in snapshot if k not in META_FIELDS]
+
+def csv_fields() -> List[str]:
+    """Campos de valor que viram colunas do CSV (totais de períodos extras ficam de fora)."""
+    return ["total"] + [f"prod_{i+1}" for i in range(len(PRODUTOS))]
+
+def changed_fields(anterior: Optional[Dict], atual: Dict,
+                   tolerancias: Optional[Dict[str, float]] = None,
+                   campos: Optional[List[str]] = None) -> List[str]:
+    """
+    Campos cujo valor mudou além da tolerância; o timestamp nunca conta como mudança.
+    `campos` restringe a comparação (ex.: só as colunas que o CSV grava).
+    """
+    candidatos = [c for c in value_fields(atual) if campos is None or c in campos]
+    if not anterior:
+        return candidatos
+    tolerancias = CHANGE_TOLERANCES if tolerancias is None else tolerancias
+    mudaram = []
+    for campo in candidatos:
+        if campo not in anterior:
+            mudaram.append(campo)
+            continue
+        try:
+            diff = abs(float(atual[campo]) - float(anterior[campo]))
+        except (TypeError, ValueError):
+            if atual[campo] != anterior[campo]:
+                mudaram.append(campo)
+            continue
+        if diff > tolerancias.get(campo, CHANGE_TOLERANCE_DEFAULT):
+            mudaram.append(campo)
+    return mudaram
+
+def heartbeat_due(anterior: Optional[Dict], atual: Dict) -> bool:
+    """True se a última gravação (timestamp de `anterior`) passou do intervalo de heartbeat."""
+    if not anterior or "timestamp" not in anterior:
+        return True
+    try:
+        idade = parse_timestamp(atual["timestamp"]) - parse_timestamp(anterior["timestamp"])
+    except (KeyError, ValueError):
+        return True
+    return idade.total_seconds() >= HEARTBEAT_INTERVAL_S
+
+def csv_columns_file() -> Path:
+    """Produto de cada coluna prod_N do CSV (valor_assiny.columns.json)."""
+    return Path(OUTPUT_CSV).with_suffix(".columns.json")
+
+def csv_versions() -> List[str]:
+    """Versões anteriores do CSV, guardadas quando o conjunto de produtos mudou."""
+    csv_path = Path(OUTPUT_CSV)
+    return sorted(str(p) for p in csv_path.parent.glob(f"{csv_path.stem}.v*{csv_path.suffix}"))
+
+def csv_header_products(cabecalho: List[str]) -> Optional[List[str]]:
+    """
+    Produtos das colunas de um CSV sem columns.json: os nomes do cabeçalho, se ele os
+    traz (formato antigo "DataHoraGMT-3,Valor Total,<produtos>"), ou PRODUTOS quando
+    o cabeçalho é prod_N com a mesma quantidade de colunas. None = não dá para saber.
+    """
+    celulas = [c.strip() for c in cabecalho[2:]]
+    if celulas and not any(re.fullmatch(r"prod_\d+", c) for c in celulas):
+        return celulas
+    if len(celulas) == len(PRODUTOS):
+        return list(PRODUTOS)
+    return None
+
+def prepare_csv_header(header_cols: List[str]):
+    """
+    Garante que o cabeçalho do CSV corresponde aos PRODUTOS atuais. Produtos novos
+    no fim só alargam o arquivo (linhas antigas ganham células vazias); qualquer
+    outra mudança (ordem, remoção) arquiva o CSV atual como <nome>.v<data>.csv e
+    começa outro, para prod_N nunca mudar de produto. CSV sem columns.json tem os
+    produtos deduzidos do cabeçalho (ver `csv_header_products`) e é mantido como está.
+    """
+    caminho = Path(OUTPUT_CSV)
+    colunas = csv_columns_file()
+    if caminho.exists():
+        with open(caminho, encoding="utf-8") as f:
+            atual = f.readline().rstrip("\r\n").split(",")
+        try:
+            antigos = json.loads(colunas.read_text(encoding="utf-8"))["products"]
+        except Exception:
+            antigos = csv_header_products(atual)  # CSV anterior ao catálogo
+        if antigos == PRODUTOS:
+            if not colunas.exists():
+                colunas.write_text(json.dumps({"products": PRODUTOS}, ensure_ascii=False, indent=2), encoding="utf-8")
+            return
+        if antigos is not None and PRODUTOS[:len(antigos)] == antigos and len(atual) == len(antigos) + 2:
+            # mantém o estilo do cabeçalho existente (nomes ou prod_N)
+            nomeado = [c.strip() for c in atual[2:]] == antigos
+            novas = PRODUTOS[len(antigos):] if nomeado else header_cols[len(atual):]
+            with open(caminho, encoding="utf-8") as f:
+                linhas = f.read().splitlines()[1:]
+            faltam = "," * len(novas)
+            tmp = caminho.with_name(f".{caminho.name}.{os.getpid()}.tmp")
+            tmp.write_text(",".join(atual + novas) + "\n" + "".join(l + faltam + "\n" for l in linhas), encoding="utf-8")
+            os.replace(tmp, caminho)
+            print(f"[INFO] CSV ampliado para {len(PRODUTOS)} produtos.")
+        else:
+            versao = caminho.with_name(f"{caminho.stem}.v{datetime.now(timezone.utc):%Y%m%dT%H%M%S}{caminho.suffix}")
+            os.replace(caminho, versao)
+            if colunas.exists():
+                os.replace(colunas, versao.with_suffix(".columns.json"))
+            print(f"[WARN] Produtos do CSV mudaram; histórico anterior arquivado em {versao}.")
+    if not caminho.exists():
+        with open(caminho, "w", encoding="utf-8") as f:
             f.write(",".join(header_cols) + "\n")
+    colunas.write_text(json.dumps({"products": PRODUTOS}, ensure_ascii=False, indent=2), encoding="utf-8")
+
+def append_csv_row(row: Dict[str, str | float]):
+    # Cria (ou ajusta) o cabeçalho para os produtos atuais
+    header_cols = ["timestamp"] + csv_fields()
+    prepare_csv_header(header_cols)
     # Ordena e escreve
     values = [str(row.get(col, "")) for col in header_cols]
     with open(OUTPUT_CSV, "a", encoding="utf-8") as f:
         f.write(",".join(values) + "\n")
 
-def safe_text(page, selector: str, timeout: int = 5000) -> str:
+# ====================== ARMAZENAMENTO ======================
+# "csv": valor_assiny.csv + state/latest.json (padrão, formato antigo)
+# "sqlite": banco em WAL com colunas tipadas e índice por tempo/produto
+# "parquet": dataset Arrow particionado (um arquivo por lote, requer pyarrow)
+STORE_BACKEND = os.environ.get("ASSINY_STORE", "csv")
+STORE_PATHS = {"sqlite": "state/snapshots.db", "parquet": "state/snapshots_parquet"}
+# Cada execução grava um arquivo pequeno; acima disso, o dataset é compactado num só
+PARQUET_COMPACT_FILES = int(os.environ.get("ASSINY_PARQUET_COMPACT_FILES", "32"))
+LEGACY_HISTORY_CSV = "valor_assiny_history.csv"
+# Nomes reservados na coluna de produto: valor total e confiança da gravação (0 a 1)
+TOTAL_KEY = "__total__"
+CONFIDENCE_KEY = "__confidence__"
+
+def parse_timestamp(txt: str) -> datetime:
+    """Aceita 'dd/mm/aaaa - HH:MM' (Brasília) ou ISO 8601; sem fuso = UTC."""
+    txt = txt.strip()
     try:
-        el = page.wait_for_selector(selector, timeout=timeout)
-        return el.inner_text().strip()
-    except:
-        return ""
+        return datetime.strptime(txt, "%d/%m/%Y - %H:%M").replace(tzinfo=TZ_BRASILIA)
+    except ValueError:
+        pass
+    dt = datetime.fromisoformat(txt)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
 
-def unlock_transactions_page(page) -> bool:
+def snapshot_to_rows(snapshot: Dict, produtos: Optional[List[str]] = None,
+                     account: Optional[str] = None, campos: Optional[List[str]] = None) -> List[tuple]:
     """
-    Fluxo de desbloqueio atualizado e mais estável:
-    - Verifica se a página já está liberada (link final visível);
-    - Clica na sequência correta com esperas dinâmicas;
-    - Retorna True mesmo que algumas etapas já estejam liberadas.
+    Snapshot ('total', 'prod_N') -> linhas (ts, conta, produto, valor) em formato longo.
+    `campos` restringe a gravação aos campos que mudaram (delta).
+    """
+    produtos = PRODUTOS if produtos is None else produtos
+    account = account or ACCOUNT_NAME
+    ts = int(parse_timestamp(snapshot["timestamp"]).timestamp())
+    rows = []
+    if campos is None or "total" in campos:
+        rows.append((ts, account, TOTAL_KEY, float(snapshot["total"])))
+    # totais de períodos extras ('total_today' -> '__total__:today')
+    for campo in snapshot:
+        if campo.startswith("total_") and (campos is None or campo in campos):
+            rows.append((ts, account, f"{TOTAL_KEY}:{campo[6:]}", float(snapshot[campo])))
+    for i, nome in enumerate(produtos):
+        chave = f"prod_{i+1}"
+        if chave in snapshot and (campos is None or chave in campos):
+            rows.append((ts, account, nome, float(snapshot[chave])))
+    if rows and "confidence" in snapshot:
+        rows.append((ts, account, CONFIDENCE_KEY, float(snapshot["confidence"])))
+    return rows
+
+def rows_to_snapshot(rows: List[tuple], produtos: Optional[List[str]] = None) -> Optional[Dict]:
+    """
+    Inverso de `snapshot_to_rows`. Aceita o último valor de cada produto vindo de
+    instantes diferentes (store em delta); o timestamp é o da gravação mais recente.
     """
+    if not rows:
+        return None
+    produtos = PRODUTOS if produtos is None else produtos
+    ts = max(r[0] for r in rows)
+    valores = {r[2]: r[3] for r in rows}
+    snapshot: Dict[str, float | str] = {
+        "timestamp": datetime.fromtimestamp(ts, TZ_BRASILIA).strftime("%d/%m/%Y - %H:%M"),
+        "total": valores.get(TOTAL_KEY, 0.0),
+    }
+    for i, nome in enumerate(produtos):
+        if nome in valores:
+            snapshot[f"prod_{i+1}"] = valores[nome]
+    for nome, valor in valores.items():
+        if nome.startswith(TOTAL_KEY + ":"):
+            snapshot["total_" + nome[len(TOTAL_KEY) + 1:]] = valor
+    if CONFIDENCE_KEY in valores:
+        snapshot["confidence"] = valores[CONFIDENCE_KEY]
+    return snapshot
+
+@contextmanager
+def file_lock(caminho: Path):
+    """Lock exclusivo (flock) num arquivo: vale entre processos do --jobs e entre threads."""
+    caminho.parent.mkdir(parents=True, exist_ok=True)
     try:
-        print("[INFO] Desbloqueio: iniciando verificação...")
+        import fcntl
+    except ImportError:  # Windows: sem lock entre processos
+        fcntl = None
+    with open(caminho, "a+") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
 
-        # Seletores principais
-        second_btn = (
-            "body > div:nth-child(1) > main > section.sectionContent > section > div > "
-            "table > tbody > tr > td.sc-1b6ce047-7.cFNGWb.last-item > button"
-        )
-        third_btn = (
-            "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > main > div > "
-            "section > div > table > tbody > tr > td.sc-1b6ce047-7.cFNGWb.last-item > div > button"
-        )
-        final_link = (
-            "body > div:nth-child(1) > div > div.sc-a939683d-0.kLVHsl > "
-            "div.sc-a939683d-2.enkYbp > div.sc-a939683d-3.fzYEAU > div > a:nth-child(7)"
-        )
+class SnapshotStore(abc.ABC):
+    """
+    Interface comum dos backends. Linhas são (ts_epoch_utc, conta, produto, valor);
+    `append` acumula em memória e grava em lote no `flush` (ou ao atingir `batch_size`).
+    """
 
-        # 1️⃣ Verifica se o link final já está disponível
-        if page.locator(final_link).count() and page.locator(final_link).is_visible():
-            print("[STEP 1] Link final já disponível → clicando...")
-            page.click(final_link)
-            page.wait_for_load_state("networkidle")
-            print("[SUCCESS] Página de transações liberada.")
-            return True
+    def __init__(self, batch_size: int = 500):
+        self.batch_size = batch_size
+        self._buffer: List[tuple] = []
 
-        # 2️⃣ Clica no botão da tabela principal (espera ativa até 12s)
-        if page.locator(second_btn).count():
-            print("[STEP 2] Aguardando o botão da tabela principal ficar visível...")
-            encontrado = False
-            for _ in range(12):  # tenta 12 vezes (1s cada)
-                if page.locator(second_btn).is_visible():
-                    encontrado = True
-                    break
-                page.wait_for_timeout(1000)
-            if encontrado:
-                print("[STEP 2] Clicando no botão da tabela principal...")
-                try:
-                    page.click(second_btn, timeout=0)
-                    page.wait_for_load_state("domcontentloaded")
-                    page.wait_for_timeout(2500)
-                except Exception as e:
-                    print(f"[WARN] Falha ao clicar no botão principal: {e}")
-            else:
-                print("[WARN] Botão da tabela principal não apareceu após 12s, seguindo assim mesmo.")
-        else:
-            print("[INFO] Botão principal não encontrado, talvez já esteja na próxima etapa.")
+    def append(self, rows: List[tuple]):
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
 
-        # 3️⃣ Clica no botão interno (aguarda visibilidade até 6s)
-        if page.locator(third_btn).count():
-            try:
-                page.wait_for_selector(third_btn, timeout=6000)
-                print("[STEP 3] Clicando no botão interno da nova tabela...")
-                page.click(third_btn)
-                page.wait_for_load_state("domcontentloaded")
-                page.wait_for_timeout(2000)
-            except:
-                print("[WARN] Botão interno não apareceu a tempo, seguindo...")
-        else:
-            print("[INFO] Botão interno não encontrado, talvez já esteja na tela final.")
+    def append_snapshot(self, snapshot: Dict, campos: Optional[List[str]] = None):
+        self.append(snapshot_to_rows(snapshot, campos=campos))
 
-        # 4️⃣ Clica no link final (aguarda visibilidade até 8s)
+    def flush(self):
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = []
+
+    @abc.abstractmethod
+    def _write(self, rows: List[tuple]):
+        """Grava um lote de linhas de uma vez."""
+
+    @abc.abstractmethod
+    def query(self, product: Optional[str] = None, start: Optional[datetime] = None,
+              end: Optional[datetime] = None, account: Optional[str] = None) -> List[tuple]:
+        """Linhas da conta no intervalo [start, end), ordenadas por tempo e produto."""
+
+    @abc.abstractmethod
+    def latest_snapshot(self, account: Optional[str] = None) -> Optional[Dict]:
+        """Último valor de cada produto da conta, montado como snapshot."""
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class SQLiteStore(SnapshotStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS snapshots (
+            ts      INTEGER NOT NULL,   -- epoch UTC em segundos
+            account TEXT    NOT NULL,
+            product TEXT    NOT NULL,   -- '__total__' para o total
+            value   REAL    NOT NULL,
+            PRIMARY KEY (account, product, ts)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_snapshots_ts ON snapshots (ts);
+    """
+
+    def __init__(self, path: str = STORE_PATHS["sqlite"], batch_size: int = 500):
+        super().__init__(batch_size)
+        Path(path).parent.mkdir(exist_ok=True, parents=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def _write(self, rows: List[tuple]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO snapshots (ts, account, product, value) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def query(self, product=None, start=None, end=None, account=None) -> List[tuple]:
+        self.flush()
+        sql = "SELECT ts, account, product, value FROM snapshots WHERE account = ?"
+        params: List = [account or ACCOUNT_NAME]
+        if product is not None:
+            sql += " AND product = ?"
+            params.append(product)
+        if start is not None:
+            sql += " AND ts >= ?"
+            params.append(int(start.timestamp()))
+        if end is not None:
+            sql += " AND ts < ?"
+            params.append(int(end.timestamp()))
+        return self.conn.execute(sql + " ORDER BY ts, product", params).fetchall()
+
+    def latest_snapshot(self, account=None) -> Optional[Dict]:
+        self.flush()
+        # última linha de cada produto (o store guarda só deltas + heartbeats);
+        # no SQLite, as colunas "soltas" vêm da linha que tem o MAX(ts)
+        rows = self.conn.execute(
+            "SELECT MAX(ts), account, product, value FROM snapshots WHERE account = ? GROUP BY product",
+            (account or ACCOUNT_NAME,),
+        ).fetchall()
+        return rows_to_snapshot(rows)
+
+    def close(self):
+        super().close()
+        self.conn.close()
+
+class ParquetStore(SnapshotStore):
+    """
+    Um arquivo Parquet por lote (append sem reescrever nada); leitura via pyarrow.dataset.
+    Acima de PARQUET_COMPACT_FILES arquivos, o dataset é regravado num só; o último valor
+    de cada produto fica num sidecar (latest.json) para não varrer o dataset a cada coleta.
+    """
+    LATEST_NAME = "latest.json"
+
+    def __init__(self, path: str = STORE_PATHS["parquet"], batch_size: int = 500,
+                 compact_files: Optional[int] = None):
+        import pyarrow as pa  # só é necessário no backend "parquet"
+
+        super().__init__(batch_size)
+        self.path = Path(path)
+        self.path.mkdir(exist_ok=True, parents=True)
+        self.compact_files = PARQUET_COMPACT_FILES if compact_files is None else compact_files
+        self.schema = pa.schema([
+            ("ts", pa.int64()),
+            ("account", pa.string()),
+            ("product", pa.string()),
+            ("value", pa.float64()),
+        ])
+
+    def _lock(self):
+        return file_lock(self.path / ".lock")
+
+    def _parts(self) -> List[Path]:
+        return sorted(self.path.glob("*.parquet"))
+
+    def _write_table(self, rows: List[tuple], nome: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        colunas = list(zip(*rows))
+        tabela = pa.Table.from_arrays([pa.array(c) for c in colunas], schema=self.schema)
+        # ordenado por produto/tempo: as estatísticas de row group viram um índice barato
+        tabela = tabela.sort_by([("product", "ascending"), ("ts", "ascending")])
+        tmp = self.path / (nome + ".tmp")
+        pq.write_table(tabela, tmp)
+        os.replace(tmp, self.path / nome)
+
+    def _write(self, rows: List[tuple]):
+        with self._lock():
+            self._write_table(rows, f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet")
+            self._update_latest(rows)
+            if len(self._parts()) > self.compact_files:
+                self.compact()
+
+    def compact(self):
+        """Regrava o dataset num único arquivo (chave conta/produto/instante, último vence)."""
+        antigos = self._parts()
+        if len(antigos) < 2:
+            return
+        unicas = {(r[1], r[2], r[0]): r for r in self._scan()}
+        self._write_table(list(unicas.values()), f"part-{int(time.time() * 1000)}-compact.parquet")
+        for arquivo in antigos:
+            arquivo.unlink()
+        print(f"[INFO] Parquet compactado: {len(antigos)} arquivos -> 1 ({len(unicas)} linhas).")
+
+    def _scan(self, filtro=None) -> List[tuple]:
+        import pyarrow.dataset as ds
+
+        if not self._parts():
+            return []
+        tabela = ds.dataset([str(p) for p in self._parts()], schema=self.schema,
+                            format="parquet").to_table(filter=filtro)
+        tabela = tabela.sort_by([("ts", "ascending"), ("product", "ascending")])
+        return list(zip(*(tabela.column(c).to_pylist() for c in ("ts", "account", "product", "value"))))
+
+    def _load_latest(self) -> Optional[Dict]:
         try:
-            page.wait_for_selector(final_link, timeout=8000)
-            print("[STEP 4] Clicando no link final...")
-            page.click(final_link)
-            page.wait_for_load_state("networkidle")
-            print("[SUCCESS] Página de transações liberada.")
-            return True
-        except:
-            print("[INFO] Link final não apareceu, talvez já esteja na página de destino.")
+            return json.loads((self.path / self.LATEST_NAME).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[WARN] {self.LATEST_NAME} ilegível ({e}); será reconstruído do dataset.")
+            return None
 
-        return True
+    def _update_latest(self, rows: List[tuple]):
+        latest = self._load_latest()
+        if latest is None:
+            # sidecar ausente: reconstrói a partir do dataset (que já inclui `rows`)
+            latest = {}
+            rows = self._scan()
+        for ts, conta, produto, valor in rows:
+            atual = latest.setdefault(conta, {}).get(produto)
+            if atual is None or ts >= atual[0]:
+                latest[conta][produto] = [ts, valor]
+        tmp = self.path / (self.LATEST_NAME + ".tmp")
+        tmp.write_text(json.dumps(latest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path / self.LATEST_NAME)
 
-    except Exception as e:
-        print(f"[ERROR] Falha no desbloqueio: {e}")
-        return False
+    def query(self, product=None, start=None, end=None, account=None) -> List[tuple]:
+        import pyarrow.dataset as ds
+
+        self.flush()
+        filtro = ds.field("account") == (account or ACCOUNT_NAME)
+        if product is not None:
+            filtro &= ds.field("product") == product
+        if start is not None:
+            filtro &= ds.field("ts") >= int(start.timestamp())
+        if end is not None:
+            filtro &= ds.field("ts") < int(end.timestamp())
+        return self._scan(filtro)
 
+    def latest_snapshot(self, account=None) -> Optional[Dict]:
+        self.flush()
+        account = account or ACCOUNT_NAME
+        latest = self._load_latest()
+        if latest is None:
+            if not self._parts():
+                return None
+            with self._lock():
+                self._update_latest([])
+            latest = self._load_latest() or {}
+        return rows_to_snapshot([(ts, account, produto, valor)
+                                 for produto, (ts, valor) in latest.get(account, {}).items()])
 
-from datetime import datetime
+def open_store(backend: Optional[str] = None, path: Optional[str] = None) -> SnapshotStore:
+    backend = backend or STORE_BACKEND
+    if backend == "sqlite":
+        return SQLiteStore(path or STORE_PATHS["sqlite"])
+    if backend == "parquet":
+        return ParquetStore(path or STORE_PATHS["parquet"])
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend!r}")
 
-def aplicar_filtro_calendario(page):
+def read_legacy_csv(path: str) -> List[Dict]:
     """
-    Seleciona o intervalo fixo de 1º de janeiro de 2025 até 10 de outubro de 2025.
-    Clica corretamente no '1' do calendário que contém 'Janeiro 2025' e aplica o filtro.
+    Lê os CSVs antigos como snapshots. As colunas são posicionais (data, total,
+    produtos na ordem de PRODUTOS), pois os dois arquivos têm cabeçalhos diferentes.
     """
-    from datetime import datetime
-    import unicodedata
+    return read_legacy_csv_tail(path)[0]
 
-    try:
-        hoje = datetime.now()
-        mes_inicial = "janeiro"
-        ano_inicial = "2025"
+def read_legacy_csv_tail(path: str, offset: int = 0) -> tuple:
+    """Como `read_legacy_csv`, a partir do byte `offset`; devolve (snapshots, novo offset)."""
+    if not Path(path).exists():
+        return [], 0
+    with open(path, "rb") as f:
+        f.seek(offset)
+        dados = f.read()
+    # linha final sem '\n' pode estar sendo escrita: fica para a próxima leitura
+    fim = dados.rfind(b"\n") + 1
+    linhas = dados[:fim].decode("utf-8").splitlines()
+    if offset == 0:
+        linhas = linhas[1:]
+    snapshots = []
+    for linha in csv.reader(linhas):
+        if len(linha) < 2 or not linha[0].strip():
+            continue
+        try:
+            ts = parse_timestamp(linha[0])
+        except ValueError:
+            print(f"[WARN] {path}: data inválida ignorada: {linha[0]!r}")
+            continue
+        snapshot: Dict[str, float | str] = {
+            "timestamp": ts.astimezone(TZ_BRASILIA).strftime("%d/%m/%Y - %H:%M"),
+            "total": brl_to_float(linha[1]),
+        }
+        for i, valor in enumerate(linha[2:2 + len(PRODUTOS)]):
+            if valor.strip():
+                snapshot[f"prod_{i+1}"] = brl_to_float(valor)
+        snapshots.append(snapshot)
+    return snapshots, offset + fim
 
-        print(f"[STEP] Aplicando filtro via calendário (01/{mes_inicial.capitalize()}/{ano_inicial} → {hoje.strftime('%d/%m/%Y')})")
+def migrate_csvs(store: SnapshotStore, paths: Optional[List[str]] = None) -> int:
+    """Importa os dois CSVs históricos para o store (idempotente: chave = conta/produto/instante)."""
+    paths = paths or [LEGACY_HISTORY_CSV, OUTPUT_CSV]
+    total = 0
+    for path in paths:
+        snapshots = read_legacy_csv(path)
+        for snap in snapshots:
+            store.append_snapshot(snap)
+        total += len(snapshots)
+        print(f"[INFO] Migração: {len(snapshots)} snapshots lidos de {path}")
+    store.flush()
+    return total
 
-        # 1️⃣ Abre o seletor de período
-        filtro_botao = page.locator(
-            "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > "
-            "div > section.sectionContent > div > div.sc-901aedfc-0.hankki > "
-            "div.sc-901aedfc-2.jJUZpK > span:nth-child(2) > div > div > button"
-        )
-        filtro_botao.wait_for(state="visible", timeout=45000)
-        filtro_botao.click()
-        page.wait_for_timeout(1500)
+# ====================== CONSULTAS ======================
+# Resoluções nomeadas de reamostragem; também aceita qualquer intervalo de `parse_interval`
+QUERY_FREQS = {"hourly": 3600, "daily": 86400}
+QUERY_METRICS = ("value", "delta", "rate")
 
-        # Função auxiliar para normalizar texto (remove acentos, deixa minúsculo)
-        def normalizar(txt):
-            return "".join(
-                c for c in unicodedata.normalize("NFD", txt.strip().lower())
-                if unicodedata.category(c) != "Mn"
-            )
+def series_name(product: str) -> str:
+    """Coluna `product` do store -> nome da série ('total', 'total:<período>' ou o produto)."""
+    if product == TOTAL_KEY:
+        return "total"
+    if product == CONFIDENCE_KEY:
+        return "confidence"
+    if product.startswith(TOTAL_KEY + ":"):
+        return "total:" + product[len(TOTAL_KEY) + 1:]
+    return product
 
-        # 2️⃣ Retrocede até exibir Janeiro/2025 em algum calendário
-        tentativas = 0
-        while True:
-            captions = page.locator(".rdp-caption_label").all_inner_texts()
-            captions_norm = [normalizar(cap) for cap in captions]
-            if any(mes_inicial in cap and ano_inicial in cap for cap in captions_norm):
-                print(f"[OK] Encontrado mês inicial nos calendários: {captions_norm}")
-                break
-            page.click("button[name='previous-month']")
-            page.wait_for_timeout(200)
-            tentativas += 1
-            if tentativas > 60:
-                raise Exception(f"Não encontrou {mes_inicial}/{ano_inicial} após 60 tentativas")
+class SeriesIndex:
+    """
+    Histórico em colunas NumPy: `ts` (epoch UTC, crescente) e `values` (uma coluna
+    por série, com o último valor conhecido propagado, já que o store grava só
+    deltas e heartbeats). `refresh` lê só o que chegou desde a chamada anterior.
+    """
 
-        # 3️⃣ Localiza o container do mês 'Janeiro 2025' e clica no dia 1 exato dentro dele
-        meses = page.locator(".rdp-month")
-        clicou = False
+    def __init__(self, source: str = "store", account: Optional[str] = None):
+        import numpy as np  # só é necessário para as consultas
 
-        for i in range(meses.count()):
-            try:
-                caption = meses.nth(i).locator(".rdp-caption_label")
-                if caption.count() == 0:
-                    continue
-                caption_text = normalizar(caption.first.inner_text())
-                if mes_inicial in caption_text and ano_inicial in caption_text:
-                    print(f"[OK] Container correto localizado: {caption_text}")
-
-                    # Encontra todos os dias e garante que o texto seja exatamente "1"
-                    dias = meses.nth(i).locator(".rdp-day")
-                    for j in range(dias.count()):
-                        dia = dias.nth(j)
-                        dia_texto = dia.inner_text().strip()
-                        if dia_texto == "1":
-                            dia.scroll_into_view_if_needed()
-                            dia.click(force=True)
-                            print(f"[OK] Clicou no dia 1 exato de {mes_inicial}/{ano_inicial}.")
-                            clicou = True
-                            break
-                    break
-            except Exception as e:
-                print(f"[DEBUG] Erro ao tentar clicar no mês {i}: {e}")
+        self.source = source          # "store" (ASSINY_STORE) ou "csv" (arquivos antigos)
+        self.account = account or ACCOUNT_NAME
+        self.names: List[str] = []
+        self._coluna: Dict[str, int] = {}
+        self.ts = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, 0))
+        self._offsets: Dict[str, int] = {}
 
-        if not clicou:
-            raise Exception("Não conseguiu clicar no dia 1 exato de Janeiro/2025.")
+    def _reset(self):
+        self.__init__(self.source, self.account)
 
-        page.wait_for_timeout(800)
+    def _new_rows(self) -> List[tuple]:
+        if self.source == "csv":
+            rows = []
+            for path in (LEGACY_HISTORY_CSV, OUTPUT_CSV):
+                snaps, self._offsets[path] = read_legacy_csv_tail(path, self._offsets.get(path, 0))
+                for snap in snaps:
+                    rows.extend(snapshot_to_rows(snap, account=self.account))
+            return rows
+        inicio = datetime.fromtimestamp(int(self.ts[-1]) + 1, timezone.utc) if len(self.ts) else None
+        with open_store() as store:
+            return store.query(start=inicio, account=self.account)
 
-        # 4️⃣ (opcional) Se quiser, pode clicar direto em “Aplicar”
-        aplicar_btn = (
-            ".Button-apply > button.sc-8a29c332-0.kjexZj.size-sm.radius-rounded."
-            "type-accent.width-stretch.iconPosition-left.periodButton"
-        )
-        page.locator(aplicar_btn).click(force=True)
-        page.wait_for_load_state("networkidle")
-        page.wait_for_timeout(1500)
-        print("[OK] Filtro de calendário (Janeiro/2025 → Atual) aplicado com sucesso.")
+    def refresh(self, full: bool = False) -> "SeriesIndex":
+        import numpy as np
 
-    except Exception as e:
-        print(f"[ERROR] Falha ao aplicar filtro via calendário: {e}")
+        # CSV truncado/reescrito: os offsets guardados não valem mais
+        if any(Path(p).exists() and Path(p).stat().st_size < off for p, off in self._offsets.items()):
+            full = True
+        if full:
+            self._reset()
+        rows = self._new_rows()
+        if not rows:
+            return self
+        n = len(rows)
+        ts = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        if len(self.ts) and ts.min() <= self.ts[-1]:
+            # chegou algo fora de ordem (ex.: migração de CSV antigo): reconstrói do zero
+            return self.refresh(full=True)
+        for r in rows:
+            nome = series_name(r[2])
+            if nome not in self._coluna:
+                self._coluna[nome] = len(self.names)
+                self.names.append(nome)
+        col = np.fromiter((self._coluna[series_name(r[2])] for r in rows), dtype=np.int64, count=n)
+        val = np.fromiter((r[3] for r in rows), dtype=np.float64, count=n)
 
+        novos_ts, linha = np.unique(ts, return_inverse=True)
+        bloco = np.full((len(novos_ts), len(self.names)), np.nan)
+        bloco[linha, col] = val
+        antigos = self.values
+        if antigos.shape[1] < len(self.names):
+            antigos = np.hstack([antigos, np.full((len(antigos), len(self.names) - antigos.shape[1]), np.nan)])
+        # só o trecho novo (mais a última linha antiga, de onde vem o valor propagado)
+        cauda = np.vstack([antigos[-1:], bloco])
+        cauda = forward_fill(cauda)[1:] if len(antigos) else forward_fill(bloco)
+        self.values = np.vstack([antigos, cauda])
+        self.ts = np.concatenate([self.ts, novos_ts])
+        return self
 
-def clear_product_selection(page):
-    """Remove qualquer seleção anterior no react-select (multi ou single)."""
-    try:
-        # Remove chips se existirem
-        for _ in range(10):
-            remover = page.locator(".react-select__multi-value__remove")
-            if remover.count() == 0:
-                break
-            remover.first.click()
-            page.wait_for_timeout(120)
+    def select(self, series: Optional[List[str]] = None, start: Optional[datetime] = None,
+               end: Optional[datetime] = None) -> tuple:
+        """(ts, nomes, valores) de [start, end) para as séries pedidas (nome, 'prod_N' ou 'total')."""
+        import numpy as np
 
-        # Botão de limpar (single select)
-        clear_btn = page.locator(".react-select__clear-indicator")
-        if clear_btn.count() > 0 and clear_btn.first.is_visible():
-            clear_btn.first.click(force=True)
-            page.wait_for_timeout(300)
+        nomes = self.names if not series else [self._resolve_name(s) for s in series]
+        i0 = 0 if start is None else int(np.searchsorted(self.ts, int(start.timestamp()), "left"))
+        i1 = len(self.ts) if end is None else int(np.searchsorted(self.ts, int(end.timestamp()), "left"))
+        colunas = [self._coluna[n] for n in nomes]
+        return self.ts[i0:i1], nomes, self.values[i0:i1][:, colunas]
 
-        # Reabrir o campo pra garantir foco
-        value_container = (
-            "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > div > "
-            "section.sectionContent > div > div.sc-901aedfc-0.hankki > "
-            "div.sc-b1ed7421-0.lbZwDZ > div.sc-b1ed7421-2.eEgcfp > div > "
-            "div.sc-b1ed7421-9.jdpVbC > div > div > div.filter-middle_selects > "
-            "div:nth-child(2) > div > div > div.react-select__value-container.css-1lm0gyh"
-        )
-        page.click(value_container)
-        page.wait_for_timeout(300)
-    except Exception as e:
-        print(f"[DEBUG] clear_product_selection: {e}")
+    def _resolve_name(self, nome: str) -> str:
+        m = re.fullmatch(r"prod_(\d+)", nome)
+        if m and 0 < int(m.group(1)) <= len(PRODUTOS):
+            nome = PRODUTOS[int(m.group(1)) - 1]
+        if nome not in self._coluna:
+            raise KeyError(f"Série desconhecida: {nome!r} (disponíveis: {', '.join(self.names)})")
+        return nome
 
-def select_product_option(page, nome):
-    """Abre o dropdown, digita e clica a opção exata no menu do react-select."""
-    # Abre o dropdown (seletor que você passou)
-    value_container = (
-        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > div > "
-        "section.sectionContent > div > div.sc-901aedfc-0.hankki > "
-        "div.sc-b1ed7421-0.lbZwDZ > div.sc-b1ed7421-2.eEgcfp > div > "
-        "div.sc-b1ed7421-9.jdpVbC > div > div > div.filter-middle_selects > "
-        "div:nth-child(2) > div > div > div.react-select__value-container.css-1lm0gyh"
-    )
-    page.click(value_container)
-    page.wait_for_timeout(150)
+def forward_fill(values):
+    """Propaga o último valor não-NaN de cada coluna para baixo (vetorizado)."""
+    import numpy as np
 
-    # Digita o nome e espera o menu abrir
-    page.keyboard.press("Control+A")
-    page.keyboard.type(nome)
-    page.wait_for_selector(".react-select__menu", timeout=5000)
+    if not len(values):
+        return values
+    linhas = np.arange(len(values))[:, None]
+    idx = np.maximum.accumulate(np.where(np.isnan(values), 0, linhas), axis=0)
+    return values[idx, np.arange(values.shape[1])]
 
-    # Clica a opção exata no menu
-    menu_option = page.locator(".react-select__menu").get_by_text(nome, exact=True)
-    menu_option.click(force=True)
-    page.wait_for_timeout(200)
+def resample_last(ts, values, step_s: int) -> tuple:
+    """Último valor de cada intervalo de `step_s` (alinhado ao horário de Brasília)."""
+    import numpy as np
 
-def apply_filters_panel(page):
-    """Clica no botão Aplicar do painel de filtros."""
-    aplicar_filtro_btn = (
-        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > "
-        "div > section.sectionContent > div > div.sc-901aedfc-0.hankki > "
-        "div.sc-b1ed7421-0.lbZwDZ > div.sc-b1ed7421-2.eEgcfp > div > "
-        "div.sc-b1ed7421-5.kALddI > button"
-    )
-    btn = page.locator(aplicar_filtro_btn)
-    btn.click()
-    page.wait_for_timeout(400)
-    # clica novamente se ainda estiver visível
-    if btn.is_visible():
-        btn.click()
-    page.wait_for_timeout(800)
-
-def wait_for_valor_atualizado(page, selector: str, timeout_ms: int = 15000):
-    print("[INFO] Aguardando valor 'R$' aparecer no campo...")
-    inicio = datetime.now()
-    while (datetime.now() - inicio).total_seconds() * 1000 < timeout_ms:
-        txt = safe_text(page, selector)
-        if "R$" in txt:
-            print(f"[OK] Valor carregado: {txt}")
-            return txt
-        page.wait_for_timeout(500)
-    print("[WARN] Tempo limite atingido, 'R$' não encontrado.")
-    return safe_text(page, selector)
+    if not len(ts):
+        return ts, values
+    deslocamento = int(TZ_BRASILIA.utcoffset(None).total_seconds())
+    balde = (ts + deslocamento) // step_s
+    ultimos = np.flatnonzero(np.diff(balde, append=balde[-1] + 1))
+    return balde[ultimos] * step_s - deslocamento, values[ultimos]
 
-# ====================== SCRAPER ======================
-def fetch_snapshot(page) -> Dict:
-    page.goto(ASSINY_URL + TRANSACOES_PATH, wait_until="domcontentloaded")
-    page.wait_for_timeout(1200)
-    unlock_transactions_page(page)
+def rolling(values, janela: int, soma: bool = False):
+    """Soma ou média móvel de `janela` pontos; NaN enquanto a janela não estiver completa."""
+    import numpy as np
 
-    # Aguarda página carregar completamente após desbloqueio
-    page.wait_for_load_state("networkidle")
+    validos = ~np.isnan(values)
+    zeros = np.zeros((1, values.shape[1]))
+    acumulado = np.vstack([zeros, np.cumsum(np.where(validos, values, 0.0), axis=0)])
+    contagem = np.vstack([zeros, np.cumsum(validos, axis=0)])
+    total = acumulado[janela:] - acumulado[:-janela]
+    n = contagem[janela:] - contagem[:-janela]
+    saida = np.full(values.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        saida[janela - 1:] = np.where(n == janela, total if soma else total / n, np.nan)
+    return saida
 
-    # ===============================
-    # (A) Selecionar "Desde Sempre"
-    # ===============================
-    try:
-        aplicar_filtro_calendario(page)
+class SeriesResult:
+    """Resultado de `query_series`: `ts` (epoch UTC), `names` e `values` (linhas x séries)."""
 
-        # 4️⃣ validação visual: verificar se o filtro foi aplicado
-        try:
-            filtro_label = (
-                "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > "
-                "div > section.sectionContent > div > div.sc-901aedfc-0.hankki > "
-                "div.sc-901aedfc-2.jJUZpK > span:nth-child(2) > div > div > button"
-            )
+    def __init__(self, ts, names: List[str], values, metric: str):
+        self.ts = ts
+        self.names = names
+        self.values = values
+        self.metric = metric
 
-            page.wait_for_selector(filtro_label, timeout=10000)
-            filtro_text = page.locator(filtro_label).inner_text().strip()
+    def rows(self) -> List[Dict]:
+        import numpy as np
 
-            if "-" in filtro_text:
-                print(f"[OK] Filtro de data aplicado com sucesso → '{filtro_text}'")
-            else:
-                print(f"[WARN] O filtro parece não ter sido aplicado corretamente. Texto atual: '{filtro_text}'")
-        except Exception as e:
-            print(f"[WARN] Não foi possível validar o filtro aplicado: {e}")
+        saida = []
+        for t, linha in zip(self.ts.tolist(), self.values.tolist()):
+            registro = {"timestamp": datetime.fromtimestamp(t, TZ_BRASILIA).isoformat()}
+            registro.update({n: (None if np.isnan(v) else round(v, 2)) for n, v in zip(self.names, linha)})
+            saida.append(registro)
+        return saida
 
-        print("[OK] Filtro 'Desde sempre' aplicado com sucesso.")
+_SERIES_CACHE: Dict[tuple, SeriesIndex] = {}
 
-    except Exception as e:
-        print(f"[WARN] Falha ao aplicar filtro de data: {e}")
+def series_index(source: Optional[str] = None, account: Optional[str] = None) -> SeriesIndex:
+    """Índice em memória por fonte/conta, reaproveitado entre consultas e atualizado a cada uso."""
+    source = source or ("csv" if STORE_BACKEND == "csv" else "store")
+    chave = (source, STORE_BACKEND, account or ACCOUNT_NAME)
+    if chave not in _SERIES_CACHE:
+        _SERIES_CACHE[chave] = SeriesIndex(source, account)
+    return _SERIES_CACHE[chave].refresh()
 
+def query_series(series: Optional[List[str]] = None, start: Optional[datetime] = None,
+                 end: Optional[datetime] = None, freq: Optional[str] = None, metric: str = "value",
+                 window: Optional[int] = None, account: Optional[str] = None,
+                 source: Optional[str] = None) -> SeriesResult:
+    """
+    Séries do histórico, opcionalmente reamostradas (`freq`: 'hourly', 'daily', '15m'...).
+    `metric`: 'value' (acumulado), 'delta' (variação entre pontos) ou 'rate' (R$/hora).
+    `window`: média móvel de N pontos (soma móvel para 'delta').
+    """
+    import numpy as np
 
-    # ===============================
-    # (B) Ler valor líquido total (com espera dinâmica)
-    # ===============================
-    total_selector = (
-        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > div > "
-        "section.sectionContent > div > div.sc-6b5fc9f9-0.fgkMrj > "
-        "div:nth-child(1) > div:nth-child(1) > div:nth-child(1) > "
-        "div.sc-6b5fc9f9-7.blobef > div:nth-child(1) > div"
-    )
+    if metric not in QUERY_METRICS:
+        raise ValueError(f"Métrica inválida: {metric!r} (use {', '.join(QUERY_METRICS)})")
+    ts, nomes, valores = series_index(source, account).select(series, start, end)
+    if freq:
+        ts, valores = resample_last(ts, valores, int(QUERY_FREQS.get(freq) or parse_interval(freq)))
+    if metric != "value" and len(ts):
+        deltas = np.vstack([np.full((1, valores.shape[1]), np.nan), np.diff(valores, axis=0)])
+        if metric == "rate":
+            horas = np.concatenate([[np.nan], np.diff(ts) / 3600.0])[:, None]
+            deltas = deltas / horas
+        valores = deltas
+    if window and window > 1 and len(ts):
+        valores = rolling(valores, window, soma=(metric == "delta"))
+    return SeriesResult(ts, nomes, valores, metric)
 
-    total_txt = wait_for_valor_atualizado(page, total_selector)
-    total_val = brl_to_float(total_txt)
+def parse_query_time(txt: str) -> datetime:
+    """'dd/mm/aaaa' ou 'aaaa-mm-dd' (meia-noite em Brasília), ou qualquer formato de `parse_timestamp`."""
+    txt = txt.strip()
+    for formato in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(txt, formato).replace(tzinfo=TZ_BRASILIA)
+        except ValueError:
+            pass
+    return parse_timestamp(txt)
 
-    # ===============================
-    # (C) Filtro por produto (robusto)
-    # ===============================
-    produtos_vals: List[float] = []
+def print_series(resultado: SeriesResult, formato: str = "table"):
+    linhas = resultado.rows()
+    if formato == "json":
+        print(json.dumps(linhas, ensure_ascii=False, indent=2))
+        return
+    colunas = ["timestamp"] + resultado.names
+    if formato == "csv":
+        escritor = csv.DictWriter(sys.stdout, fieldnames=colunas)
+        escritor.writeheader()
+        escritor.writerows(linhas)
+        return
+    larguras = [max(16, len(c)) for c in colunas]
+    print("  ".join(c.rjust(w) for c, w in zip(colunas, larguras)))
+    for l in linhas:
+        data = datetime.fromisoformat(l["timestamp"]).strftime("%d/%m/%Y %H:%M")
+        valores = ["" if l[n] is None else f"{l[n]:.2f}" for n in resultado.names]
+        print("  ".join(v.rjust(w) for v, w in zip([data] + valores, larguras)))
 
-    # botão que abre o painel de filtros
-    open_filters_btn = (
-        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > div > "
-        "section.sectionContent > div > div.sc-901aedfc-0.hankki > "
-        "div.sc-901aedfc-2.jJUZpK > span:nth-child(2) > button"
+def run_query_cli(args: argparse.Namespace):
+    inicio = time.perf_counter()
+    resultado = query_series(
+        series=[s.strip() for s in args.series.split(",")] if args.series else None,
+        start=parse_query_time(args.start) if args.start else None,
+        end=parse_query_time(args.end) if args.end else None,
+        freq=args.freq,
+        metric=args.metric,
+        window=args.window,
+        account=args.account,
+        source=args.source,
     )
+    if args.last:
+        resultado = SeriesResult(resultado.ts[-args.last:], resultado.names,
+                                 resultado.values[-args.last:], resultado.metric)
+    print_series(resultado, args.format)
+    print(f"[INFO] {len(resultado.ts)} linhas x {len(resultado.names)} séries em "
+          f"{(time.perf_counter() - inicio) * 1000:.1f} ms.", file=sys.stderr)
 
-    for nome in PRODUTOS:
-        try:
-            print(f"[INFO] Aplicando filtro de produto: {nome}")
+def safe_text(page, selector: str, timeout: int = 5000) -> str:
+    try:
+        el = page.wait_for_selector(selector, timeout=timeout)
+        return el.inner_text().strip()
+    except:
+        return ""
 
-            # Abre painel
-            page.click(open_filters_btn)
-            page.wait_for_timeout(700)
+# ====================== ESPERAS ======================
+# Orçamento de latência da execução inteira (todas as esperas somadas)
+RUN_BUDGET_MS = int(os.environ.get("ASSINY_RUN_BUDGET_MS", "600000"))
 
-            # Limpa seleção anterior
-            clear_product_selection(page)
+class LatencyBudgetExceeded(Exception):
+    """O orçamento de latência da execução acabou."""
 
-            # Seleciona o produto exato
-            select_product_option(page, nome)
+class LatencyBudget:
+    """
+    Tempo restante da execução e saldo das esperas por condição em relação
+    às pausas fixas (`wait_for_timeout`) que elas substituíram.
 
-            # Aplica (com dupla tentativa)
-            apply_filters_panel(page)
-            page.wait_for_timeout(1000)
+    `record` conta toda espera em `chamadas`/`espera_total_ms` (o que o bench compara
+    entre execuções); só as com `nominal_ms` (as que substituíram uma pausa fixa)
+    entram em `esperas` e no saldo do relatório [BUDGET].
+    """
 
-            # Espera valor renderizar
-            curr_val_txt = wait_for_valor_atualizado(page, total_selector)
+    def __init__(self, total_ms: int = RUN_BUDGET_MS):
+        self.total_ms = total_ms
+        self.inicio = time.monotonic()
+        self.economizado_ms = 0.0
+        self.esperas = 0          # esperas que substituíram uma pausa fixa
+        self.chamadas = 0         # todas as esperas
+        self.espera_total_ms = 0.0
+        self._lock = threading.Lock()
 
-            # Se falhou, tenta forçar render
-            if not curr_val_txt or "R$" not in curr_val_txt:
-                print("[INFO] Tentando forçar render clicando fora do painel...")
-                page.mouse.click(50, 50)
-                page.wait_for_timeout(1500)
-                curr_val_txt = wait_for_valor_atualizado(page, total_selector)
+    def remaining_ms(self) -> int:
+        return int(self.total_ms - (time.monotonic() - self.inicio) * 1000)
 
-            if not curr_val_txt:
-                print(f"[WARN] Nenhum valor retornado para '{nome}', aplicando 0.0")
-                produtos_vals.append(0.0)
-                continue
+    def cap(self, timeout_ms: int) -> int:
+        """Limita um timeout ao que resta do orçamento (nunca 0, que no Playwright é 'sem limite')."""
+        restante = self.remaining_ms()
+        if restante <= 0:
+            raise LatencyBudgetExceeded(f"orçamento de {self.total_ms} ms esgotado")
+        return max(1, min(timeout_ms, restante))
 
-            # Converte valor capturado
-            p_val = brl_to_float(curr_val_txt)
-            produtos_vals.append(p_val)
-            print(f"[OK] Valor final para '{nome}': {p_val}")
+    def record(self, nominal_ms: Optional[int], gasto_ms: float):
+        with self._lock:
+            self.chamadas += 1
+            self.espera_total_ms += gasto_ms
+            if nominal_ms is None:
+                return
+            self.esperas += 1
+            self.economizado_ms += nominal_ms - gasto_ms
 
-        except Exception as e:
-            print(f"[ERROR] Falha ao coletar produto '{nome}': {e}")
-            produtos_vals.append(0.0)
+    def report(self):
+        gasto_s = (time.monotonic() - self.inicio)
+        print(
+            f"[BUDGET] {self.esperas} esperas por condição, saldo de {self.economizado_ms / 1000:+.1f}s "
+            f"vs. pausas fixas; {gasto_s:.1f}s de {self.total_ms / 1000:.0f}s usados."
+        )
 
-    # ===============================
-    # (D) Monta snapshot final
-    # ===============================
-    snapshot: Dict[str, float | str] = {
-        "timestamp": now_brasilia_str(),
-        "total": round(total_val, 2),
-    }
+BUDGET = LatencyBudget()
 
-    for i, val in enumerate(produtos_vals):
-        snapshot[f"prod_{i+1}"] = round(val, 2)
+def reset_latency_budget(total_ms: int = RUN_BUDGET_MS) -> LatencyBudget:
+    """Reinicia o orçamento no começo de cada execução."""
+    global BUDGET
+    BUDGET = LatencyBudget(total_ms)
+    return BUDGET
 
-    print(f"[SUMMARY] Snapshot final: {snapshot}")
-    return snapshot
+def wait_ready(page, selector: str, state: str = "visible",
+               nominal_ms: Optional[int] = None, timeout_ms: int = 5000) -> bool:
+    """
+    Espera `selector` chegar em `state` ('attached', 'detached', 'visible', 'hidden').
+    `nominal_ms` é a pausa fixa que a espera substitui (só para o relatório).
+    """
+    inicio = time.monotonic()
+    try:
+        page.wait_for_selector(selector, state=state, timeout=BUDGET.cap(timeout_ms))
+        ok = True
+    except LatencyBudgetExceeded:
+        raise
+    except Exception:
+        ok = False
+    BUDGET.record(nominal_ms, (time.monotonic() - inicio) * 1000)
+    return ok
 
+def wait_condition(page, expression: str, arg=None,
+                   nominal_ms: Optional[int] = None, timeout_ms: int = 5000):
+    """Como `wait_ready`, para uma expressão JS; devolve o valor truthy retornado ou None."""
+    inicio = time.monotonic()
+    try:
+        handle = page.wait_for_function(expression, arg=arg, timeout=BUDGET.cap(timeout_ms))
+        valor = handle.json_value()
+    except LatencyBudgetExceeded:
+        raise
+    except Exception:
+        valor = None
+    BUDGET.record(nominal_ms, (time.monotonic() - inicio) * 1000)
+    return valor
 
-def main():
-    with sync_playwright() as p:
-        # 🔹 Importante: carregar o storage_state antes de criar a página
-        browser = p.chromium.launch(headless=("--headed" not in sys.argv))
-        context = browser.new_context(storage_state="google_login.json")
-        page = context.new_page()
+# ====================== INSTRUMENTAÇÃO ======================
+# Um JSON por execução com os spans de cada etapa/produto
+TRACE_FILE = "state/traces.jsonl"
+# Execuções mantidas no arquivo (no CI ele vai e volta pelo cache a cada execução)
+TRACE_KEEP_RUNS = int(os.environ.get("ASSINY_TRACE_KEEP", "2000"))
+# Trace do Playwright (.zip) e HAR ficam aqui quando a execução é lenta
+TRACE_DIR = "state/traces"
+# "off" (padrão); "auto": grava leve (sem screenshots/DOM) e só mantém se passar do limite;
+# "always": grava completo e sempre mantém
+PLAYWRIGHT_TRACE_MODE = os.environ.get("ASSINY_PW_TRACE", "off")
+PLAYWRIGHT_TRACE_HAR = os.environ.get("ASSINY_PW_HAR", "0") == "1"
+SLOW_RUN_THRESHOLD_S = float(os.environ.get("ASSINY_SLOW_RUN_S", "300"))
 
-        # 🔹 Acesse diretamente o painel já autenticado
-        page.goto("https://admin.assiny.com.br")
-        page.wait_for_load_state("networkidle")
-        page.wait_for_timeout(2000)
-        print("[INFO] Página carregada, verificando autenticação...")
+class RunTrace:
+    """Spans (context managers) de uma execução, com requisições e bytes vistos em cada um."""
 
-        # Se ainda estiver na tela de login, logins expiraram
-        if "login" in page.url:
-            print("[ERROR] Sessão expirada. É necessário gerar um novo google_login.json.")
-            return
+    def __init__(self):
+        self.run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:6]
+        self.iniciado_em = datetime.now(timezone.utc).isoformat()
+        self.inicio = time.monotonic()
+        self.spans: List[Dict] = []
+        self.requests = 0
+        self.bytes = 0
+        # [requisições, bytes] por página de coleta (ver `watch_page`)
+        self.por_worker: Dict[str, List[int]] = {}
+        self.bloqueadas = 0
+        # por tipo de recurso; bytes não: o corpo de uma requisição abortada nunca é visto
+        self.bloqueadas_por_tipo: Dict[str, int] = {}
+        self.sessao: Dict = {}
+        self.catalogo_erros = 0   # opções que não estavam no índice do catálogo
+        self.artefatos: List[str] = []
+        self._lock = threading.Lock()
 
+    def elapsed_s(self) -> float:
+        return time.monotonic() - self.inicio
 
-        print("✅ Login carregado com sucesso!")
-        snapshot = fetch_snapshot(page)
+    def count_request(self, request, worker: Optional[str] = None):
+        # tamanhos medidos pelo navegador (corpo recebido + cabeçalhos): vale também
+        # para respostas chunked/comprimidas, que não trazem content-length
+        try:
+            sizes = request.sizes()
+            tamanho = max(0, sizes.get("responseBodySize", 0)) + max(0, sizes.get("responseHeadersSize", 0))
+        except Exception:
+            try:
+                resposta = request.response()
+                tamanho = int((resposta.headers if resposta else {}).get("content-length") or 0)
+            except Exception:
+                tamanho = 0
+        with self._lock:
+            self.requests += 1
+            self.bytes += tamanho
+            if worker:
+                contador = self.por_worker.setdefault(worker, [0, 0])
+                contador[0] += 1
+                contador[1] += tamanho
 
-        context.close()
-        browser.close()
+    def count_blocked(self, tipo: str):
+        with self._lock:
+            self.bloqueadas += 1
+            self.bloqueadas_por_tipo[tipo] = self.bloqueadas_por_tipo.get(tipo, 0) + 1
 
-    # ======================
-    #  Comparação e registro
-    # ======================
-    ensure_dirs()
-    last_snapshot = load_last_snapshot()
-    last_hash = snapshot_hash(last_snapshot) if last_snapshot else None
+    def _contadores(self, worker: Optional[str]) -> tuple:
+        with self._lock:
+            if worker:
+                return tuple(self.por_worker.get(worker, (0, 0)))
+            return self.requests, self.bytes
 
-    current_hash = snapshot_hash(snapshot)
-    changed = current_hash != last_hash
+    def open_span(self, nome: str, **attrs) -> Dict:
+        """
+        Começa um span fechado depois por `close_span` (fases intercaladas de várias
+        páginas). Com `worker`, conta só as requisições daquela página.
+        """
+        return {"name": nome, "_inicio": time.monotonic(), "_base": self._contadores(attrs.get("worker")), **attrs}
 
-    if changed:
-        append_csv_row(snapshot)
-        save_snapshot(snapshot)
-        print("[INFO] Mudança detectada. CSV e estado atualizados.")
+    def close_span(self, registro: Dict, erro: Optional[BaseException] = None):
+        inicio, (req0, bytes0) = registro.pop("_inicio"), registro.pop("_base")
+        requests, total_bytes = self._contadores(registro.get("worker"))
+        registro.update({
+            "start_ms": round((inicio - self.inicio) * 1000, 1),
+            "duration_ms": round((time.monotonic() - inicio) * 1000, 1),
+            "requests": requests - req0,
+            "bytes": total_bytes - bytes0,
+            "thread": threading.current_thread().name,
+            "ok": erro is None,
+        })
+        if erro is not None:
+            registro["error"] = f"{type(erro).__name__}: {erro}"
+        with self._lock:
+            self.spans.append(registro)
 
-        # Commit/push automático no GitHub Actions
+    @contextmanager
+    def span(self, nome: str, **attrs):
+        registro = self.open_span(nome, **attrs)
         try:
-            os.system('git config user.name "github-actions"')
-            os.system('git config user.email "github-actions@github.com"')
-            os.system(f'git add "{OUTPUT_CSV}" "{STATE_FILE}"')
-            os.system('git commit -m "assiny-scraper: mudança detectada, histórico atualizado"')
-            os.system('git pull --rebase origin main')
-            os.system('git push origin main')
+            yield
+        except BaseException as e:
+            self.close_span(registro, e)
+            raise
+        self.close_span(registro)
 
+    def finish(self, ok: bool = True, path: str = TRACE_FILE) -> Dict:
+        registro = {
+            "run_id": self.run_id,
+            "account": ACCOUNT_NAME,
+            "started_at": self.iniciado_em,
+            "duration_ms": round(self.elapsed_s() * 1000, 1),
+            "ok": ok,
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "blocked_requests": self.bloqueadas,
+            "blocked_by_type": self.bloqueadas_por_tipo,
+            "session": self.sessao,
+            "catalog_misses": self.catalogo_erros,
+            "artifacts": self.artefatos,
+            "spans": sorted(self.spans, key=lambda s: s["start_ms"]),
+        }
+        try:
+            Path(path).parent.mkdir(exist_ok=True, parents=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            trim_trace_file(path)
         except Exception as e:
-            print(f"[WARN] Falha ao commitar/push: {e}")
+            print(f"[DEBUG] Não foi possível gravar trace: {e}")
+        print(f"[TRACE] {self.run_id}: {registro['duration_ms'] / 1000:.1f}s, "
+              f"{self.requests} requisições, {self.bytes / 1024:.0f} KiB, {len(self.spans)} spans.")
+        if self.bloqueadas:
+            tipos = ", ".join(f"{t}: {n}" for t, n in sorted(self.bloqueadas_por_tipo.items()))
+            print(f"[TRACE] {self.bloqueadas} requisições bloqueadas ({tipos}).")
+        return registro
+
+TRACE = RunTrace()
+
+def start_trace() -> RunTrace:
+    """Novo trace no começo de cada execução (one-shot, ciclo do daemon ou conta)."""
+    global TRACE
+    TRACE = RunTrace()
+    return TRACE
+
+def span(nome: str, **attrs):
+    return TRACE.span(nome, **attrs)
+
+def traced(nome: str):
+    """Decorator: a função inteira vira um span."""
+    def decorador(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(nome):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorador
+
+def watch_page(page, worker: str = "main"):
+    """Conta requisições/bytes da página no trace corrente (resolvido a cada evento)."""
+    page.on("requestfinished", lambda request: TRACE.count_request(request, worker))
+
+def playwright_har_options() -> Dict:
+    """Opções de `new_context` para gravar HAR (descartado no fim se a execução for rápida)."""
+    if not PLAYWRIGHT_TRACE_HAR or PLAYWRIGHT_TRACE_MODE == "off":
+        return {}
+    Path(TRACE_DIR).mkdir(exist_ok=True, parents=True)
+    return {"record_har_path": str(Path(TRACE_DIR) / f"{TRACE.run_id}.har"), "record_har_content": "omit"}
+
+def keep_slow_run() -> bool:
+    return PLAYWRIGHT_TRACE_MODE == "always" or (
+        PLAYWRIGHT_TRACE_MODE == "auto" and TRACE.elapsed_s() >= SLOW_RUN_THRESHOLD_S
+    )
+
+def start_playwright_trace(context):
+    if PLAYWRIGHT_TRACE_MODE == "off":
+        return
+    completo = PLAYWRIGHT_TRACE_MODE == "always"
+    try:
+        context.tracing.start(screenshots=completo, snapshots=completo)
+    except Exception as e:
+        print(f"[DEBUG] tracing.start: {e}")
+
+def stop_playwright_trace(context):
+    """Salva o trace do Playwright só se a execução passou do limite (modo 'auto')."""
+    if PLAYWRIGHT_TRACE_MODE == "off":
+        return
+    try:
+        if keep_slow_run():
+            Path(TRACE_DIR).mkdir(exist_ok=True, parents=True)
+            destino = str(Path(TRACE_DIR) / f"{TRACE.run_id}.zip")
+            context.tracing.stop(path=destino)
+            TRACE.artefatos.append(destino)
+            print(f"[TRACE] Execução lenta ({TRACE.elapsed_s():.0f}s); trace salvo em {destino}")
+        else:
+            context.tracing.stop()
+    except Exception as e:
+        print(f"[DEBUG] tracing.stop: {e}")
+
+def finish_har(opcoes: Dict):
+    """Chamar depois de `context.close()` (quando o HAR é escrito)."""
+    caminho = opcoes.get("record_har_path")
+    if not caminho or not Path(caminho).exists():
+        return
+    if keep_slow_run():
+        TRACE.artefatos.append(caminho)
     else:
-        print("[INFO] Sem mudanças. Nada a registrar.")
+        Path(caminho).unlink()
+
+def percentile(valores: List[float], p: float) -> float:
+    """Percentil por posição mais próxima (nearest-rank)."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return 0.0
+    k = max(0, min(len(ordenados) - 1, math.ceil(p / 100 * len(ordenados)) - 1))
+    return ordenados[k]
+
+def trim_trace_file(path: str = TRACE_FILE, manter: Optional[int] = None):
+    """Descarta as execuções mais antigas além de TRACE_KEEP_RUNS (0 = sem limite)."""
+    manter = TRACE_KEEP_RUNS if manter is None else manter
+    if manter <= 0:
+        return
+    with open(path, encoding="utf-8") as f:
+        linhas = f.readlines()
+    if len(linhas) <= manter:
+        return
+    tmp = Path(path).with_name(f".{Path(path).name}.{os.getpid()}.tmp")
+    tmp.write_text("".join(linhas[-manter:]), encoding="utf-8")
+    os.replace(tmp, path)
+
+def trace_summary(path: str = TRACE_FILE, ultimas: Optional[int] = None) -> List[Dict]:
+    """p50/p95 por span (somando repetições dentro da mesma execução) ao longo das execuções."""
+    if not Path(path).exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        execucoes = [json.loads(linha) for linha in f if linha.strip()]
+    if ultimas:
+        execucoes = execucoes[-ultimas:]
+    por_nome: Dict[str, List[float]] = {"(execução)": []}
+    requisicoes: Dict[str, List[int]] = {"(execução)": []}
+    for run in execucoes:
+        por_nome["(execução)"].append(run["duration_ms"])
+        requisicoes["(execução)"].append(run.get("requests", 0))
+        soma: Dict[str, float] = {}
+        reqs: Dict[str, int] = {}
+        for sp in run.get("spans", []):
+            soma[sp["name"]] = soma.get(sp["name"], 0.0) + sp["duration_ms"]
+            reqs[sp["name"]] = reqs.get(sp["name"], 0) + sp.get("requests", 0)
+        for nome, dur in soma.items():
+            por_nome.setdefault(nome, []).append(dur)
+            requisicoes.setdefault(nome, []).append(reqs[nome])
+    linhas = []
+    for nome, duracoes in por_nome.items():
+        if not duracoes:
+            continue
+        linhas.append({
+            "name": nome,
+            "runs": len(duracoes),
+            "p50_ms": percentile(duracoes, 50),
+            "p95_ms": percentile(duracoes, 95),
+            "max_ms": max(duracoes),
+            "requests_p50": percentile(requisicoes[nome], 50),
+        })
+    return sorted(linhas, key=lambda l: -l["p95_ms"])
+
+def print_trace_summary(path: str = TRACE_FILE, ultimas: Optional[int] = None):
+    linhas = trace_summary(path, ultimas)
+    if not linhas:
+        print(f"[INFO] Nenhum trace em {path}.")
+        return
+    largura = max(len(l["name"]) for l in linhas)
+    print(f"{'etapa'.ljust(largura)}  {'runs':>5}  {'p50 (s)':>8}  {'p95 (s)':>8}  {'máx (s)':>8}  {'req p50':>7}")
+    for l in linhas:
+        print(f"{l['name'].ljust(largura)}  {l['runs']:>5}  {l['p50_ms'] / 1000:>8.2f}  "
+              f"{l['p95_ms'] / 1000:>8.2f}  {l['max_ms'] / 1000:>8.2f}  {l['requests_p50']:>7}")
+
+# ====================== PERFIL ENXUTO ======================
+# "lean": bloqueia o que não afeta os valores e abre um Chromium mais leve
+# (pensado para runners pequenos de CI); "default": navegador padrão
+BROWSER_PROFILE = os.environ.get("ASSINY_BROWSER_PROFILE", "default")
+BLOCKED_RESOURCE_TYPES = {
+    t.strip() for t in os.environ.get("ASSINY_BLOCK_TYPES", "image,media,font,manifest,texttrack").split(",")
+    if t.strip()
+}
+# Analytics, pixels e widgets de terceiros (qualquer tipo de recurso); o env acrescenta
+BLOCKED_DOMAINS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googleadservices.com",
+    "facebook.net", "connect.facebook.net", "hotjar.com", "clarity.ms", "segment.io",
+    "segment.com", "mixpanel.com", "amplitude.com", "intercom.io", "intercomcdn.com",
+    "hs-scripts.com", "hs-analytics.net", "analytics.tiktok.com", "fullstory.com",
+) + tuple(d.strip() for d in os.environ.get("ASSINY_BLOCK_DOMAINS", "").split(",") if d.strip())
+LEAN_LAUNCH_ARGS = [
+    "--disable-gpu",
+    "--disable-dev-shm-usage",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--no-first-run",
+    "--mute-audio",
+    "--renderer-process-limit=2",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication",
+]
+LEAN_VIEWPORT = {"width": 1280, "height": 720}
+
+def lean_profile() -> bool:
+    return BROWSER_PROFILE == "lean"
+
+def blocked_request(request) -> bool:
+    host = urlparse(request.url).hostname or ""
+    if any(host == d or host.endswith("." + d) for d in BLOCKED_DOMAINS):
+        return True
+    return request.resource_type in BLOCKED_RESOURCE_TYPES
+
+def install_resource_blocking(context):
+    """Aborta no contexto inteiro (páginas extras inclusas) o que `blocked_request` recusa."""
+    def rota(route):
+        request = route.request
+        if blocked_request(request):
+            TRACE.count_blocked(request.resource_type)
+            route.abort()
+        else:
+            route.continue_()
+    context.route("**/*", rota)
+
+def launch_browser(playwright, headless: bool = True):
+    """Chromium com as flags do perfil atual."""
+    args = list(LEAN_LAUNCH_ARGS if lean_profile() else [])
+    return playwright.chromium.launch(headless=headless, args=args)
+
+def new_scraping_context(browser, storage_state, **opcoes):
+    """`new_context` com o perfil atual; no enxuto, tela menor, escala 1 e bloqueio de recursos."""
+    if lean_profile():
+        opcoes = {
+            "viewport": LEAN_VIEWPORT,
+            "device_scale_factor": 1,
+            "reduced_motion": "reduce",
+            "service_workers": "block",
+            **opcoes,
+        }
+    context = browser.new_context(storage_state=storage_state, **opcoes)
+    context.add_init_script(JS_REDE_INIT)
+    if lean_profile():
+        install_resource_blocking(context)
+    return context
+
+# ====================== SELETORES ======================
+# Último seletor que funcionou para cada elemento (persistido entre execuções)
+SELECTOR_CACHE_FILE = "state/selectors.json"
+
+# Estratégias por elemento lógico, da mais específica à mais genérica.
+# Aceitam a sintaxe de seletores do Playwright (css, role=, text=); as classes
+# "sc-xxxx-N" são estáveis, o sufixo hash ao lado delas muda a cada deploy.
+# "total_value" é lido via document.querySelector, então só aceita CSS.
+SELECTOR_STRATEGIES: Dict[str, List[str]] = {
+    "total_value": [
+        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > div > "
+        "section.sectionContent > div > div.sc-6b5fc9f9-0.fgkMrj > "
+        "div:nth-child(1) > div:nth-child(1) > div:nth-child(1) > "
+        "div.sc-6b5fc9f9-7.blobef > div:nth-child(1) > div",
+        "section.sectionContent div[class*='sc-6b5fc9f9-7'] > div:nth-child(1) > div",
+    ],
+    "open_filters": [
+        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > div > "
+        "section.sectionContent > div > div.sc-901aedfc-0.hankki > "
+        "div.sc-901aedfc-2.jJUZpK > span:nth-child(2) > button",
+        "section.sectionContent div[class*='sc-901aedfc-2'] > span:nth-child(2) > button",
+    ],
+    "period_button": [
+        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > "
+        "div > section.sectionContent > div > div.sc-901aedfc-0.hankki > "
+        "div.sc-901aedfc-2.jJUZpK > span:nth-child(2) > div > div > button",
+        "section.sectionContent div[class*='sc-901aedfc-2'] > span:nth-child(2) > div > div > button",
+    ],
+    "product_select": [
+        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > div > "
+        "section.sectionContent > div > div.sc-901aedfc-0.hankki > "
+        "div.sc-b1ed7421-0.lbZwDZ > div.sc-b1ed7421-2.eEgcfp > div > "
+        "div.sc-b1ed7421-9.jdpVbC > div > div > div.filter-middle_selects > "
+        "div:nth-child(2) > div > div > div.react-select__value-container.css-1lm0gyh",
+        ".filter-middle_selects > div:nth-child(2) .react-select__value-container",
+    ],
+    "apply_filters": [
+        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > div > "
+        "div > section.sectionContent > div > div.sc-901aedfc-0.hankki > "
+        "div.sc-b1ed7421-0.lbZwDZ > div.sc-b1ed7421-2.eEgcfp > div > "
+        "div.sc-b1ed7421-5.kALddI > button",
+        "section.sectionContent div[class*='sc-b1ed7421-5'] > button",
+    ],
+    "calendar_apply": [
+        ".Button-apply > button.sc-8a29c332-0.kjexZj.size-sm.radius-rounded."
+        "type-accent.width-stretch.iconPosition-left.periodButton",
+        ".Button-apply > button.periodButton",
+        ".Button-apply > button",
+    ],
+    "unlock_org_button": [
+        "body > div:nth-child(1) > main > section.sectionContent > section > div > "
+        "table > tbody > tr > td.sc-1b6ce047-7.cFNGWb.last-item > button",
+        "main > section.sectionContent table > tbody > tr > td.last-item > button",
+    ],
+    "unlock_inner_button": [
+        "body > div:nth-child(1) > div > div.sc-88f1a04b-3.waZHj > main > main > div > "
+        "section > div > table > tbody > tr > td.sc-1b6ce047-7.cFNGWb.last-item > div > button",
+        "main > main table > tbody > tr > td.last-item > div > button",
+    ],
+    "transactions_link": [
+        "body > div:nth-child(1) > div > div.sc-a939683d-0.kLVHsl > "
+        "div.sc-a939683d-2.enkYbp > div.sc-a939683d-3.fzYEAU > div > a:nth-child(7)",
+        "div[class*='sc-a939683d-3'] > div > a:nth-child(7)",
+    ],
+}
+
+# Últimos recursos, por texto/papel e restritos ao contêiner do elemento (o "Aplicar"
+# do calendário não serve como o do painel de filtros). Nunca vão para o cache:
+# se casarem com o elemento errado, o erro não se repete nas próximas execuções.
+SELECTOR_FALLBACKS: Dict[str, List[str]] = {
+    "open_filters": ["section.sectionContent div[class*='sc-901aedfc-2'] >> role=button[name=/^filtros?$/i]"],
+    "apply_filters": ["div[class*='sc-b1ed7421-2'] >> role=button[name=/^aplicar$/i]"],
+    "transactions_link": ["div[class*='sc-a939683d'] >> role=link[name=/^transa[cç][oõ]es$/i]"],
+}
+
+class SelectorRegistry:
+    """
+    Resolve elementos lógicos testando todas as estratégias de uma vez
+    (`locator.or_`), com timeout curto, e lembra qual funcionou.
+    Um seletor desatualizado custa milissegundos, não o timeout inteiro.
+    """
+
+    def __init__(self, estrategias: Dict[str, List[str]], cache_file: str = SELECTOR_CACHE_FILE,
+                 fallbacks: Optional[Dict[str, List[str]]] = None):
+        self.estrategias = estrategias
+        self.cache_file = cache_file
+        self.fallbacks = SELECTOR_FALLBACKS if fallbacks is None else fallbacks
+        # seletor que casou por último nesta execução (inclui fallbacks, que não vão ao cache)
+        self._casou: Dict[str, str] = {}
+        self._avisados: set = set()
+        self._lock = threading.Lock()
+        try:
+            self.cache: Dict[str, str] = json.loads(Path(cache_file).read_text(encoding="utf-8"))
+        except Exception:
+            self.cache = {}
+
+    def ranked(self, nome: str) -> List[str]:
+        """Estratégias do elemento, com a última que funcionou na frente; fallbacks no fim."""
+        lista = list(self.estrategias[nome])
+        ultimo = self.cache.get(nome)
+        if ultimo in lista:
+            lista.remove(ultimo)
+            lista.insert(0, ultimo)
+        return lista + list(self.fallbacks.get(nome, []))
+
+    def get(self, nome: str) -> str:
+        """Melhor palpite sem tocar na página (para esperas de 'hidden'/'detached')."""
+        return self.ranked(nome)[0]
+
+    def _remember(self, nome: str, seletor: str):
+        with self._lock:
+            self._casou[nome] = seletor
+            if seletor in self.fallbacks.get(nome, []):
+                if nome not in self._avisados:
+                    self._avisados.add(nome)
+                    print(f"[WARN] '{nome}' só casou pelo fallback genérico ({seletor}); atualize SELECTOR_STRATEGIES.")
+                return
+            if self.cache.get(nome) == seletor:
+                return
+            if nome in self.cache:
+                print(f"[INFO] Seletor de '{nome}' mudou; usando estratégia alternativa.")
+            self.cache[nome] = seletor
+            try:
+                destino = Path(self.cache_file)
+                destino.parent.mkdir(exist_ok=True, parents=True)
+                # um temporário por processo: contas do --jobs gravam o mesmo cache ao mesmo tempo
+                tmp = destino.with_suffix(f".{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(self.cache, ensure_ascii=False, indent=2), encoding="utf-8")
+                tmp.replace(destino)
+            except Exception as e:
+                print(f"[DEBUG] Não foi possível salvar cache de seletores: {e}")
+
+    def _match(self, page, seletor: str, state: str) -> bool:
+        loc = page.locator(seletor)
+        if state == "visible":
+            return loc.first.is_visible()
+        return loc.count() > 0
+
+    def find(self, page, nome: str, state: str = "attached") -> Optional[str]:
+        """Estratégia que já casa agora (sem esperar), ou None."""
+        for seletor in self.ranked(nome):
+            try:
+                if self._match(page, seletor, state):
+                    self._remember(nome, seletor)
+                    return seletor
+            except Exception:
+                continue
+        return None
+
+    def resolve_any(self, page, nomes: List[str], state: str = "visible",
+                    timeout_ms: int = 5000, nominal_ms: Optional[int] = None) -> Optional[str]:
+        """Espera qualquer estratégia de qualquer elemento de `nomes`; devolve o nome que apareceu."""
+        inicio = time.monotonic()
+        uniao = None
+        for nome in nomes:
+            for seletor in self.ranked(nome):
+                loc = page.locator(seletor)
+                uniao = loc if uniao is None else uniao.or_(loc)
+        achado = None
+        try:
+            uniao.first.wait_for(state=state, timeout=BUDGET.cap(timeout_ms))
+            achado = next((n for n in nomes if self.find(page, n, state)), None)
+        except LatencyBudgetExceeded:
+            raise
+        except Exception:
+            pass
+        BUDGET.record(nominal_ms, (time.monotonic() - inicio) * 1000)
+        return achado
+
+    def resolve(self, page, nome: str, state: str = "visible",
+                timeout_ms: int = 5000, nominal_ms: Optional[int] = None) -> Optional[str]:
+        """Espera o elemento e devolve o seletor da estratégia que casou, ou None."""
+        if self.resolve_any(page, [nome], state, timeout_ms, nominal_ms):
+            return self._casou.get(nome)
+        return None
+
+    def sel(self, page, nome: str, timeout_ms: int = 5000) -> str:
+        """Como `resolve`, mas cai no melhor palpite (o erro aparece na ação seguinte)."""
+        return self.resolve(page, nome, timeout_ms=timeout_ms) or self.get(nome)
+
+SELECTORS = SelectorRegistry(SELECTOR_STRATEGIES)
+
+class SessionExpired(Exception):
+    """A sessão do storage_state não é mais válida (API recusou ou caiu no login)."""
+
+# Verdadeiro quando o app decidiu: foi para o login ou montou o layout autenticado
+JS_AUTH_RESOLVIDA = (
+    "() => location.href.includes('login') || !!document.querySelector('main, .sectionContent')"
+)
+
+@traced("unlock_transactions_page")
+def unlock_transactions_page(page) -> bool:
+    """
+    Fluxo de desbloqueio atualizado e mais estável:
+    - Verifica se a página já está liberada (link final visível);
+    - Clica na sequência correta com esperas dinâmicas;
+    - Retorna True mesmo que algumas etapas já estejam liberadas.
+    """
+    try:
+        print("[INFO] Desbloqueio: iniciando verificação...")
+
+        # 1️⃣ Verifica se o link final já está disponível
+        final_link = SELECTORS.find(page, "transactions_link", state="visible")
+        if final_link:
+            print("[STEP 1] Link final já disponível → clicando...")
+            page.click(final_link)
+            SELECTORS.resolve(page, "period_button", nominal_ms=2000, timeout_ms=45000)
+            print("[SUCCESS] Página de transações liberada.")
+            return True
+
+        # 2️⃣ Clica no botão da tabela principal (espera ativa até 12s)
+        if SELECTORS.find(page, "unlock_org_button"):
+            print("[STEP 2] Aguardando o botão da tabela principal ficar visível...")
+            second_btn = SELECTORS.resolve(page, "unlock_org_button", timeout_ms=12000)
+            if second_btn:
+                print("[STEP 2] Clicando no botão da tabela principal...")
+                try:
+                    page.click(second_btn, timeout=BUDGET.cap(30000))
+                    # próxima etapa: botão interno ou link final
+                    SELECTORS.resolve_any(page, ["unlock_inner_button", "transactions_link"],
+                                          state="attached", nominal_ms=2500, timeout_ms=8000)
+                except LatencyBudgetExceeded:
+                    raise
+                except Exception as e:
+                    print(f"[WARN] Falha ao clicar no botão principal: {e}")
+            else:
+                print("[WARN] Botão da tabela principal não apareceu após 12s, seguindo assim mesmo.")
+        else:
+            print("[INFO] Botão principal não encontrado, talvez já esteja na próxima etapa.")
+
+        # 3️⃣ Clica no botão interno (aguarda visibilidade até 6s)
+        if SELECTORS.find(page, "unlock_inner_button"):
+            third_btn = SELECTORS.resolve(page, "unlock_inner_button", timeout_ms=6000)
+            if third_btn:
+                print("[STEP 3] Clicando no botão interno da nova tabela...")
+                page.click(third_btn)
+                SELECTORS.resolve(page, "transactions_link", state="attached", nominal_ms=2000, timeout_ms=8000)
+            else:
+                print("[WARN] Botão interno não apareceu a tempo, seguindo...")
+        else:
+            print("[INFO] Botão interno não encontrado, talvez já esteja na tela final.")
+
+        # 4️⃣ Clica no link final (aguarda visibilidade até 8s)
+        final_link = SELECTORS.resolve(page, "transactions_link", timeout_ms=8000)
+        if final_link:
+            print("[STEP 4] Clicando no link final...")
+            page.click(final_link)
+            SELECTORS.resolve(page, "period_button", nominal_ms=2000, timeout_ms=45000)
+            print("[SUCCESS] Página de transações liberada.")
+            return True
+        print("[INFO] Link final não apareceu, talvez já esteja na página de destino.")
+
+        return True
+
+    except Exception as e:
+        print(f"[ERROR] Falha no desbloqueio: {e}")
+        return False
+
+
+# ====================== PERÍODOS ======================
+# Início do "desde sempre" (o filtro de datas não aceita antes disso)
+DATE_ORIGIN = os.environ.get("ASSINY_DATE_ORIGIN", "2025-01-01")
+# Período do "total" e dos produtos: nome (ver `resolve_range`) ou "aaaa-mm-dd:aaaa-mm-dd"
+DATE_RANGE = os.environ.get("ASSINY_RANGE", "all_time")
+# Totais extras lidos na mesma página (ex.: "today,month_to_date"); viram "total_<nome>"
+EXTRA_RANGES = [r.strip() for r in os.environ.get("ASSINY_EXTRA_RANGES", "").split(",") if r.strip()]
+
+def resolve_range(spec: str, hoje: Optional[date] = None) -> tuple:
+    """Nome ou 'aaaa-mm-dd:aaaa-mm-dd' -> (início, fim), datas inclusivas no fuso de Brasília."""
+    hoje = hoje or datetime.now(TZ_BRASILIA).date()
+    origem = date.fromisoformat(DATE_ORIGIN)
+    nomeados = {
+        "all_time": (origem, hoje),
+        "today": (hoje, hoje),
+        "yesterday": (hoje - timedelta(days=1), hoje - timedelta(days=1)),
+        "last_7d": (hoje - timedelta(days=6), hoje),
+        "last_30d": (hoje - timedelta(days=29), hoje),
+        "month_to_date": (hoje.replace(day=1), hoje),
+        "year_to_date": (hoje.replace(month=1, day=1), hoje),
+    }
+    if spec in nomeados:
+        inicio, fim = nomeados[spec]
+    elif ":" in spec:
+        a, b = spec.split(":", 1)
+        inicio, fim = date.fromisoformat(a.strip()), date.fromisoformat(b.strip())
+    else:
+        raise ValueError(f"Período desconhecido: {spec!r}")
+    inicio = max(inicio, origem)
+    if inicio > fim:
+        raise ValueError(f"Período vazio: {spec!r}")
+    return inicio, fim
+
+def range_field(spec: str) -> str:
+    """Campo do snapshot para um período extra ('month_to_date' -> 'total_month_to_date')."""
+    return "total_" + re.sub(r"\W+", "_", spec).strip("_")
+
+def parse_period_label(texto: str) -> Optional[tuple]:
+    """'01/01/2025 - 18/10/2026' (texto do botão de período) -> (início, fim)."""
+    datas = re.findall(r"(\d{2})/(\d{2})/(\d{4})", texto or "")
+    if len(datas) != 2:
+        return None
+    return tuple(date(int(a), int(m), int(d)) for d, m, a in datas)
+
+def rdp_add_to_range(dia: date, de: Optional[date], ate: Optional[date]) -> tuple:
+    """Mesma regra do react-day-picker (modo range) para um clique em `dia`."""
+    if de and ate:
+        if dia == ate and dia == de:
+            return None, None
+        if dia == ate:
+            return ate, None
+        if dia == de:
+            return None, None
+        if dia < de:
+            return dia, ate
+        return de, dia
+    if ate:
+        return (ate, dia) if dia > ate else (dia, ate)
+    if de:
+        return (dia, de) if dia < de else (de, dia)
+    return dia, None
+
+def plan_range_clicks(inicio: date, fim: date, atual: tuple) -> List[date]:
+    """Menor sequência de cliques (até 3) que leva a seleção `atual` a (inicio, fim)."""
+    sequencias: List[List[date]] = [[]]
+    for _ in range(3):
+        sequencias = [s + [d] for s in sequencias for d in (inicio, fim)]
+        for seq in sequencias:
+            de, ate = atual
+            for dia in seq:
+                de, ate = rdp_add_to_range(dia, de, ate)
+            if (de, ate) == (inicio, fim):
+                return seq
+    return [inicio, fim]
+
+# Navega do mês exibido até o mês alvo e clica no dia, tudo numa única chamada:
+# calcula o deslocamento pela legenda e só espera o re-render entre cliques.
+JS_CALENDARIO_IR = """
+async ({ano, mes, dia}) => {
+  const PT = ['janeiro','fevereiro','marco','abril','maio','junho','julho','agosto',
+              'setembro','outubro','novembro','dezembro'];
+  const EN = ['january','february','march','april','may','june','july','august',
+              'september','october','november','december'];
+  const norm = (s) => s.normalize('NFD').replace(/[\\u0300-\\u036f]/g, '').toLowerCase();
+  const indice = (el) => {
+    const t = norm(el.innerText), a = t.match(/\\d{4}/);
+    let m = PT.findIndex((n) => t.includes(n));
+    if (m < 0) m = EN.findIndex((n) => t.includes(n));
+    return a && m >= 0 ? Number(a[0]) * 12 + m : null;
+  };
+  const trocou = async (antes) => {
+    const t0 = performance.now();
+    while (performance.now() - t0 < 2000) {
+      await new Promise((r) => setTimeout(r, 16));
+      const el = document.querySelector('.rdp-caption_label');
+      if (el && el.innerText !== antes) return true;
+    }
+    return false;
+  };
+  const alvo = ano * 12 + mes - 1;
+  let cliques = 0;
+  while (cliques <= 240) {
+    const legendas = [...document.querySelectorAll('.rdp-caption_label')];
+    const visiveis = legendas.map(indice);
+    const pos = visiveis.indexOf(alvo);
+    if (pos >= 0) {
+      const botao = [...legendas[pos].closest('.rdp-month').querySelectorAll('.rdp-day')]
+        .find((b) => !b.classList.contains('rdp-day_outside') && b.innerText.trim() === String(dia));
+      if (!botao) return {ok: false, cliques, erro: `dia ${dia} não encontrado`};
+      botao.click();
+      return {ok: true, cliques};
+    }
+    if (!legendas.length || visiveis[0] === null)
+      return {ok: false, cliques, erro: 'legenda ilegível: ' + legendas.map((l) => l.innerText).join(' | ')};
+    const nome = alvo < visiveis[0] ? 'previous-month' : 'next-month';
+    const nav = document.querySelector(`button[name='${nome}']`);
+    if (!nav) return {ok: false, cliques, erro: `botão ${nome} não encontrado`};
+    const antes = legendas[0].innerText;
+    nav.click();
+    cliques++;
+    if (!(await trocou(antes))) return {ok: false, cliques, erro: 'calendário não respondeu'};
+  }
+  return {ok: false, cliques, erro: 'mês alvo fora do alcance'};
+}
+"""
+
+def calendar_click_day(page, dia: date) -> int:
+    """Leva o calendário aberto até o mês de `dia` e clica nele; devolve quantos meses andou."""
+    inicio = time.monotonic()
+    r = page.evaluate(JS_CALENDARIO_IR, {"ano": dia.year, "mes": dia.month, "dia": dia.day})
+    BUDGET.record(None, (time.monotonic() - inicio) * 1000)
+    if not r.get("ok"):
+        raise Exception(f"Não conseguiu selecionar {dia:%d/%m/%Y}: {r.get('erro')}")
+    return r.get("cliques", 0)
+
+@traced("aplicar_filtro_calendario")
+def aplicar_filtro_calendario(page, inicio: Optional[date] = None, fim: Optional[date] = None) -> bool:
+    """
+    Aplica o intervalo [inicio, fim] no seletor de período (padrão: `DATE_RANGE`).
+    Pula direto para o mês de cada data em vez de voltar mês a mês.
+    """
+    if inicio is None or fim is None:
+        inicio, fim = resolve_range(DATE_RANGE)
+    try:
+        print(f"[STEP] Aplicando filtro via calendário ({inicio:%d/%m/%Y} → {fim:%d/%m/%Y})")
+
+        filtro_sel = SELECTORS.sel(page, "period_button", timeout_ms=45000)
+        filtro_botao = page.locator(filtro_sel).first
+        # sem datas no botão ("Últimos 30 dias") vale o período padrão do painel
+        atual = parse_period_label(filtro_botao.inner_text()) or resolve_range("last_30d")
+
+        # 1️⃣ Abre o seletor de período
+        filtro_botao.click()
+        wait_ready(page, ".rdp-caption_label", nominal_ms=1500)
+
+        # 2️⃣ Cliques calculados a partir da seleção atual (o 2º clique fecha o intervalo)
+        with span("calendario.navegar"):
+            meses = 0
+            for dia in plan_range_clicks(inicio, fim, atual):
+                meses += calendar_click_day(page, dia)
+                wait_ready(page, ".rdp-day_selected, [aria-selected='true']", state="attached",
+                           nominal_ms=800, timeout_ms=2000)
+        print(f"[OK] Datas selecionadas ({meses} meses navegados).")
+
+        # 3️⃣ Aplica; o calendário fecha quando o filtro é aplicado
+        aplicar_btn = SELECTORS.sel(page, "calendar_apply", timeout_ms=2000)
+        page.locator(aplicar_btn).first.click(force=True)
+        wait_ready(page, ".rdp-month", state="detached", nominal_ms=1500, timeout_ms=10000)
+
+        aplicado = parse_period_label(filtro_botao.inner_text())
+        if aplicado and aplicado != (inicio, fim):
+            print(f"[WARN] Período aplicado difere do pedido: {aplicado[0]:%d/%m/%Y} → {aplicado[1]:%d/%m/%Y}")
+            return False
+        print(f"[OK] Filtro de calendário ({inicio:%d/%m/%Y} → {fim:%d/%m/%Y}) aplicado com sucesso.")
+        return True
+
+    except LatencyBudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"[ERROR] Falha ao aplicar filtro via calendário: {e}")
+        return False
+
+
+# ====================== CATÁLOGO DE PRODUTOS ======================
+# Padrões (glob, "re:<regex>" ou "!<padrão>" para excluir) que escolhem os produtos
+# do catálogo descoberto no filtro; vazio = usa a lista fixa PRODUTOS
+PRODUCT_PATTERNS = [p.strip() for p in os.environ.get("ASSINY_PRODUCTS", "").split(",") if p.strip()]
+CATALOG_NAME = "catalog.json"
+CATALOG_TTL_S = int(os.environ.get("ASSINY_CATALOG_TTL_S", str(24 * 3600)))
+_CATALOG: Dict[str, Dict] = {}
+_CATALOG_LOCK = threading.Lock()
+# Produtos de PRODUTOS que sumiram do filtro: mantêm a coluna prod_N, mas não são coletados
+PRODUCTS_REMOVED: set = set()
+
+# Opções do menu aberto sem filtro; o índice no id ("react-select-N-option-<i>") é a posição na lista
+JS_LISTAR_OPCOES = """() => Array.from(document.querySelectorAll('.react-select__menu .react-select__option')).map((el) => {
+    const m = (el.id || '').match(/-option-(\\d+)$/);
+    return {label: (el.innerText || el.textContent || '').trim(), index: m ? Number(m[1]) : null};
+})"""
+
+def catalog_file() -> Path:
+    """Fica ao lado do STATE_FILE (separado por conta no modo --jobs)."""
+    return Path(STATE_FILE).parent / CATALOG_NAME
+
+def load_catalog() -> Optional[Dict]:
+    caminho = catalog_file()
+    with _CATALOG_LOCK:
+        if str(caminho) not in _CATALOG and caminho.exists():
+            try:
+                _CATALOG[str(caminho)] = json.loads(caminho.read_text(encoding="utf-8"))
+            except Exception as e:
+                print(f"[WARN] Catálogo de produtos ilegível ({e}); será redescoberto.")
+        return _CATALOG.get(str(caminho))
+
+def catalog_fresh(catalogo: Optional[Dict]) -> bool:
+    if not catalogo or not catalogo.get("options") or catalogo.get("stale"):
+        return False
+    idade = datetime.now(timezone.utc) - datetime.fromisoformat(catalogo["discovered_at"])
+    return idade.total_seconds() < CATALOG_TTL_S
+
+def update_catalog(opcoes: List[Dict]) -> Optional[Dict]:
+    """
+    Grava as opções descobertas. Produtos já conhecidos mantêm a posição, os novos
+    vão para o fim e os que sumiram do menu ficam como lápide (`removed_at`), para
+    que prod_N continue apontando para o mesmo produto.
+    """
+    opcoes = [o for o in opcoes if o.get("label")]
+    if not opcoes:
+        print("[WARN] Nenhuma opção de produto encontrada no filtro; catálogo mantido.")
+        return load_catalog()
+    agora = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    anterior = (load_catalog() or {}).get("options", [])
+    conhecidos = {o["label"] for o in anterior}
+    indices = {o["label"]: o["index"] for o in opcoes}
+    entradas = []
+    for o in anterior:
+        if o["label"] in indices:
+            entradas.append({"label": o["label"], "index": indices[o["label"]]})
+        else:
+            entradas.append({"label": o["label"], "index": None, "removed_at": o.get("removed_at") or agora})
+    entradas += [{"label": o["label"], "index": o["index"]} for o in opcoes if o["label"] not in conhecidos]
+    catalogo = {"discovered_at": agora, "options": entradas}
+    caminho = catalog_file()
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with _CATALOG_LOCK:
+        tmp = caminho.with_suffix(".tmp")
+        tmp.write_text(json.dumps(catalogo, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, caminho)
+        _CATALOG[str(caminho)] = catalogo
+    novos = len([o for o in opcoes if o["label"] not in conhecidos])
+    removidos = len([o for o in entradas if o.get("removed_at")])
+    print(f"[INFO] Catálogo de produtos atualizado: {len(indices)} opções ({novos} novas, {removidos} removidas).")
+    return catalogo
+
+def catalog_option_index(nome: str) -> Optional[int]:
+    """Índice da opção no menu sem filtro; None se desconhecida ou removida."""
+    for opcao in (load_catalog() or {}).get("options", []):
+        if opcao["label"] == nome:
+            return opcao["index"]
+    return None
+
+def match_products(padroes: List[str], nomes: List[str]) -> List[str]:
+    """Nomes (na ordem do catálogo) que casam com algum padrão e com nenhuma exclusão."""
+    def casa(padrao: str, nome: str) -> bool:
+        if padrao.startswith("re:"):
+            return re.search(padrao[3:], nome, re.IGNORECASE) is not None
+        return fnmatch.fnmatchcase(nome.casefold(), padrao.casefold())
+    incluir = [p for p in padroes if not p.startswith("!")]
+    excluir = [p[1:] for p in padroes if p.startswith("!")]
+    return [
+        nome for nome in nomes
+        if any(casa(p, nome) for p in incluir or ["*"]) and not any(casa(p, nome) for p in excluir)
+    ]
+
+def apply_product_patterns() -> bool:
+    """
+    Troca PRODUTOS pelos produtos do catálogo que casam com PRODUCT_PATTERNS (lápides
+    incluídas, para não deslocar prod_N; elas vão para PRODUCTS_REMOVED). False = sem catálogo.
+    """
+    global PRODUTOS, PRODUCTS_REMOVED
+    if not PRODUCT_PATTERNS:
+        return True
+    catalogo = load_catalog()
+    if not catalogo:
+        return False
+    escolhidos = match_products(PRODUCT_PATTERNS, [o["label"] for o in catalogo["options"]])
+    if not escolhidos:
+        print(f"[WARN] Nenhum produto do catálogo casa com {PRODUCT_PATTERNS}; mantendo PRODUTOS.")
+        return True
+    if escolhidos != PRODUTOS:
+        PRODUTOS = escolhidos
+        print(f"[INFO] Produtos pelo catálogo ({len(PRODUTOS)}): {', '.join(PRODUTOS)}")
+    PRODUCTS_REMOVED = {o["label"] for o in catalogo["options"] if o.get("removed_at")} & set(PRODUTOS)
+    if PRODUCTS_REMOVED:
+        print(f"[INFO] Fora do filtro (não coletados): {', '.join(sorted(PRODUCTS_REMOVED))}")
+    return True
+
+def open_product_menu(page):
+    """Foca o filtro de produto e garante o menu aberto (sem texto digitado)."""
+    page.click(SELECTORS.sel(page, "product_select"))
+    wait_ready(page, ".react-select__control--is-focused", state="attached", nominal_ms=150)
+    if not wait_ready(page, ".react-select__menu", timeout_ms=1000):
+        page.keyboard.press("ArrowDown")
+        page.wait_for_selector(".react-select__menu", timeout=BUDGET.cap(5000))
+
+@traced("descoberta_produtos")
+def discover_products(page) -> Optional[Dict]:
+    """Lista todas as opções do filtro de produto na página de transações e grava o catálogo."""
+    page.click(SELECTORS.sel(page, "open_filters"))
+    wait_ready(page, ".filter-middle_selects", nominal_ms=700)
+    clear_product_selection(page)
+    open_product_menu(page)
+    catalogo = update_catalog(page.evaluate(JS_LISTAR_OPCOES))
+    page.keyboard.press("Escape")
+    # aplicar sem produto fecha o painel e deixa a página no total, como estava
+    apply_filters_panel(page)
+    return catalogo
+
+def discover_products_browser() -> Optional[Dict]:
+    """Descoberta avulsa (modo HTTP ou --discover-products): abre o navegador só para isso."""
+    with sync_playwright() as p:
+        browser = launch_browser(p, headless=("--headed" not in sys.argv))
+        context = new_scraping_context(browser, STORAGE_STATE_FILE)
+        page = context.new_page()
+        try:
+            page.goto(ASSINY_URL + TRANSACOES_PATH, wait_until="domcontentloaded", timeout=BUDGET.cap(60000))
+            wait_condition(page, JS_AUTH_RESOLVIDA, timeout_ms=15000)
+            if "login" in page.url:
+                raise SessionExpired(f"redirecionado para {page.url}")
+            unlock_transactions_page(page)
+            return discover_products(page)
+        finally:
+            context.close()
+            browser.close()
+
+def prepare_product_catalog():
+    """
+    Antes da coleta: aplica os padrões ao catálogo em cache. Sem catálogo, o modo HTTP
+    descobre com um navegador avulso; o navegador descobre na própria página (fetch_snapshot).
+    """
+    if PRODUCT_PATTERNS and not apply_product_patterns() and FETCH_ENGINE == "http":
+        try:
+            discover_products_browser()
+        except Exception as e:
+            print(f"[WARN] Descoberta de produtos falhou ({e}); mantendo PRODUTOS.")
+        apply_product_patterns()
+
+def clear_product_selection(page):
+    """Remove qualquer seleção anterior no react-select (multi ou single)."""
+    try:
+        # Remove chips se existirem
+        for _ in range(10):
+            remover = page.locator(".react-select__multi-value__remove")
+            if remover.count() == 0:
+                break
+            chip = remover.first.element_handle()
+            chip.click()
+            inicio = time.monotonic()
+            try:
+                chip.wait_for_element_state("hidden", timeout=BUDGET.cap(2000))
+            except LatencyBudgetExceeded:
+                raise
+            except Exception:
+                pass
+            BUDGET.record(120, (time.monotonic() - inicio) * 1000)
+
+        # Botão de limpar (single select)
+        clear_btn = page.locator(".react-select__clear-indicator")
+        if clear_btn.count() > 0 and clear_btn.first.is_visible():
+            clear_btn.first.click(force=True)
+            wait_ready(page, ".react-select__clear-indicator", state="detached", nominal_ms=300)
+
+        # Reabrir o campo pra garantir foco
+        page.click(SELECTORS.sel(page, "product_select"))
+        wait_ready(page, ".react-select__control--is-focused", state="attached", nominal_ms=300)
+    except LatencyBudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"[DEBUG] clear_product_selection: {e}")
+
+def select_product_option(page, nome):
+    """
+    Seleciona `nome` no react-select. Com o catálogo, clica a opção pelo índice no
+    menu aberto (sem digitar nem esperar o filtro); senão digita e clica o texto exato.
+    """
+    indice = catalog_option_index(nome)
+    if indice is not None:
+        open_product_menu(page)
+        if not catalog_fresh(load_catalog()):
+            # menu aberto sem filtro: renova o catálogo de graça
+            update_catalog(page.evaluate(JS_LISTAR_OPCOES))
+            indice = catalog_option_index(nome)
+        opcao = page.locator(f".react-select__menu [id$='-option-{indice}']").first
+        if indice is not None and opcao.count() and opcao.inner_text().strip() == nome:
+            opcao.click(force=True)
+            wait_ready(page, ".react-select__menu", state="detached", nominal_ms=200, timeout_ms=2000)
+            return
+        print(f"[INFO] '{nome}' não está na posição do catálogo; buscando pelo nome.")
+        TRACE.catalogo_erros += 1
+        with _CATALOG_LOCK:
+            _CATALOG.get(str(catalog_file()), {})["stale"] = True
+    else:
+        # Abre o dropdown
+        page.click(SELECTORS.sel(page, "product_select"))
+        wait_ready(page, ".react-select__control--is-focused", state="attached", nominal_ms=150)
+
+    # Digita o nome e espera o menu abrir
+    page.keyboard.press("Control+A")
+    page.keyboard.type(nome)
+    page.wait_for_selector(".react-select__menu", timeout=BUDGET.cap(5000))
+
+    # Clica a opção exata no menu
+    menu_option = page.locator(".react-select__menu").get_by_text(nome, exact=True)
+    menu_option.click(force=True)
+    wait_ready(page, ".react-select__menu", state="detached", nominal_ms=200, timeout_ms=2000)
+
+def apply_filters_panel(page):
+    """Clica no botão Aplicar do painel de filtros."""
+    aplicar_filtro_btn = SELECTORS.sel(page, "apply_filters")
+    btn = page.locator(aplicar_filtro_btn).first
+    btn.click()
+    # clica novamente se o painel não fechou
+    if not wait_ready(page, aplicar_filtro_btn, state="hidden", nominal_ms=400, timeout_ms=1000):
+        btn.click()
+        wait_ready(page, aplicar_filtro_btn, state="hidden", nominal_ms=800, timeout_ms=3000)
+
+# Conta fetch/XHR da própria página (instalado em todo contexto): o sinal de que
+# a resposta do filtro chegou, mesmo quando o valor novo é igual ao anterior
+JS_REDE_INIT = """(() => {
+    if (window.__assinyNet) return;
+    const net = window.__assinyNet = {inflight: 0, done: 0};
+    const fim = () => { net.inflight = Math.max(0, net.inflight - 1); net.done++; };
+    const fetchOriginal = window.fetch;
+    if (fetchOriginal) {
+        window.fetch = function (...args) {
+            net.inflight++;
+            return fetchOriginal.apply(this, args).finally(fim);
+        };
+    }
+    const send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function (...args) {
+        net.inflight++;
+        this.addEventListener("loadend", fim, {once: true});
+        return send.apply(this, args);
+    };
+})()"""
+# Indicadores de carregamento no card (skeleton/spinner): enquanto existirem, não assentou
+LOADING_SELECTOR = os.environ.get(
+    "ASSINY_LOADING_SELECTOR", "[aria-busy='true'], [class*='skeleton' i], [class*='spinner' i], [class*='loading' i]"
+)
+# Texto igual e rede ociosa por este tempo = valor assentado (igual ao anterior de verdade)
+SETTLE_MS = 300
+
+def network_mark(page) -> Optional[int]:
+    """Requisições da página concluídas até agora (None se o contador não foi instalado)."""
+    try:
+        return page.evaluate("() => window.__assinyNet ? window.__assinyNet.done : null")
+    except Exception:
+        return None
+
+# Devolve o texto do card quando ele tem "R$" e mudou, ou quando a rede respondeu
+# depois de `marca`, ficou ociosa e o texto parou de mudar (valor igual ao anterior)
+JS_VALOR_ASSENTOU = """([sel, anterior, marca, loading, estavelMs]) => {
+    const el = document.querySelector(sel);
+    if (!el) return null;
+    const txt = (el.innerText || "").trim();
+    if (!txt.includes("R$")) return null;
+    if (txt !== anterior) return txt;
+    const net = window.__assinyNet;
+    if (marca === null || !net || net.done <= marca || net.inflight > 0) return null;
+    if (loading && (el.closest(loading) || el.querySelector(loading))) return null;
+    const agora = performance.now();
+    const s = window.__assinyEstavel;
+    if (!s || s.txt !== txt || s.done !== net.done) {
+        window.__assinyEstavel = {txt, done: net.done, desde: agora};
+        return null;
+    }
+    return agora - s.desde >= estavelMs ? txt : null;
+}"""
+
+@traced("wait_for_valor_atualizado")
+def wait_for_valor_atualizado(page, selector: str, timeout_ms: int = 15000,
+                              anterior: Optional[str] = None, marca: Optional[int] = None) -> Optional[str]:
+    """
+    Espera o card mostrar um valor em 'R$' diferente de `anterior` (o texto antes
+    do filtro) ou, com `marca` (de `network_mark` antes do filtro), a resposta
+    chegar e o texto assentar: assim um valor igual ao anterior não custa o timeout.
+    None = sem valor confirmado (nunca devolve o texto antigo como se fosse novo).
+    """
+    print("[INFO] Aguardando valor 'R$' atualizar no campo...")
+    txt = wait_condition(page, JS_VALOR_ASSENTOU, arg=[selector, anterior, marca, LOADING_SELECTOR, SETTLE_MS],
+                         timeout_ms=timeout_ms)
+    if txt:
+        print(f"[OK] Valor carregado: {txt}")
+        return txt
+    if anterior:
+        print("[WARN] Tempo limite atingido sem resposta nova para o filtro.")
+    else:
+        print("[WARN] Tempo limite atingido, 'R$' não encontrado.")
+    return None
+
+# ====================== CAPTURA DE REDE ======================
+# "dom": lê o texto renderizado nos cards (padrão)
+# "network": lê os valores do JSON que alimenta os cards (DOM só como fallback); só
+# depois de `--check-contract` confirmar no painel real o contrato que o mock supõe
+CAPTURE_MODE = os.environ.get("ASSINY_CAPTURE_MODE", "dom")
+# URLs do backend que trazem os totais do dashboard (não a listagem paginada)
+CAPTURE_URL_PATTERN = re.compile(
+    os.environ.get(
+        "ASSINY_CAPTURE_URL",
+        r"/(transactions|transacoes|dashboard)/(summary|resumo|totals?|metrics)(/|\?|$)",
+    ),
+    re.IGNORECASE,
+)
+# Chaves candidatas ao valor líquido, em ordem de prioridade
+CAPTURE_VALUE_KEYS = (
+    "netAmount", "net_amount", "netValue", "net_value",
+    "liquidAmount", "liquid_amount", "valorLiquido", "valor_liquido",
+    "totalNet", "total_net",
+)
+# Chaves genéricas ("total" de uma listagem é contagem de linhas): só valem ao lado de uma moeda
+CAPTURE_GENERIC_KEYS = ("total", "amount", "value")
+CAPTURE_CURRENCY_KEYS = ("currency", "currencyCode", "currency_code", "moeda")
+# Espera curta pela resposta; sem ela, o DOM assume (e as próximas leituras nem esperam)
+CAPTURE_TIMEOUT_MS = int(os.environ.get("ASSINY_CAPTURE_TIMEOUT_MS", "3000"))
+# Alguns backends devolvem centavos inteiros
+CAPTURE_IN_CENTS = os.environ.get("ASSINY_CAPTURE_CENTS", "0") == "1"
+# Se definido, grava cada JSON capturado (útil para montar fixtures de replay)
+CAPTURE_DUMP_DIR = os.environ.get("ASSINY_CAPTURE_DUMP", "")
+
+def extract_total_from_json(payload) -> Optional[float]:
+    """Procura (em largura) a primeira chave de valor conhecida no JSON e devolve em reais."""
+    fila = [payload]
+    while fila:
+        atual = fila.pop(0)
+        if isinstance(atual, dict):
+            chaves = CAPTURE_VALUE_KEYS
+            if any(c in atual for c in CAPTURE_CURRENCY_KEYS):
+                chaves = CAPTURE_VALUE_KEYS + CAPTURE_GENERIC_KEYS
+            for chave in chaves:
+                if chave not in atual:
+                    continue
+                bruto = atual[chave]
+                if isinstance(bruto, bool):
+                    continue
+                if isinstance(bruto, (int, float)):
+                    valor = float(bruto)
+                elif isinstance(bruto, str) and re.search(r"\d", bruto):
+                    valor = brl_to_float(bruto)
+                else:
+                    continue
+                return valor / 100 if CAPTURE_IN_CENTS else valor
+            fila.extend(atual.values())
+        elif isinstance(atual, list):
+            fila.extend(atual)
+    return None
+
+class ResponseCapture:
+    """
+    Escuta `page.on("response")` e guarda as respostas JSON do backend.
+    O corpo só é lido em `wait_for_value` (fora do handler), evitando chamadas
+    bloqueantes dentro do callback do Playwright.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.responses: List = []
+        self._lidas = 0
+        self._sem_sinal = False   # já esperou uma vez e nenhuma resposta candidata apareceu
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        try:
+            if response.request.resource_type not in ("xhr", "fetch"):
+                return
+            if not CAPTURE_URL_PATTERN.search(response.url):
+                return
+            if "json" not in (response.headers.get("content-type") or ""):
+                return
+            self.responses.append(response)
+        except Exception:
+            pass
+
+    def mark(self) -> int:
+        """Posição atual; só respostas posteriores a ela são consideradas."""
+        return len(self.responses)
+
+    def _dump(self, response, payload):
+        if not CAPTURE_DUMP_DIR:
+            return
+        Path(CAPTURE_DUMP_DIR).mkdir(exist_ok=True, parents=True)
+        self._lidas += 1
+        destino = Path(CAPTURE_DUMP_DIR) / f"{self._lidas:04d}.json"
+        destino.write_text(
+            json.dumps({"url": response.url, "body": payload}, ensure_ascii=False, indent=2),
+            encoding="utf-8",
+        )
+
+    def wait_for_value(self, since: int, timeout_ms: int = CAPTURE_TIMEOUT_MS) -> Optional[float]:
+        """
+        Aguarda uma resposta nova (após `since`) que contenha um valor reconhecível.
+        Se a página nunca chamou uma URL candidata, não espera de novo: o DOM assume.
+        """
+        if self._sem_sinal and not self.responses:
+            return None
+        inicio = datetime.now()
+        proxima = since
+        while True:
+            while proxima < len(self.responses):
+                response = self.responses[proxima]
+                proxima += 1
+                try:
+                    if not response.ok:
+                        continue
+                    payload = response.json()
+                except Exception:
+                    continue
+                self._dump(response, payload)
+                valor = extract_total_from_json(payload)
+                if valor is not None:
+                    print(f"[OK] Valor capturado via rede: {valor} ({response.url})")
+                    BUDGET.record(None, (datetime.now() - inicio).total_seconds() * 1000)
+                    return valor
+            restante = timeout_ms - (datetime.now() - inicio).total_seconds() * 1000
+            if restante <= 0:
+                self._sem_sinal = not self.responses
+                print("[WARN] Nenhuma resposta JSON com valor capturada a tempo.")
+                BUDGET.record(None, timeout_ms)
+                return None
+            # acorda na próxima resposta da página em vez de dormir em intervalos fixos
+            try:
+                self.page.wait_for_event("response", timeout=BUDGET.cap(int(restante)))
+            except LatencyBudgetExceeded:
+                raise
+            except Exception:
+                pass
+
+    def detach(self):
+        try:
+            self.page.remove_listener("response", self._on_response)
+        except Exception:
+            pass
+
+def check_api_contract() -> bool:
+    """
+    Confere no painel real o contrato que o mock do bench_assiny.py só reproduz:
+    o dashboard chama API_TOTAL_PATH e uma resposta em CAPTURE_URL_PATTERN traz o
+    mesmo total que o card mostra. Usa a sessão real e não grava snapshot.
+    """
+    reset_latency_budget()
+    with sync_playwright() as p:
+        browser = launch_browser(p, headless=("--headed" not in sys.argv))
+        context = new_scraping_context(browser, STORAGE_STATE_FILE)
+        try:
+            page = context.new_page()
+            chamadas: List[str] = []
+            page.on("request", lambda r: chamadas.append(r.url) if r.resource_type in ("xhr", "fetch") else None)
+            capture = ResponseCapture(page)
+            tela = prepare_dashboard(page)          # sem capture: valor lido do card
+            rede = capture.wait_for_value(0)
+            capture.detach()
+        finally:
+            context.close()
+            browser.close()
+    caminho_api = any(urlparse(u).path.endswith(API_TOTAL_PATH) for u in chamadas)
+    print(f"[INFO] {len(chamadas)} chamadas fetch/XHR; {len(capture.responses)} casaram com CAPTURE_URL_PATTERN.")
+    print(f"[INFO] API_TOTAL_PATH ({API_TOTAL_PATH}) chamado pelo painel: {'sim' if caminho_api else 'NÃO'}")
+    print(f"[INFO] Total no card: {tela}; total na resposta da API: {rede}")
+    ok = caminho_api and rede is not None and abs(rede - tela) <= 0.01
+    if ok:
+        print("[OK] Contrato da API confere com o painel real; ASSINY_CAPTURE_MODE=network pode ser ativado.")
+    else:
+        print("[ERROR] O painel real não segue o contrato suposto (e imitado pelo mock do bench); "
+              "ajuste ASSINY_API_TOTAL_PATH / CAPTURE_* antes de confiar no modo http ou na captura.")
+    return ok
+
+# ====================== VALIDAÇÃO ======================
+# Checagens de plausibilidade sobre os acumulados ("all_time") antes de gravar
+VALIDATION_ENABLED = os.environ.get("ASSINY_VALIDATE", "1") != "0"
+# Queda máxima aceita num acumulado (estornos), em % do valor anterior
+MAX_DROP_PCT = float(os.environ.get("ASSINY_MAX_DROP_PCT", "1.0"))
+# Variação com z-score acima disso (contra as últimas ZSCORE_WINDOW variações) é suspeita
+ZSCORE_MAX = float(os.environ.get("ASSINY_ZSCORE_MAX", "6"))
+ZSCORE_WINDOW = 48
+ZSCORE_MIN_SAMPLES = 8
+# Desvio mínimo (R$): série quase parada não transforma qualquer venda num z infinito
+ZSCORE_MIN_STD = 50.0
+# Os produtos monitorados são parte do total: a soma pode passar dele só por arredondamento
+SUM_TOLERANCE_PCT = 0.5
+VALIDATION_STATE_NAME = "validation.json"
+
+def validation_state_file() -> Path:
+    """Fica ao lado do STATE_FILE (separado por conta no modo --jobs)."""
+    return Path(STATE_FILE).parent / VALIDATION_STATE_NAME
+
+class SnapshotValidator:
+    """
+    Estatística em fluxo por campo: último valor aceito e a janela das últimas
+    variações aceitas (para o z-score). Só snapshots acumulados passam por aqui.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path or validation_state_file())
+        try:
+            estado = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception:
+            estado = {}
+        self.ultimos: Dict[str, float] = estado.get("last") or self._seed()
+        self.variacoes: Dict[str, List[float]] = estado.get("deltas", {})
+        # valores rejeitados na execução anterior: se a leitura seguinte não ficar abaixo, são reais
+        self.pendentes: Dict[str, float] = estado.get("pending", {})
+        antigos = estado.get("products")
+        if antigos is not None and antigos != PRODUTOS:
+            # conjunto de produtos mudou: cada base segue o seu produto, não a posição
+            self.ultimos = self._remap(self.ultimos, antigos)
+            self.variacoes = self._remap(self.variacoes, antigos)
+            self.pendentes = self._remap(self.pendentes, antigos)
+
+    @staticmethod
+    def fields() -> List[str]:
+        return ["total"] + [f"prod_{i+1}" for i, nome in enumerate(PRODUTOS) if nome not in PRODUCTS_REMOVED]
+
+    @staticmethod
+    def _seed() -> Dict[str, float]:
+        """Sem estado (ex.: checkout novo no CI): parte do último snapshot gravado."""
+        try:
+            if STORE_BACKEND != "csv":
+                with open_store() as store:
+                    ultimo = store.latest_snapshot()
+            else:
+                ultimo = load_last_snapshot()
+        except Exception as e:
+            print(f"[WARN] Validação sem base anterior: {e}")
+            return {}
+        return {c: float(v) for c, v in (ultimo or {}).items() if c in SnapshotValidator.fields()}
+
+    @staticmethod
+    def _remap(dados: Dict, antigos: List[str]) -> Dict:
+        """prod_N do estado salvo -> prod_M atual, pelo nome do produto (descarta os que saíram)."""
+        novos = {}
+        for campo, valor in dados.items():
+            m = re.fullmatch(r"prod_(\d+)", campo)
+            if not m:
+                novos[campo] = valor
+                continue
+            i = int(m.group(1)) - 1
+            if i < len(antigos) and antigos[i] in PRODUTOS:
+                novos[f"prod_{PRODUTOS.index(antigos[i]) + 1}"] = valor
+        return novos
+
+    def zscore(self, campo: str, variacao: float) -> Optional[float]:
+        janela = self.variacoes.get(campo, [])
+        if len(janela) < ZSCORE_MIN_SAMPLES:
+            return None
+        media = sum(janela) / len(janela)
+        desvio = math.sqrt(sum((v - media) ** 2 for v in janela) / len(janela))
+        return abs(variacao - media) / max(desvio, ZSCORE_MIN_STD)
+
+    def check(self, snapshot: Dict) -> Dict[str, tuple]:
+        """Campos suspeitos -> (motivo, detalhe); motivo: 'ausente', 'queda', 'salto' ou 'soma'."""
+        suspeitos: Dict[str, tuple] = {}
+        for campo in self.fields():
+            if campo not in snapshot:
+                suspeitos[campo] = ("ausente", "sem leitura")
+                continue
+            valor = float(snapshot[campo])
+            anterior = self.ultimos.get(campo)
+            if anterior is None:
+                continue
+            if anterior - valor > max(0.01, anterior * MAX_DROP_PCT / 100):
+                suspeitos[campo] = ("queda", f"{anterior:.2f} → {valor:.2f}")
+                continue
+            z = self.zscore(campo, valor - anterior)
+            if z is not None and z > ZSCORE_MAX:
+                suspeitos[campo] = ("salto", f"{anterior:.2f} → {valor:.2f} (z={z:.1f})")
+        if "total" in snapshot and "total" not in suspeitos:
+            soma = sum(float(snapshot[c]) for c in self.fields()[1:] if c in snapshot and c not in suspeitos)
+            total = float(snapshot["total"])
+            if soma > total * (1 + SUM_TOLERANCE_PCT / 100) + 0.01:
+                suspeitos["total"] = ("soma", f"produtos somam {soma:.2f} > total {total:.2f}")
+        return suspeitos
+
+    def accept(self, snapshot: Dict, campos: List[str]):
+        for campo in campos:
+            valor = float(snapshot[campo])
+            if campo in self.ultimos:
+                janela = self.variacoes.setdefault(campo, [])
+                janela.append(round(valor - self.ultimos[campo], 2))
+                del janela[:-ZSCORE_WINDOW]
+            self.ultimos[campo] = valor
+            self.pendentes.pop(campo, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"last": self.ultimos, "deltas": self.variacoes,
+                                   "pending": self.pendentes, "products": PRODUTOS}), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+def validate_snapshot(snapshot: Dict, reread: Optional[Callable[[str], Optional[float]]] = None) -> Dict:
+    """
+    Valida um snapshot acumulado; campos suspeitos são relidos um a um com `reread`.
+    O que continua suspeito volta ao último valor aceito (queda/ausência) ou fica
+    com confiança menor (salto). Grava `confidence` (0 a 1) no snapshot.
+    """
+    if not VALIDATION_ENABLED or DATE_RANGE != "all_time":
+        return snapshot
+    validador = SnapshotValidator()
+    confianca = {campo: 1.0 for campo in validador.fields()}
+    with span("validacao"):
+        suspeitos = validador.check(snapshot)
+        for campo, (motivo, detalhe) in suspeitos.items():
+            print(f"[VALIDATION] '{campo}' suspeito ({motivo}: {detalhe}).")
+            original = snapshot.get(campo)
+            pendente = validador.pendentes.get(campo)
+            # a queda da execução anterior se manteve e o acumulado seguiu dali (igual ou maior)
+            if original is not None and pendente is not None and float(original) >= pendente - CHANGE_TOLERANCE_DEFAULT:
+                print(f"[INFO] '{campo}' confirmou a leitura da execução anterior ({pendente:.2f} → {float(original):.2f}); aceitando.")
+                confianca[campo] = 0.75
+                continue
+            novo = None
+            if reread:
+                try:
+                    with span(f"releitura:{campo}", motivo=motivo):
+                        novo = reread(campo)
+                except LatencyBudgetExceeded:
+                    raise
+                except Exception as e:
+                    print(f"[WARN] Releitura de '{campo}' falhou: {e}")
+            if novo is not None:
+                snapshot[campo] = round(novo, 2)
+                if campo not in validador.check(snapshot):
+                    print(f"[OK] Releitura de '{campo}' resolveu: {snapshot[campo]}")
+                    continue
+                if original is not None and novo >= float(original) - CHANGE_TOLERANCE_DEFAULT:
+                    # a releitura não voltou atrás: provavelmente é real (ex.: estorno grande)
+                    print(f"[INFO] Releitura confirmou '{campo}' = {snapshot[campo]}.")
+                    confianca[campo] = 0.75
+                    continue
+            if motivo in ("salto", "soma") and campo in snapshot:
+                confianca[campo] = 0.5
+            elif campo in validador.ultimos:
+                if original is not None:
+                    validador.pendentes[campo] = float(snapshot[campo])
+                snapshot[campo] = validador.ultimos[campo]
+                confianca[campo] = 0.0
+                print(f"[WARN] '{campo}' mantido no último valor aceito ({snapshot[campo]}).")
+            else:
+                snapshot.pop(campo, None)
+                confianca[campo] = 0.0
+        snapshot["confidence"] = round(sum(confianca.values()) / len(confianca), 2)
+        validador.accept(snapshot, [c for c, v in confianca.items() if v > 0 and c in snapshot])
+        validador.save()
+    if snapshot["confidence"] < 1:
+        print(f"[VALIDATION] Confiança do snapshot: {snapshot['confidence']:.2f}")
+    return snapshot
+
+# ====================== SCRAPER ======================
+# Quantas páginas coletam produtos ao mesmo tempo (1 = sequencial, como antes)
+PRODUCT_CONCURRENCY = max(1, int(os.environ.get("ASSINY_CONCURRENCY", "1")))
+# Novas tentativas por produto (cada uma recarrega o dashboard do worker)
+PRODUCT_RETRIES = max(0, int(os.environ.get("ASSINY_PRODUCT_RETRIES", "1")))
+
+# Páginas que já estão no dashboard desbloqueado, com o período aplicado (página -> período)
+_DASHBOARD_PRONTO: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+def refresh_dashboard(page, capture: Optional[ResponseCapture] = None) -> Optional[float]:
+    """
+    Página aquecida do daemon: em vez de goto, desbloqueio e calendário, só tira o
+    filtro de produto e reaplica (o app refaz as requisições). None = não confirmou.
+    """
+    if "login" in page.url:
+        raise SessionExpired(f"redirecionado para {page.url}")
+    try:
+        total_selector = SELECTORS.sel(page, "total_value")
+        anterior = safe_text(page, total_selector, timeout=1000)
+        page.click(SELECTORS.sel(page, "open_filters"))
+        wait_ready(page, ".filter-middle_selects", nominal_ms=700)
+        clear_product_selection(page)
+        marca = capture.mark() if capture else 0
+        marca_rede = network_mark(page)
+        apply_filters_panel(page)
+        total_val = capture.wait_for_value(marca) if capture else None
+        if total_val is None:
+            txt = wait_for_valor_atualizado(page, total_selector, anterior=anterior, marca=marca_rede)
+            total_val = brl_to_float(txt) if txt else None
+        return total_val
+    except LatencyBudgetExceeded:
+        raise
+    except Exception as e:
+        print(f"[WARN] Atualização no lugar falhou ({e}).")
+        return None
+
+@traced("prepare_dashboard")
+def prepare_dashboard(page, capture: Optional[ResponseCapture] = None, reaproveitar: bool = False) -> float:
+    """Abre transações, desbloqueia, aplica o período 'Desde sempre' e devolve o total."""
+    periodo = resolve_range(DATE_RANGE)
+    if reaproveitar and _DASHBOARD_PRONTO.get(page) == periodo:
+        total_val = refresh_dashboard(page, capture)
+        if total_val is not None:
+            return total_val
+        print("[INFO] Recarregando o dashboard do zero.")
+    _DASHBOARD_PRONTO.pop(page, None)
+    page.goto(ASSINY_URL + TRANSACOES_PATH, wait_until="domcontentloaded", timeout=BUDGET.cap(60000))
+    wait_condition(page, JS_AUTH_RESOLVIDA, timeout_ms=15000)
+    if "login" in page.url:
+        raise SessionExpired(f"redirecionado para {page.url}")
+    unlock_transactions_page(page)
+
+    # ===============================
+    # (A) Período principal (padrão: "desde sempre")
+    # ===============================
+    marca_total = capture.mark() if capture else 0
+    periodo_ok = aplicar_filtro_calendario(page)
+    if not periodo_ok:
+        print("[WARN] Falha ao aplicar filtro de data; seguindo com o período exibido.")
+
+    # ===============================
+    # (B) Ler valor líquido total (com espera dinâmica)
+    # ===============================
+    total_val = capture.wait_for_value(marca_total) if capture else None
+    if total_val is None:
+        total_txt = wait_for_valor_atualizado(page, SELECTORS.sel(page, "total_value", timeout_ms=15000))
+        if not total_txt:
+            raise Exception("total do dashboard não carregou")
+        total_val = brl_to_float(total_txt)
+    if periodo_ok:
+        _DASHBOARD_PRONTO[page] = periodo
+    return total_val
+
+def collect_ranges(page, ranges: List[str], capture: Optional[ResponseCapture] = None) -> Dict[str, float]:
+    """
+    Totais de períodos extras (`EXTRA_RANGES`) na página já preparada, sem recarregar;
+    no fim volta ao período principal para a coleta dos produtos.
+    """
+    valores: Dict[str, float] = {}
+    total_selector = SELECTORS.sel(page, "total_value")
+    for spec in ranges:
+        with span(f"periodo:{spec}"):
+            try:
+                inicio, fim = resolve_range(spec)
+            except ValueError as e:
+                print(f"[WARN] {e}")
+                continue
+            anterior = safe_text(page, total_selector, timeout=1000)
+            marca = capture.mark() if capture else 0
+            marca_rede = network_mark(page)
+            if not aplicar_filtro_calendario(page, inicio, fim):
+                print(f"[WARN] Período '{spec}' ignorado nesta execução.")
+                continue
+            val = capture.wait_for_value(marca) if capture else None
+            if val is None:
+                txt = wait_for_valor_atualizado(page, total_selector, anterior=anterior, marca=marca_rede)
+                if not txt:
+                    print(f"[WARN] Período '{spec}' sem valor confirmado nesta execução.")
+                    continue
+                val = brl_to_float(txt)
+            valores[range_field(spec)] = round(val, 2)
+            print(f"[OK] Total do período '{spec}': {val}")
+    if ranges and not aplicar_filtro_calendario(page):
+        raise Exception("não foi possível voltar ao período principal antes dos produtos")
+    return valores
+
+def start_product(page, nome: str, capture: Optional[ResponseCapture] = None) -> Dict:
+    """Aplica o filtro de um produto no dashboard já preparado; `finish_product` lê o valor."""
+    print(f"[INFO] Aplicando filtro de produto: {nome}")
+
+    # Texto atual do card, para detectar quando o valor do produto chegar
+    total_selector = SELECTORS.sel(page, "total_value")
+    anterior = safe_text(page, total_selector, timeout=1000)
+
+    # Abre painel
+    page.click(SELECTORS.sel(page, "open_filters"))
+    wait_ready(page, ".filter-middle_selects", nominal_ms=700)
+
+    # Limpa seleção anterior
+    clear_product_selection(page)
+
+    # Seleciona o produto exato
+    select_product_option(page, nome)
+
+    # Aplica (com dupla tentativa)
+    marca = capture.mark() if capture else 0
+    marca_rede = network_mark(page)
+    apply_filters_panel(page)
+    return {"nome": nome, "selector": total_selector, "anterior": anterior,
+            "marca": marca, "marca_rede": marca_rede}
+
+def finish_product(page, pendente: Dict, capture: Optional[ResponseCapture] = None) -> Optional[float]:
+    """Espera o valor do filtro aplicado por `start_product`. None = sem valor."""
+    nome, total_selector = pendente["nome"], pendente["selector"]
+    anterior, marca_rede = pendente["anterior"], pendente["marca_rede"]
+
+    # Valor direto do JSON do backend, se disponível
+    p_val = capture.wait_for_value(pendente["marca"]) if capture else None
+    if p_val is not None:
+        print(f"[OK] Valor final para '{nome}': {p_val}")
+        return p_val
+
+    # Espera valor renderizar (fallback via DOM)
+    curr_val_txt = wait_for_valor_atualizado(page, total_selector, anterior=anterior, marca=marca_rede)
+
+    # O filtro nem chegou a disparar requisição: tenta forçar render
+    if not curr_val_txt and marca_rede is not None and network_mark(page) == marca_rede:
+        print("[INFO] Tentando forçar render clicando fora do painel...")
+        page.mouse.click(50, 50)
+        curr_val_txt = wait_for_valor_atualizado(page, total_selector, timeout_ms=5000,
+                                                 anterior=anterior, marca=marca_rede)
+
+    if not curr_val_txt:
+        return None
+
+    # Converte valor capturado
+    p_val = brl_to_float(curr_val_txt)
+    print(f"[OK] Valor final para '{nome}': {p_val}")
+    return p_val
+
+def collect_product(page, nome: str, capture: Optional[ResponseCapture] = None) -> Optional[float]:
+    """Aplica o filtro de um produto no dashboard já preparado e lê o valor. None = sem valor."""
+    return finish_product(page, start_product(page, nome, capture), capture)
+
+def open_product_pages(page, n: int) -> List[Dict]:
+    """
+    `n` páginas extras no mesmo Chromium da principal, cada uma no seu contexto (com a
+    sessão da principal). Todas são usadas só desta thread: Playwright sync não é thread-safe.
+    """
+    storage_state = page.context.storage_state()
+    paginas = []
+    for i in range(n):
+        extra = new_scraping_context(page.context.browser, storage_state).new_page()
+        watch_page(extra, f"w{i + 1}")
+        capture = ResponseCapture(extra) if CAPTURE_MODE == "network" else None
+        paginas.append({"page": extra, "capture": capture, "tag": f"w{i + 1}", "preparado": False})
+    return paginas
+
+def close_product_pages(paginas: List[Dict]):
+    for w in paginas:
+        try:
+            if w["capture"]:
+                w["capture"].detach()
+            w["page"].context.close()
+        except Exception as e:
+            print(f"[DEBUG] [{w['tag']}] Falha ao fechar contexto: {e}")
+
+def drain_products(paginas: List[Dict], fila: "queue.Queue", resultados: List[Optional[float]]):
+    """
+    Consome a fila de produtos nas páginas dadas, em rodadas: aplica o filtro em todas
+    e só então espera cada uma, então as respostas do servidor chegam em paralelo.
+    Cada falha recarrega o dashboard daquela página e devolve o produto à fila.
+    """
+    tentativas: Dict[int, int] = {}
+
+    def falhou(w: Dict, idx: int, nome: str, erro: Optional[BaseException]):
+        tentativa = tentativas[idx]
+        if erro is None:
+            print(f"[WARN] [{w['tag']}] Nenhum valor retornado para '{nome}' (tentativa {tentativa}).")
+        else:
+            print(f"[ERROR] [{w['tag']}] Falha ao coletar produto '{nome}' (tentativa {tentativa}): {erro}")
+        w["preparado"] = False
+        if tentativa <= PRODUCT_RETRIES:
+            fila.put((idx, nome))
+        else:
+            # sem valor (em vez de 0.0): a validação relê ou mantém o último aceito
+            print(f"[WARN] [{w['tag']}] Desistindo de '{nome}', fica sem leitura nesta execução.")
+
+    while not fila.empty():
+        pendentes = []
+        for w in paginas:
+            try:
+                idx, nome = fila.get_nowait()
+            except queue.Empty:
+                break
+            tentativas[idx] = tentativas.get(idx, 0) + 1
+            registro = TRACE.open_span(f"produto:{nome}", tentativa=tentativas[idx], worker=w["tag"])
+            try:
+                if not w["preparado"]:
+                    prepare_dashboard(w["page"], w["capture"])
+                    w["preparado"] = True
+                pendentes.append((w, idx, nome, start_product(w["page"], nome, w["capture"]), registro))
+            except Exception as e:
+                TRACE.close_span(registro, e)
+                falhou(w, idx, nome, e)
+        for w, idx, nome, pendente, registro in pendentes:
+            try:
+                valor = finish_product(w["page"], pendente, w["capture"])
+            except Exception as e:
+                TRACE.close_span(registro, e)
+                falhou(w, idx, nome, e)
+                continue
+            TRACE.close_span(registro)
+            if valor is None:
+                falhou(w, idx, nome, None)
+            else:
+                resultados[idx] = valor
+
+def fetch_snapshot(page, produtos: Optional[List[str]] = None, reaproveitar: bool = False) -> Dict:
+    capture = ResponseCapture(page) if CAPTURE_MODE == "network" else None
+    try:
+        return collect_dashboard(page, produtos, capture, reaproveitar)
+    finally:
+        if capture:
+            capture.detach()
+
+def collect_dashboard(page, produtos: Optional[List[str]], capture: Optional[ResponseCapture],
+                      reaproveitar: bool = False) -> Dict:
+    produtos_padrao = produtos is None
+    produtos = PRODUTOS if produtos_padrao else produtos
+
+    total_val = prepare_dashboard(page, capture, reaproveitar=reaproveitar)
+    extras_periodo = collect_ranges(page, EXTRA_RANGES, capture)
+    if PRODUCT_PATTERNS and load_catalog() is None:
+        # primeira execução com padrões: descobre aqui mesmo antes dos produtos
+        try:
+            discover_products(page)
+        except LatencyBudgetExceeded:
+            raise
+        except Exception as e:
+            print(f"[WARN] Descoberta de produtos falhou ({e}); mantendo PRODUTOS.")
+        if apply_product_patterns() and produtos_padrao:
+            produtos = PRODUTOS
+
+    # ===============================
+    # (C) Filtro por produto (robusto)
+    # ===============================
+    produtos_vals: List[Optional[float]] = [None] * len(produtos)
+    fila: "queue.Queue" = queue.Queue()
+    for item in enumerate(produtos):
+        if item[1] not in PRODUCTS_REMOVED:
+            fila.put(item)
+
+    # Páginas extras (contextos no mesmo Chromium, com a sessão da principal) dividem a
+    # fila com a principal; todas são conduzidas desta thread
+    principal = {"page": page, "capture": capture, "tag": "main", "preparado": True}
+    n_extras = min(PRODUCT_CONCURRENCY, fila.qsize()) - 1
+    extras = open_product_pages(page, n_extras) if n_extras > 0 else []
+    if extras:
+        print(f"[INFO] Coletando {len(produtos)} produtos com {len(extras) + 1} páginas em paralelo.")
+    try:
+        drain_products([principal] + extras, fila, produtos_vals)
+    finally:
+        close_product_pages(extras)
+
+    # ===============================
+    # (D) Monta snapshot final
+    # ===============================
+    snapshot: Dict[str, float | str] = {
+        "timestamp": now_brasilia_str(),
+        "total": round(total_val, 2),
+    }
+
+    for i, val in enumerate(produtos_vals):
+        if val is not None:
+            snapshot[f"prod_{i+1}"] = round(val, 2)
+    snapshot.update(extras_periodo)
+
+    # ===============================
+    # (E) Validação com releitura só do que parecer errado
+    # ===============================
+    def reler(campo: str) -> Optional[float]:
+        if campo == "total":
+            return prepare_dashboard(page, capture)
+        return collect_product(page, produtos[int(campo[5:]) - 1], capture)
+
+    snapshot = validate_snapshot(snapshot, reler)
+
+    BUDGET.report()
+    print(f"[SUMMARY] Snapshot final: {snapshot}")
+    return snapshot
+
+
+# ====================== CLIENTE HTTP DIRETO ======================
+# "browser": fluxo completo com Playwright (padrão)
+# "http": chama a API com os cookies do storage_state; o navegador só renova a sessão
+FETCH_ENGINE = os.environ.get("ASSINY_ENGINE", "browser")
+API_BASE_URL = os.environ.get("ASSINY_API_URL", ASSINY_URL + "/api")
+API_TOTAL_PATH = os.environ.get("ASSINY_API_TOTAL_PATH", "/transactions/summary")
+API_PRODUCT_PARAM = os.environ.get("ASSINY_API_PRODUCT_PARAM", "product")
+API_TIMEOUT_S = 10.0
+
+# Chaves de localStorage que costumam carregar o token de acesso
+TOKEN_STORAGE_KEYS = ("accessToken", "access_token", "idToken", "id_token", "token")
+# Cookies com o JWT de acesso (a Assiny guarda em `token`; `refreshToken` não serve de bearer)
+TOKEN_COOKIE_NAMES = ("token", "accessToken", "access_token")
+
+def load_storage_state(path: Optional[str] = None) -> Dict:
+    try:
+        return json.loads(Path(path or STORAGE_STATE_FILE).read_text(encoding="utf-8"))
+    except Exception:
+        return {}
+
+def storage_cookies(state: Dict, host: str) -> Dict[str, str]:
+    """Cookies do storage_state válidos para `host` e ainda não expirados."""
+    agora = datetime.now(timezone.utc).timestamp()
+    cookies = {}
+    for c in state.get("cookies", []):
+        dominio = c.get("domain", "").lstrip(".")
+        if dominio and not (host == dominio or host.endswith("." + dominio)):
+            continue
+        expira = c.get("expires", -1)
+        if expira not in (-1, None) and expira < agora:
+            continue
+        cookies[c["name"]] = c["value"]
+    return cookies
+
+def storage_bearer_token(state: Dict, host: Optional[str] = None) -> Optional[str]:
+    """Token de acesso do localStorage de alguma origem ou, na falta, do cookie `token` do host."""
+    for origem in state.get("origins", []):
+        for item in origem.get("localStorage", []):
+            if item.get("name") in TOKEN_STORAGE_KEYS and item.get("value"):
+                return item["value"]
+    cookies = storage_cookies(state, host or urlparse(ASSINY_URL).hostname or "")
+    for nome in TOKEN_COOKIE_NAMES:
+        if cookies.get(nome):
+            return cookies[nome]
+    return None
+
+class AssinyApiClient:
+    """Cliente HTTP keep-alive (httpx) que reaproveita a sessão do storage_state."""
+
+    def __init__(self, storage_state: Optional[str] = None, base_url: Optional[str] = None):
+        import httpx  # só é necessário no modo "http"
+
+        base_url = base_url or API_BASE_URL
+        state = load_storage_state(storage_state)
+        host = urlparse(base_url).hostname or ""
+        headers = {"Accept": "application/json"}
+        token = storage_bearer_token(state, host)
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self.client = httpx.Client(
+            base_url=base_url,
+            cookies=storage_cookies(state, host),
+            headers=headers,
+            timeout=API_TIMEOUT_S,
+            limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60),
+            follow_redirects=False,
+        )
+
+    def get_total(self, produto: Optional[str] = None, periodo: Optional[str] = None) -> float:
+        inicio, fim = resolve_range(periodo or DATE_RANGE)
+        params = {
+            "startDate": inicio.isoformat(),
+            "endDate": fim.isoformat(),
+        }
+        if produto:
+            params[API_PRODUCT_PARAM] = produto
+        r = self.client.get(API_TOTAL_PATH, params=params)
+        # 401/403 ou redirecionamento para o login = sessão vencida
+        if r.status_code in (401, 403) or (r.is_redirect and "login" in r.headers.get("location", "")):
+            raise SessionExpired(f"HTTP {r.status_code}")
+        r.raise_for_status()
+        valor = extract_total_from_json(r.json())
+        if valor is None:
+            raise ValueError(f"Resposta sem valor reconhecível: {r.url}")
+        return valor
+
+    def close(self):
+        self.client.close()
+
+@traced("fetch_snapshot_http")
+def fetch_snapshot_http(client: AssinyApiClient) -> Dict:
+    """Mesmo formato de `fetch_snapshot`, sem abrir o navegador."""
+    total_val = client.get_total()
+    snapshot: Dict[str, float | str] = {
+        "timestamp": now_brasilia_str(),
+        "total": round(total_val, 2),
+    }
+    for i, nome in enumerate(PRODUTOS):
+        if nome in PRODUCTS_REMOVED:
+            continue
+        try:
+            snapshot[f"prod_{i+1}"] = round(client.get_total(nome), 2)
+        except SessionExpired:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Falha ao coletar produto '{nome}' via API: {e}")
+    for spec in EXTRA_RANGES:
+        try:
+            snapshot[range_field(spec)] = round(client.get_total(periodo=spec), 2)
+        except SessionExpired:
+            raise
+        except Exception as e:
+            print(f"[ERROR] Falha ao coletar o período '{spec}' via API: {e}")
+    snapshot = validate_snapshot(
+        snapshot, lambda campo: client.get_total(None if campo == "total" else PRODUTOS[int(campo[5:]) - 1])
+    )
+    print(f"[SUMMARY] Snapshot final (API): {snapshot}")
+    return snapshot
+
+def refresh_storage_state() -> bool:
+    """Abre o navegador só para deixar o servidor renovar os cookies e regrava o storage_state."""
+    with sync_playwright() as p:
+        browser = launch_browser(p)
+        context = new_scraping_context(browser, STORAGE_STATE_FILE)
+        page = context.new_page()
+        page.goto(ASSINY_URL, wait_until="domcontentloaded")
+        wait_condition(page, JS_AUTH_RESOLVIDA, timeout_ms=15000)
+        ok = "login" not in page.url
+        if ok:
+            if save_session(context.storage_state()):
+                print("[INFO] Sessão renovada e storage_state atualizado.")
+            else:
+                print("[INFO] Sessão válida; o servidor não renovou os cookies.")
+        else:
+            print(f"[ERROR] Sessão expirada. É necessário gerar um novo {STORAGE_STATE_FILE}.")
+        context.close()
+        browser.close()
+    return ok
+
+def refresh_and_collect() -> Optional[Dict]:
+    """
+    Sessão da API vencida: um único navegador renova os cookies e, se a API ainda
+    falhar, faz a própria coleta na página já aberta (sem lançar um segundo Chromium).
+    """
+    with sync_playwright() as p:
+        browser = launch_browser(p, headless=("--headed" not in sys.argv))
+        context = new_scraping_context(browser, STORAGE_STATE_FILE)
+        try:
+            page = context.new_page()
+            watch_page(page)
+            with span("login_check"):
+                page.goto(ASSINY_URL, wait_until="domcontentloaded")
+                wait_condition(page, JS_AUTH_RESOLVIDA, timeout_ms=15000)
+            if "login" in page.url:
+                print(f"[ERROR] Sessão expirada. É necessário gerar um novo {STORAGE_STATE_FILE}.")
+                raise SessionExpired("login")
+            if save_session(context.storage_state()):
+                print("[INFO] Sessão renovada e storage_state atualizado.")
+            client = None
+            try:
+                client = AssinyApiClient()
+                return fetch_snapshot_http(client)
+            except Exception as e:
+                print(f"[WARN] API falhou mesmo com a sessão renovada ({e}); coletando pelo navegador já aberto.")
+            finally:
+                if client:
+                    client.close()
+            snapshot = fetch_snapshot(page)
+            if snapshot is not None:
+                save_session(context.storage_state())
+            return snapshot
+        finally:
+            context.close()
+            browser.close()
+
+def run_http_snapshot() -> Optional[Dict]:
+    """Coleta via API. None = usar o navegador; SessionExpired sobe para renovar (ver fetch_once)."""
+    client = None
+    try:
+        client = AssinyApiClient()
+        return fetch_snapshot_http(client)
+    except SessionExpired as e:
+        print(f"[WARN] Sessão da API expirada ({e}).")
+        raise
+    except Exception as e:
+        print(f"[WARN] Coleta via API falhou, usando navegador: {e}")
+        return None
+    finally:
+        if client:
+            client.close()
+
+def run_browser_snapshot() -> Optional[Dict]:
+    har = playwright_har_options()
+    with sync_playwright() as p:
+        # 🔹 Importante: carregar o storage_state antes de criar a página
+        with span("launch"):
+            browser = launch_browser(p, headless=("--headed" not in sys.argv))
+            context = new_scraping_context(browser, STORAGE_STATE_FILE, **har)
+            start_playwright_trace(context)
+            page = context.new_page()
+            watch_page(page)
+
+        snapshot = None
+        try:
+            # 🔹 Acesse diretamente o painel já autenticado
+            with span("login_check"):
+                page.goto(ASSINY_URL, wait_until="domcontentloaded")
+                # espera o redirecionamento para o login ou o app montar (antes: networkidle + 2s)
+                wait_condition(page, JS_AUTH_RESOLVIDA, nominal_ms=2000, timeout_ms=15000)
+            print("[INFO] Página carregada, verificando autenticação...")
+
+            # Se ainda estiver na tela de login, logins expiraram
+            if "login" in page.url:
+                print(f"[ERROR] Sessão expirada. É necessário gerar um novo {STORAGE_STATE_FILE}.")
+            else:
+                print("✅ Login carregado com sucesso!")
+                snapshot = fetch_snapshot(page)
+                # cookies renovados pelo servidor durante a coleta valem para as próximas execuções
+                if snapshot is not None:
+                    save_session(context.storage_state())
+        finally:
+            stop_playwright_trace(context)
+            context.close()
+            finish_har(har)
+        browser.close()
+    return snapshot
+
+def fetch_once() -> Optional[Dict]:
+    """Uma coleta avulsa: API se configurada, navegador como fallback (nunca dois navegadores)."""
+    if FETCH_ENGINE == "http":
+        try:
+            snapshot = run_http_snapshot()
+        except SessionExpired:
+            # o navegador que renova a sessão também é o da coleta, se precisar
+            try:
+                return refresh_and_collect()
+            except SessionExpired:
+                return None
+        if snapshot is not None:
+            return snapshot
+    return run_browser_snapshot()
+
+# ====================== SESSÃO ======================
+# Renova a sessão quando faltar menos que isso para o primeiro vencimento
+SESSION_REFRESH_MARGIN_S = int(os.environ.get("ASSINY_SESSION_MARGIN_S", str(6 * 3600)))
+# Cookies que definem a sessão; vazio = os que parecem de autenticação (ou todos do host)
+SESSION_COOKIES = [c.strip() for c in os.environ.get("ASSINY_SESSION_COOKIES", "").split(",") if c.strip()]
+SESSION_COOKIE_PATTERN = re.compile(r"sess|auth|token|sid|jwt|refresh", re.IGNORECASE)
+# Cópias recentes do storage_state (ao lado do STATE_FILE, uma pasta por arquivo de sessão)
+SESSION_CACHE_NAME = "sessions"
+SESSION_CACHE_SIZE = 3
+# Último estado conhecido da sessão (vai para o trace e para o /health)
+SESSION_STATUS: Dict = {}
+_REFRESH_THREAD: Optional[threading.Thread] = None
+
+def jwt_expiry(token: str) -> Optional[float]:
+    """Campo `exp` (epoch) de um JWT, sem validar a assinatura."""
+    partes = token.split(".")
+    if len(partes) != 3:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(partes[1] + "=" * (-len(partes[1]) % 4)))
+        return float(payload["exp"]) if payload.get("exp") else None
+    except Exception:
+        return None
+
+def session_cookies(state: Dict, host: Optional[str] = None) -> List[Dict]:
+    """Cookies que definem a sessão do host (SESSION_COOKIES ou os que parecem de autenticação)."""
+    host = host or urlparse(ASSINY_URL).hostname or ""
+    cookies = []
+    for c in state.get("cookies", []):
+        dominio = c.get("domain", "").lstrip(".")
+        if dominio and not (host == dominio or host.endswith("." + dominio)):
+            continue
+        cookies.append(c)
+    if SESSION_COOKIES:
+        return [c for c in cookies if c["name"] in SESSION_COOKIES]
+    return [c for c in cookies if SESSION_COOKIE_PATTERN.search(c["name"])] or cookies
+
+def cookie_expiry(c: Dict) -> Optional[float]:
+    """Data do cookie ou, em cookie de sessão do navegador (expires=-1), o `exp` do JWT que ele guarda."""
+    if c.get("expires") not in (-1, None) and c["expires"] > 0:
+        return float(c["expires"])
+    return jwt_expiry(c.get("value") or "")
+
+def session_expiry(state: Dict, host: Optional[str] = None) -> Optional[float]:
+    """Vencimento (epoch) da sessão do host; None = desconhecido."""
+    host = host or urlparse(ASSINY_URL).hostname or ""
+    cookies = session_cookies(state, host)
+    # vencimento do próprio cookie (sessão do servidor, ex.: `session`) x `exp` do JWT guardado
+    # num cookie do navegador (token de acesso, ~1h, que o app renova sozinho)
+    datados = [float(c["expires"]) for c in cookies if (c.get("expires") or -1) > 0]
+    curtos = [cookie_expiry(c) for c in cookies if (c.get("expires") or -1) <= 0]
+    token = storage_bearer_token(state, host)
+    curtos = [exp for exp in curtos + [jwt_expiry(token) if token else None] if exp]
+    refresh = [c for c in cookies if "refresh" in c["name"].lower()]
+    if refresh or (datados and max(datados) > max(curtos, default=0)):
+        # com refreshToken (nem sempre um JWT) ou cookie de sessão mais longo, o token curto não conta
+        vencimentos = datados + [exp for exp in map(cookie_expiry, refresh) if exp]
+    else:
+        vencimentos = datados + curtos
+    return min(vencimentos) if vencimentos else None
+
+def session_fingerprint(state: Dict) -> str:
+    """Identidade da sessão: valores dos cookies de sessão e do token, vencimentos por hora."""
+    partes = sorted(
+        (c["name"], c.get("domain", ""), c.get("value", ""), int((cookie_expiry(c) or 0) // 3600))
+        for c in session_cookies(state)
+    )
+    return hashlib.sha256(json.dumps([partes, storage_bearer_token(state)]).encode("utf-8")).hexdigest()
+
+def session_status(path: Optional[str] = None) -> Dict:
+    """Validade e idade (desde a última gravação) de um storage_state, sem abrir o navegador."""
+    arquivo = Path(path or STORAGE_STATE_FILE)
+    if not arquivo.exists():
+        return {"path": str(arquivo), "exists": False, "valid": False}
+    agora = time.time()
+    expira = session_expiry(load_storage_state(str(arquivo)))
+    return {
+        "path": str(arquivo),
+        "exists": True,
+        "age_s": round(agora - arquivo.stat().st_mtime),
+        "expires_at": datetime.fromtimestamp(expira, timezone.utc).isoformat() if expira else None,
+        "remaining_s": round(expira - agora) if expira else None,
+        "valid": expira is None or expira > agora,
+    }
+
+def session_cache_dir(path: Optional[str] = None) -> Path:
+    return Path(STATE_FILE).parent / SESSION_CACHE_NAME / Path(path or STORAGE_STATE_FILE).stem
+
+def session_lock(path: Optional[str] = None):
+    """Lock exclusivo (flock) sobre a sessão: vale entre processos do --jobs e entre threads."""
+    return file_lock(session_cache_dir(path) / ".lock")
+
+def _write_json_atomic(destino: Path, dados: Dict):
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(f".{destino.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(dados, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, destino)
+
+def save_session(state: Dict, path: Optional[str] = None) -> bool:
+    """
+    Grava o storage_state e uma cópia na rotação do cache (descarta as mais antigas).
+    Só quando a sessão mudou: o daemon chama a cada ciclo e não deve encher o cache de cópias iguais.
+    """
+    path = path or STORAGE_STATE_FILE
+    with session_lock(path):
+        if Path(path).exists() and session_fingerprint(load_storage_state(path)) == session_fingerprint(state):
+            return False
+        _write_json_atomic(Path(path), state)
+        pasta = session_cache_dir(path)
+        _write_json_atomic(pasta / f"{int(time.time() * 1000)}.json", state)
+        for antiga in sorted(pasta.glob("*.json"), reverse=True)[SESSION_CACHE_SIZE:]:
+            antiga.unlink(missing_ok=True)
+    return True
+
+def refresh_session_in_background() -> threading.Thread:
+    """Renova a sessão numa thread própria (Playwright próprio) enquanto a coleta segue."""
+    global _REFRESH_THREAD
+    if _REFRESH_THREAD is None or not _REFRESH_THREAD.is_alive():
+        _REFRESH_THREAD = threading.Thread(target=refresh_storage_state, name="session-refresh")
+        _REFRESH_THREAD.start()
+    return _REFRESH_THREAD
+
+def ensure_session() -> bool:
+    """
+    Checagem offline antes de qualquer navegador: usa o storage_state válido mais
+    duradouro (arquivo principal ou cache), renova em segundo plano se estiver perto
+    de vencer e registra idade/validade. Vencimento curto, passado ou desconhecido só
+    gera aviso; False = nenhum storage_state.
+    """
+    global SESSION_STATUS
+    path = STORAGE_STATE_FILE
+    with session_lock(path):
+        principal = session_status(path)
+        candidatos = [session_status(str(c)) for c in sorted(session_cache_dir(path).glob("*.json"), reverse=True)]
+        validos = [s for s in [principal] + candidatos if s["valid"]]
+        # validade desconhecida conta como infinita; empate fica com a mais nova
+        melhor = max(
+            validos,
+            key=lambda s: (float("inf") if s["remaining_s"] is None else s["remaining_s"], -s["age_s"]),
+            default=None,
+        )
+        if melhor and melhor["path"] != principal["path"] and (
+            not principal["valid"] or (melhor["remaining_s"] or 0) > (principal["remaining_s"] or 0)
+        ):
+            _write_json_atomic(Path(path), load_storage_state(melhor["path"]))
+            print(f"[INFO] Sessão restaurada do cache ({Path(melhor['path']).name}).")
+            principal = session_status(path)
+    SESSION_STATUS = {**principal, "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+    TRACE.sessao = SESSION_STATUS
+
+    if not principal["exists"]:
+        print(f"[ERROR] Sessão {path} não encontrada. É necessário gerar um novo {path}.")
+        return False
+    restante = principal["remaining_s"]
+    if restante is None:
+        print(f"[WARN] Validade da sessão desconhecida (gravada há {principal['age_s'] / 3600:.1f}h); seguindo.")
+        return True
+    # é só uma estimativa pelos cookies: quem confirma o vencimento é o redirecionamento para o login
+    if restante <= 0:
+        print(f"[WARN] Sessão em {path} parece vencida ({principal['expires_at']}); tentando mesmo assim.")
+    elif restante < SESSION_REFRESH_MARGIN_S:
+        print(f"[WARN] Sessão vence em {restante / 3600:.1f}h (gravada há {principal['age_s'] / 3600:.1f}h).")
+    else:
+        print(f"[INFO] Sessão válida por mais {restante / 3600:.1f}h (gravada há {principal['age_s'] / 3600:.1f}h).")
+    # no modo navegador a própria coleta regrava a sessão no fim; no HTTP, renova em paralelo
+    if restante < SESSION_REFRESH_MARGIN_S and FETCH_ENGINE == "http":
+        print("[INFO] Sessão perto de vencer; renovando em segundo plano.")
+        refresh_session_in_background()
+    return True
+
+# ====================== COLETA INCREMENTAL ======================
+# "full": lê o acumulado desde DATE_ORIGIN a cada execução (padrão)
+# "incremental": lê só o dia corrente e soma a uma base local dos dias fechados
+COLLECT_MODE = os.environ.get("ASSINY_COLLECT_MODE", "full")
+# Intervalo da releitura completa que mede e corrige o desvio da base
+RECONCILE_INTERVAL_S = int(os.environ.get("ASSINY_RECONCILE_S", str(24 * 3600)))
+RUNNING_TOTALS_NAME = "running_totals.json"
+
+def running_totals_file() -> Path:
+    """Fica ao lado do STATE_FILE (separado por conta no modo --jobs)."""
+    return Path(STATE_FILE).parent / RUNNING_TOTALS_NAME
+
+def load_running_totals() -> Optional[Dict]:
+    try:
+        estado = json.loads(running_totals_file().read_text(encoding="utf-8"))
+    except Exception:
+        return None
+    # lista de produtos mudou: os campos prod_N da base não correspondem mais
+    if estado.get("products") != PRODUTOS:
+        print("[INFO] Lista de produtos mudou; base incremental descartada.")
+        return None
+    return estado
+
+def save_running_totals(estado: Dict):
+    arquivo = running_totals_file()
+    arquivo.parent.mkdir(parents=True, exist_ok=True)
+    tmp = arquivo.with_suffix(".tmp")
+    tmp.write_text(json.dumps(estado, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, arquivo)
+
+def base_fields(snapshot: Dict) -> Dict[str, float]:
+    """Campos que se acumulam no tempo ('total', 'prod_N'); períodos extras ficam de fora."""
+    return {k: float(v) for k, v in snapshot.items() if k == "total" or k.startswith("prod_")}
+
+def fetch_window(fetch: Callable[[], Optional[Dict]], inicio: date, fim: date,
+                 extras: bool = False) -> Optional[Dict]:
+    """Roda `fetch` com o período trocado para [inicio, fim]."""
+    global DATE_RANGE, EXTRA_RANGES
+    anterior = (DATE_RANGE, EXTRA_RANGES)
+    DATE_RANGE = f"{inicio.isoformat()}:{fim.isoformat()}"
+    if not extras:
+        EXTRA_RANGES = []
+    try:
+        with span(f"janela:{inicio:%d/%m}-{fim:%d/%m}"):
+            return fetch()
+    finally:
+        DATE_RANGE, EXTRA_RANGES = anterior
+
+def reconcile_due(estado: Optional[Dict]) -> bool:
+    if not estado or not estado.get("reconciled_at"):
+        return True
+    idade = datetime.now(timezone.utc) - datetime.fromisoformat(estado["reconciled_at"])
+    return idade.total_seconds() >= RECONCILE_INTERVAL_S
+
+def collect_incremental(fetch: Callable[[], Optional[Dict]], reconciliar: bool = False) -> Optional[Dict]:
+    """
+    Acumulado = base (dias fechados antes da âncora) + janela [âncora, hoje]. Na
+    virada do dia lê só os dias desde a âncora e soma à base; a reconciliação relê
+    os dias fechados por inteiro, registra o desvio e substitui a base. Leituras
+    incompletas (produto sem valor) nunca entram na base.
+    """
+    hoje = datetime.now(TZ_BRASILIA).date()
+    ontem = hoje - timedelta(days=1)
+    origem = date.fromisoformat(DATE_ORIGIN)
+    esperados = set(SnapshotValidator.fields())
+    estado = load_running_totals()
+    ancora = date.fromisoformat(estado["anchor"]) if estado else hoje
+
+    # 1️⃣ Virada de dia: fecha os dias entre a âncora e ontem
+    if estado and ancora < hoje:
+        fechamento = fetch_window(fetch, ancora, ontem)
+        if fechamento is None:
+            return None
+        novos = base_fields(fechamento)
+        if esperados - set(novos):
+            print(f"[WARN] Fechamento incompleto ({sorted(esperados - set(novos))}); a janela segue desde {ancora:%d/%m/%Y}.")
+        else:
+            estado["base"] = {k: round(estado["base"].get(k, 0.0) + v, 2) for k, v in novos.items()}
+            estado["anchor"] = hoje.isoformat()
+            ancora = hoje
+            save_running_totals(estado)
+            print(f"[INFO] Base incremental avançada até {ontem:%d/%m/%Y}.")
+
+    # 2️⃣ Janela desde a âncora (só o dia de hoje na maioria das execuções)
+    janela = fetch_window(fetch, ancora, hoje, extras=True)
+    if janela is None:
+        return None
+
+    # 3️⃣ Reconciliação periódica com os dias fechados lidos por inteiro
+    if reconciliar or reconcile_due(estado):
+        fim_base = ancora - timedelta(days=1)
+        if fim_base >= origem:
+            lido = fetch_window(fetch, origem, fim_base)
+            if lido is None:
+                return None
+            fechado = base_fields(lido)
+        else:
+            fechado = {k: 0.0 for k in esperados}
+        if esperados - set(fechado):
+            print(f"[WARN] Reconciliação incompleta ({sorted(esperados - set(fechado))}); fica para a próxima execução.")
+            if not estado:
+                return None
+        else:
+            desvio = {}
+            if estado:
+                for campo, valor in fechado.items():
+                    diff = round(valor - estado["base"].get(campo, 0.0), 2)
+                    if abs(diff) > CHANGE_TOLERANCES.get(campo, CHANGE_TOLERANCE_DEFAULT):
+                        desvio[campo] = diff
+                if desvio:
+                    print(f"[DRIFT] Base incremental corrigida: {desvio}")
+                else:
+                    print("[OK] Reconciliação sem desvio.")
+            estado = {
+                "products": list(PRODUTOS),
+                "anchor": ancora.isoformat(),
+                "base": {k: round(v, 2) for k, v in fechado.items()},
+                "reconciled_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "drift": desvio,
+            }
+            save_running_totals(estado)
+
+    snapshot = dict(janela)
+    for campo, valor in base_fields(janela).items():
+        snapshot[campo] = round(estado["base"].get(campo, 0.0) + valor, 2)
+    print(f"[SUMMARY] Snapshot incremental (base + janela): {snapshot}")
+
+    # campo suspeito: relê a janela uma vez (vale para todos os campos) em vez de esperar a próxima execução
+    releitura: Dict[str, Optional[Dict]] = {}
+
+    def reler(campo: str) -> Optional[float]:
+        if "janela" not in releitura:
+            releitura["janela"] = fetch_window(fetch, ancora, hoje)
+        nova = releitura["janela"]
+        if not nova or campo not in nova:
+            return None
+        return estado["base"].get(campo, 0.0) + float(nova[campo])
+
+    return validate_snapshot(snapshot, reler)
+
+def collect_snapshot(fetch: Callable[[], Optional[Dict]] = fetch_once,
+                     reconciliar: bool = False) -> Optional[Dict]:
+    """Ponto único de coleta para o modo avulso, o daemon e as contas (ver COLLECT_MODE)."""
+    if not ensure_session():
+        return None
+    prepare_product_catalog()
+    if COLLECT_MODE == "incremental":
+        if DATE_RANGE == "all_time":
+            return collect_incremental(fetch, reconciliar)
+        print(f"[WARN] Modo incremental só vale para 'all_time' (período atual: {DATE_RANGE}); lendo completo.")
+    return fetch()
+
+
+# ====================== PUBLICAÇÃO ======================
+# Destinos separados por vírgula: "git", "file", "webhook"
+PUBLISH_SINKS = os.environ.get("ASSINY_PUBLISH_SINKS", "git")
+# Fila local durável: sobrevive a quedas e acumula entre execuções do cron
+PUBLISH_QUEUE_FILE = "state/publish_queue.jsonl"
+PUBLISH_FILE = os.environ.get("ASSINY_PUBLISH_FILE", "state/published.jsonl")
+WEBHOOK_URL = os.environ.get("ASSINY_WEBHOOK_URL", "")
+# Publica quando a fila atinge N itens ou o item mais antigo passa da idade
+PUBLISH_BATCH_SIZE = max(1, int(os.environ.get("ASSINY_PUBLISH_BATCH", "1")))
+# Runner do Actions é descartável: a fila local não sobrevive, então publica tudo na hora
+EPHEMERAL_RUNNER = os.environ.get("GITHUB_ACTIONS") == "true"
+if EPHEMERAL_RUNNER and PUBLISH_BATCH_SIZE > 1:
+    print("[WARN] GITHUB_ACTIONS: fila local não persiste entre execuções; ignorando ASSINY_PUBLISH_BATCH.")
+    PUBLISH_BATCH_SIZE = 1
+PUBLISH_MAX_AGE_S = int(os.environ.get("ASSINY_PUBLISH_MAX_AGE_S", "3600"))
+PUBLISH_RETRIES = 4
+PUBLISH_BACKOFF_S = 2.0
+
+def idempotency_key(snapshot: Dict, account: Optional[str] = None) -> str:
+    """Mesma conta + mesmo snapshot (inclui o timestamp) = mesma chave."""
+    return f"{account or ACCOUNT_NAME}:{snapshot_hash(snapshot)}"
+
+def git_run(*args: str) -> bool:
+    r = subprocess.run(["git", *args], capture_output=True, text=True)
+    if r.returncode != 0:
+        print(f"[DEBUG] git {' '.join(args)}: {(r.stderr or r.stdout).strip()}")
+    return r.returncode == 0
+
+def git_ahead_of_remote(branch: str = "main") -> bool:
+    """HEAD tem commits que origin/<branch> não tem (ex.: commit de uma tentativa anterior sem push)."""
+    git_run("fetch", "origin", branch)
+    r = subprocess.run(["git", "rev-list", "--count", f"origin/{branch}..HEAD"], capture_output=True, text=True)
+    # sem referência remota conhecida: na dúvida, tenta o push
+    return r.returncode != 0 or int(r.stdout.strip() or 0) > 0
+
+def git_publish(paths: List[str], message: str = "assiny-scraper: mudança detectada, histórico atualizado") -> bool:
+    """
+    Commit/push automático no GitHub Actions. Sucesso = nada local fica sem push;
+    um commit de tentativa anterior (pull/push falhou) é enviado agora.
+    """
+    git_run("config", "user.name", "github-actions")
+    git_run("config", "user.email", "github-actions@github.com")
+    existentes = [p for p in paths if Path(p).exists()]
+    if not existentes or not git_run("add", "--", *existentes):
+        return False
+    if not git_run("diff", "--cached", "--quiet") and not git_run("commit", "-m", message):
+        return False
+    if not git_ahead_of_remote():
+        return True
+    if not git_run("pull", "--rebase", "origin", "main"):
+        git_run("rebase", "--abort")
+        return False
+    return git_run("push", "origin", "main")
+
+class GitSink:
+    name = "git"
+
+    def publish(self, itens: List[Dict]) -> bool:
+        arquivos = sorted({f for item in itens for f in item["files"]})
+        chaves = ", ".join(item["key"].split(":")[-1][:8] for item in itens)
+        return git_publish(arquivos, f"assiny-scraper: {len(itens)} snapshot(s) [{chaves}]")
+
+class FileSink:
+    """Acrescenta os snapshots em JSONL, ignorando chaves já publicadas."""
+
+    name = "file"
+
+    def __init__(self, path: str = PUBLISH_FILE):
+        self.path = Path(path)
+
+    def publish(self, itens: List[Dict]) -> bool:
+        vistos = set()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                vistos = {json.loads(linha).get("key") for linha in f if linha.strip()}
+        novos = [i for i in itens if i["key"] not in vistos]
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for item in novos:
+                f.write(json.dumps({"key": item["key"], "account": item["account"],
+                                    "snapshot": item["snapshot"]}, ensure_ascii=False) + "\n")
+        return True
+
+class WebhookSink:
+    """POST do lote em JSON; o receptor deduplica pelo cabeçalho Idempotency-Key."""
+
+    name = "webhook"
+
+    def __init__(self, url: str = WEBHOOK_URL, timeout_s: float = 10.0):
+        if not url:
+            raise ValueError("ASSINY_WEBHOOK_URL não definido")
+        self.url = url
+        self.timeout_s = timeout_s
+
+    def publish(self, itens: List[Dict]) -> bool:
+        corpo = json.dumps(
+            {"items": [{"idempotency_key": i["key"], "account": i["account"],
+                        "snapshot": i["snapshot"]} for i in itens]},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        chave_lote = hashlib.md5("|".join(i["key"] for i in itens).encode("utf-8")).hexdigest()
+        req = urllib.request.Request(
+            self.url,
+            data=corpo,
+            method="POST",
+            headers={"Content-Type": "application/json", "Idempotency-Key": chave_lote},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout_s) as resp:
+                return 200 <= resp.status < 300
+        except urllib.error.HTTPError as e:
+            # 409 = lote já recebido antes
+            return e.code == 409
+        except Exception as e:
+            print(f"[DEBUG] webhook: {e}")
+            return False
+
+def build_sinks(nomes: str = PUBLISH_SINKS) -> List:
+    fabricas = {"git": GitSink, "file": FileSink, "webhook": WebhookSink}
+    sinks = []
+    for nome in (n.strip() for n in nomes.split(",")):
+        if not nome:
+            continue
+        if nome not in fabricas:
+            raise ValueError(f"Destino de publicação desconhecido: {nome!r}")
+        sinks.append(fabricas[nome]())
+    return sinks
+
+class Publisher:
+    """
+    Fila local de snapshots publicada em lotes por uma thread própria, para que a
+    coleta nunca espere por git/rede. Cada destino tem retentativas com backoff
+    exponencial; um lote só sai da fila quando todos os destinos confirmam, e as
+    chaves de idempotência tornam seguro reenviar um lote parcialmente publicado.
+    """
+
+    def __init__(self, sinks: List, batch_size: int = PUBLISH_BATCH_SIZE,
+                 max_age_s: int = PUBLISH_MAX_AGE_S, queue_file: str = PUBLISH_QUEUE_FILE):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.max_age_s = max_age_s
+        self.queue_file = Path(queue_file)
+        self._cond = threading.Condition()
+        self._pedido = 0      # flushes explícitos pedidos
+        self._atendido = 0    # flushes explícitos já processados pela thread
+        self._parar = False
+        self._flush_final = False
+        self.pendentes: List[Dict] = self._load()
+        self._thread = threading.Thread(target=self._loop, name="publisher", daemon=True)
+        self._thread.start()
+
+    def _load(self) -> List[Dict]:
+        if not self.queue_file.exists():
+            return []
+        itens = []
+        with open(self.queue_file, encoding="utf-8") as f:
+            for linha in f:
+                if linha.strip():
+                    itens.append(json.loads(linha))
+        if itens:
+            print(f"[INFO] {len(itens)} snapshot(s) pendentes na fila de publicação.")
+        return itens
+
+    def _save(self):
+        self.queue_file.parent.mkdir(exist_ok=True, parents=True)
+        tmp = self.queue_file.with_suffix(".tmp")
+        tmp.write_text("".join(json.dumps(i, ensure_ascii=False) + "\n" for i in self.pendentes), encoding="utf-8")
+        tmp.replace(self.queue_file)
+
+    def submit(self, snapshot: Dict, files: List[str], account: Optional[str] = None):
+        """Enfileira e volta na hora; a thread decide quando publicar."""
+        item = {
+            "key": idempotency_key(snapshot, account),
+            "account": account or ACCOUNT_NAME,
+            "snapshot": snapshot,
+            "files": files,
+            "queued_at": time.time(),
+        }
+        with self._cond:
+            if any(i["key"] == item["key"] for i in self.pendentes):
+                return
+            self.pendentes.append(item)
+            self._save()
+            self._cond.notify_all()
+
+    def _due(self, forcar: bool = False) -> bool:
+        if not self.pendentes:
+            return False
+        if forcar or len(self.pendentes) >= self.batch_size:
+            return True
+        return time.time() - self.pendentes[0]["queued_at"] >= self.max_age_s
+
+    def _publish_sink(self, sink, lote: List[Dict]) -> bool:
+        for tentativa in range(PUBLISH_RETRIES):
+            try:
+                if sink.publish(lote):
+                    return True
+            except Exception as e:
+                print(f"[WARN] Publicação '{sink.name}' falhou: {e}")
+            if tentativa < PUBLISH_RETRIES - 1:
+                time.sleep(PUBLISH_BACKOFF_S * 2 ** tentativa)
+        return False
+
+    def _flush_once(self) -> bool:
+        with self._cond:
+            lote = list(self.pendentes)
+        ok = all([self._publish_sink(sink, lote) for sink in self.sinks])
+        if not ok:
+            print(f"[WARN] Lote de {len(lote)} snapshot(s) mantido na fila para nova tentativa.")
+            return False
+        publicados = {i["key"] for i in lote}
+        with self._cond:
+            self.pendentes = [i for i in self.pendentes if i["key"] not in publicados]
+            self._save()
+        print(f"[INFO] {len(lote)} snapshot(s) publicados em {[s.name for s in self.sinks]}.")
+        return True
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._parar or self._pedido > self._atendido or self._due(),
+                    timeout=5,
+                )
+                pedido = self._pedido
+                parar = self._parar
+                forcar = pedido > self._atendido or (parar and self._flush_final)
+            if self._due(forcar):
+                self._flush_once()
+            with self._cond:
+                self._atendido = pedido
+                self._cond.notify_all()
+            if parar:
+                return
+
+    def flush(self, wait: bool = True, timeout_s: float = 300):
+        """Publica tudo o que está na fila agora, independente de tamanho/idade."""
+        with self._cond:
+            self._pedido += 1
+            alvo = self._pedido
+            self._cond.notify_all()
+            if wait:
+                self._cond.wait_for(lambda: self._atendido >= alvo, timeout=timeout_s)
+
+    def close(self, flush_all: bool = False):
+        """Encerra a thread; publica antes o que estiver vencido (ou tudo, com `flush_all`)."""
+        with self._cond:
+            self._parar = True
+            self._flush_final = flush_all
+            self._cond.notify_all()
+        self._thread.join()
+
+PUBLISHER: Optional[Publisher] = None
+
+def get_publisher() -> Publisher:
+    global PUBLISHER
+    if PUBLISHER is None:
+        PUBLISHER = Publisher(build_sinks())
+    return PUBLISHER
+
+def shutdown_publisher(flush_all: bool = False):
+    global PUBLISHER
+    if PUBLISHER is not None:
+        PUBLISHER.close(flush_all)
+        PUBLISHER = None
+
+def snapshot_files() -> List[str]:
+    """Arquivos que uma gravação altera (o que a publicação precisa levar)."""
+    if STORE_BACKEND != "csv":
+        arquivos = [STORE_PATHS[STORE_BACKEND]]
+    else:
+        arquivos = [OUTPUT_CSV, STATE_FILE, str(csv_columns_file())] + csv_versions()
+    if VALIDATION_ENABLED:
+        # janela do z-score e pendências: sem isso cada checkout do CI valida do zero
+        arquivos.append(str(validation_state_file()))
+    if COLLECT_MODE == "incremental":
+        # sem a base, a próxima execução (ex.: no CI) teria que reconciliar do zero
+        arquivos.append(str(running_totals_file()))
+    return arquivos
+
+@traced("record_snapshot")
+def record_snapshot(snapshot: Dict, publicar: bool = True) -> bool:
+    """Compara com o último estado e, se mudou, grava e enfileira a publicação. Retorna se mudou."""
+    if STORE_BACKEND != "csv":
+        changed = record_snapshot_store(snapshot)
+    else:
+        changed = record_snapshot_csv(snapshot)
+    if changed and publicar:
+        get_publisher().submit(snapshot, snapshot_files())
+    emit_snapshot(snapshot, changed)
+    return changed
+
+def record_snapshot_csv(snapshot: Dict) -> bool:
+    ensure_dirs()
+    last_snapshot = load_last_snapshot()
+
+    # só valores contam; o timestamp muda em toda execução. Só as colunas do CSV:
+    # um período extra (ex.: total_today) mudando sozinho geraria uma linha idêntica
+    mudou = changed_fields(last_snapshot, snapshot, campos=csv_fields())
+    heartbeat = not mudou and heartbeat_due(last_snapshot, snapshot)
+    changed = bool(mudou) or heartbeat
+
+    if changed:
+        append_csv_row(snapshot)
+        save_snapshot(snapshot)
+        if mudou:
+            print(f"[INFO] Mudança detectada em {mudou}. CSV e estado atualizados.")
+        else:
+            print("[INFO] Sem mudanças, mas heartbeat vencido. CSV e estado atualizados.")
+    else:
+        print("[INFO] Sem mudanças. Nada a registrar.")
+    return changed
+
+def record_snapshot_store(snapshot: Dict) -> bool:
+    """
+    Mesma lógica com SQLite/Parquet, mas em delta: grava só os campos que mudaram;
+    o heartbeat (ou o primeiro snapshot) grava a linha completa.
+    """
+    with open_store() as store:
+        last_snapshot = store.latest_snapshot()
+        mudou = changed_fields(last_snapshot, snapshot)
+        if last_snapshot is None or (not mudou and heartbeat_due(last_snapshot, snapshot)):
+            store.append_snapshot(snapshot)
+            print(f"[INFO] Snapshot completo gravado ({STORE_BACKEND}).")
+            return True
+        if mudou:
+            store.append_snapshot(snapshot, campos=mudou)
+            print(f"[INFO] Mudança detectada em {mudou}. Delta gravado ({STORE_BACKEND}).")
+            return True
+        print("[INFO] Sem mudanças. Nada a registrar.")
+    return False
+
+
+# ====================== STREAM E MÉTRICAS ======================
+# Destino do stream JSON-line dos snapshots: "" (desligado), "stdout", "stderr",
+# "tcp://host:porta", "unix:/caminho/do/socket" ou um arquivo (append)
+STREAM_TARGET = os.environ.get("ASSINY_STREAM", "")
+STREAM_TIMEOUT_S = 2.0
+# Limites (s) do histograma de duração das coletas em /metrics
+RUN_DURATION_BUCKETS = (5, 10, 20, 30, 60, 120, 300, 600)
+_STREAM: Optional["SnapshotStream"] = None
+# stdout original enquanto o stream o ocupa (sys.stdout aponta para o stderr)
+_STREAM_STDOUT = None
+
+def field_label(campo: str) -> str:
+    """Nome legível de um campo do snapshot: produto para prod_N, 'total:X' para períodos."""
+    m = re.fullmatch(r"prod_(\d+)", campo)
+    if m and 0 < int(m.group(1)) <= len(PRODUTOS):
+        return PRODUTOS[int(m.group(1)) - 1]
+    if campo.startswith("total_"):
+        return "total:" + campo[len("total_"):]
+    return campo
+
+class SnapshotStream:
+    """Uma linha JSON por snapshot registrado; sockets são reconectados sob demanda."""
+
+    def __init__(self, destino: str):
+        self.destino = destino
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import socket
+        if self.destino.startswith("tcp://"):
+            alvo = urlparse(self.destino)
+            return socket.create_connection((alvo.hostname, alvo.port), timeout=STREAM_TIMEOUT_S)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(STREAM_TIMEOUT_S)
+        sock.connect(self.destino[len("unix:"):])
+        return sock
+
+    def _write(self, linha: str):
+        if self.destino in ("stdout", "-"):
+            # o stdout de verdade: enquanto o stream usa o stdout, os prints vão para o stderr
+            saida = _STREAM_STDOUT or sys.stdout
+            saida.write(linha)
+            saida.flush()
+        elif self.destino == "stderr":
+            sys.stderr.write(linha)
+            sys.stderr.flush()
+        elif self.destino.startswith(("tcp://", "unix:")):
+            if self._sock is None:
+                self._sock = self._connect()
+            self._sock.sendall(linha.encode("utf-8"))
+        else:
+            with open(self.destino, "a", encoding="utf-8") as f:
+                f.write(linha)
+
+    def emit(self, evento: Dict):
+        linha = json.dumps(evento, ensure_ascii=False) + "\n"
+        with self._lock:
+            for tentativa in range(2):
+                try:
+                    self._write(linha)
+                    return
+                except OSError as e:
+                    # conexão caída: reconecta uma vez; o snapshot não deve travar a coleta
+                    self.close_socket()
+                    if tentativa:
+                        print(f"[WARN] Stream {self.destino} indisponível ({e}); snapshot não enviado.")
+
+    def close_socket(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+def configure_stream(destino: str):
+    """Troca o destino do stream; com stdout, o log (prints) passa para o stderr."""
+    global STREAM_TARGET, _STREAM, _STREAM_STDOUT
+    if _STREAM is not None:
+        _STREAM.close_socket()
+    STREAM_TARGET, _STREAM = destino, None
+    if destino in ("stdout", "-"):
+        if _STREAM_STDOUT is None:
+            sys.stdout.flush()
+            _STREAM_STDOUT, sys.stdout = sys.stdout, sys.stderr
+    elif _STREAM_STDOUT is not None:
+        sys.stdout, _STREAM_STDOUT = _STREAM_STDOUT, None
+
+def emit_snapshot(snapshot: Dict, changed: bool):
+    """Envia o snapshot ao stream configurado (se houver), mudando ou não."""
+    global _STREAM
+    if not STREAM_TARGET:
+        return
+    if _STREAM is None:
+        _STREAM = SnapshotStream(STREAM_TARGET)
+    campos = value_fields(snapshot)
+    _STREAM.emit({
+        "account": ACCOUNT_NAME,
+        "timestamp": snapshot.get("timestamp"),
+        "changed": changed,
+        "confidence": snapshot.get("confidence"),
+        "values": {campo: snapshot[campo] for campo in campos},
+        "labels": {campo: field_label(campo) for campo in campos},
+    })
+
+def _metric_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    def escapa(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escapa(v)}"' for k, v in labels.items()) + "}"
+
+def _metric_value(valor) -> str:
+    valor = float(valor)
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(valor) if not valor.is_integer() else str(int(valor))
+
+def render_metrics(health: "DaemonHealth", openmetrics: bool = False) -> str:
+    """Exposição Prometheus (text 0.0.4) ou OpenMetrics do estado do daemon."""
+    linhas: List[str] = []
+
+    def familia(nome: str, tipo: str, ajuda: str, amostras: List[tuple]):
+        # no formato Prometheus o contador é declarado já com o sufixo _total
+        declarado = nome + "_total" if tipo == "counter" and not openmetrics else nome
+        linhas.append(f"# HELP {declarado} {ajuda}")
+        linhas.append(f"# TYPE {declarado} {tipo}")
+        for sufixo, labels, valor in amostras:
+            linhas.append(f"{nome}{sufixo}{_metric_labels(labels)} {_metric_value(valor)}")
+
+    dados = health.metrics_snapshot()
+    conta = {"account": ACCOUNT_NAME}
+    snapshot = dados["ultimo_snapshot"] or {}
+    familia("assiny_value", "gauge", "Último valor coletado (R$) por campo.", [
+        ("", {**conta, "field": campo, "name": field_label(campo)}, snapshot[campo])
+        for campo in value_fields(snapshot)
+    ])
+    if snapshot.get("confidence") is not None:
+        familia("assiny_snapshot_confidence", "gauge", "Confiança (0 a 1) do último snapshot.",
+                [("", conta, snapshot["confidence"])])
+    if dados["ultimo_sucesso_ts"]:
+        familia("assiny_last_success_timestamp_seconds", "gauge", "Epoch da última coleta bem-sucedida.",
+                [("", conta, dados["ultimo_sucesso_ts"])])
+    familia("assiny_up", "gauge", "1 se o daemon está saudável.", [("", conta, int(health.healthy))])
+
+    acumulado = 0
+    baldes = []
+    for limite, n in zip(RUN_DURATION_BUCKETS, dados["duracoes"]):
+        acumulado += n
+        baldes.append(("_bucket", {**conta, "le": _metric_value(limite)}, acumulado))
+    baldes.append(("_bucket", {**conta, "le": "+Inf"}, dados["execucoes"]))
+    familia("assiny_run_duration_seconds", "histogram", "Duração das coletas (sucesso ou falha).",
+            baldes + [("_sum", conta, round(dados["duracao_soma_s"], 3)), ("_count", conta, dados["execucoes"])])
+
+    familia("assiny_runs", "counter", "Coletas executadas.", [("_total", conta, dados["execucoes"])])
+    familia("assiny_failures", "counter", "Coletas que falharam, por tipo de erro.", [
+        ("_total", {**conta, "error": tipo}, n) for tipo, n in sorted(dados["falhas_por_tipo"].items())
+    ])
+    familia("assiny_consecutive_failures", "gauge", "Falhas seguidas desde o último sucesso.",
+            [("", conta, dados["falhas_seguidas"])])
+    familia("assiny_snapshot_changes", "counter", "Coletas que gravaram um snapshot novo.",
+            [("_total", conta, dados["mudancas"])])
+    familia("assiny_session_recoveries", "counter", "Contextos recriados por sessão expirada.",
+            [("_total", conta, dados["recuperacoes_sessao"])])
+    if SESSION_STATUS.get("remaining_s") is not None:
+        familia("assiny_session_remaining_seconds", "gauge", "Tempo até o primeiro vencimento da sessão.",
+                [("", conta, SESSION_STATUS["remaining_s"])])
+    if SESSION_STATUS.get("age_s") is not None:
+        familia("assiny_session_age_seconds", "gauge", "Idade do storage_state na última checagem.",
+                [("", conta, SESSION_STATUS["age_s"])])
+    if openmetrics:
+        linhas.append("# EOF")
+    return "\n".join(linhas) + "\n"
+
+
+# ====================== DAEMON ======================
+# Intervalo entre coletas no modo --daemon ("30m", "45s", "2h" ou segundos)
+DAEMON_INTERVAL = os.environ.get("ASSINY_INTERVAL", "30m")
+# Porta local do endpoint /health (0 desliga)
+HEALTH_PORT = int(os.environ.get("ASSINY_HEALTH_PORT", "8765"))
+# Falhas seguidas a partir das quais /health responde 503
+DAEMON_MAX_FAILURES = 3
+# Menor intervalo aceito: abaixo disso o daemon vira um loop martelando o painel
+DAEMON_MIN_INTERVAL_S = float(os.environ.get("ASSINY_MIN_INTERVAL_S", "60"))
+
+def parse_interval(txt: str) -> float:
+    """Converte '30m', '45s', '2h', '1d' ou '90' (segundos) em segundos."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", str(txt).lower())
+    if not m:
+        raise ValueError(f"Intervalo inválido: {txt!r}")
+    segundos = float(m.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}[m.group(2)]
+    if segundos <= 0:
+        raise ValueError(f"Intervalo precisa ser positivo: {txt!r}")
+    return segundos
+
+class DaemonHealth:
+    """Estado do daemon exposto em /health (contadores e tempos da última coleta)."""
+
+    def __init__(self):
+        self.iniciado_em = datetime.now(timezone.utc).isoformat()
+        self.execucoes = 0
+        self.falhas = 0
+        self.falhas_seguidas = 0
+        self.recuperacoes_sessao = 0
+        self.ultima_execucao_em: Optional[str] = None
+        self.ultima_duracao_s: Optional[float] = None
+        self.ultimo_sucesso_em: Optional[str] = None
+        self.ultimo_erro: Optional[str] = None
+        self.ultimo_snapshot: Optional[Dict] = None
+        self.mudancas = 0
+        self.falhas_por_tipo: Dict[str, int] = {}
+        self._inicio = 0.0
+        self._ultimo_sucesso_ts: Optional[float] = None
+        self._duracoes = [0] * len(RUN_DURATION_BUCKETS)
+        self._duracao_soma_s = 0.0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        with self._lock:
+            self._inicio = time.monotonic()
+            self.ultima_execucao_em = datetime.now(timezone.utc).isoformat()
+
+    def _end(self):
+        """Fecha a execução corrente (chamado com o lock): duração e histograma."""
+        self.execucoes += 1
+        duracao = time.monotonic() - self._inicio
+        self.ultima_duracao_s = round(duracao, 3)
+        self._duracao_soma_s += duracao
+        for i, limite in enumerate(RUN_DURATION_BUCKETS):
+            if duracao <= limite:
+                self._duracoes[i] += 1
+                break
+
+    def success(self, snapshot: Dict, mudou: bool = False):
+        with self._lock:
+            self._end()
+            self.falhas_seguidas = 0
+            self.mudancas += int(mudou)
+            self._ultimo_sucesso_ts = time.time()
+            self.ultimo_sucesso_em = datetime.now(timezone.utc).isoformat()
+            self.ultimo_snapshot = snapshot
+
+    def failure(self, erro: Exception):
+        with self._lock:
+            self._end()
+            self.falhas += 1
+            self.falhas_seguidas += 1
+            self.falhas_por_tipo[type(erro).__name__] = self.falhas_por_tipo.get(type(erro).__name__, 0) + 1
+            self.ultimo_erro = f"{type(erro).__name__}: {erro}"
+
+    def session_recovered(self):
+        with self._lock:
+            self.recuperacoes_sessao += 1
+
+    def metrics_snapshot(self) -> Dict:
+        """Cópia consistente dos contadores para o /metrics."""
+        with self._lock:
+            return {
+                "ultimo_snapshot": dict(self.ultimo_snapshot or {}),
+                "ultimo_sucesso_ts": self._ultimo_sucesso_ts,
+                "duracoes": list(self._duracoes),
+                "duracao_soma_s": self._duracao_soma_s,
+                "execucoes": self.execucoes,
+                "falhas_seguidas": self.falhas_seguidas,
+                "falhas_por_tipo": dict(self.falhas_por_tipo),
+                "mudancas": self.mudancas,
+                "recuperacoes_sessao": self.recuperacoes_sessao,
+            }
+
+    @property
+    def healthy(self) -> bool:
+        return self.falhas_seguidas < DAEMON_MAX_FAILURES
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            dados = {k: v for k, v in vars(self).items() if not k.startswith("_")}
+        dados["healthy"] = self.healthy
+        dados["session"] = SESSION_STATUS
+        return dados
+
+class HealthHandler(BaseHTTPRequestHandler):
+    health: Optional[DaemonHealth] = None
+
+    def do_GET(self):
+        caminho = self.path.split("?", 1)[0].rstrip("/")
+        if caminho not in ("/health", "/metrics") or self.health is None:
+            self.send_error(404)
+            return
+        if caminho == "/metrics":
+            openmetrics = "application/openmetrics-text" in self.headers.get("Accept", "")
+            corpo = render_metrics(self.health, openmetrics).encode("utf-8")
+            tipo = ("application/openmetrics-text; version=1.0.0; charset=utf-8" if openmetrics
+                    else "text/plain; version=0.0.4; charset=utf-8")
+            self.send_response(200)
+        else:
+            corpo = json.dumps(self.health.as_dict(), ensure_ascii=False).encode("utf-8")
+            tipo = "application/json; charset=utf-8"
+            self.send_response(200 if self.health.healthy else 503)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_health_server(health: DaemonHealth, port: int = HEALTH_PORT) -> Optional[ThreadingHTTPServer]:
+    if not port:
+        return None
+    handler = type("BoundHealthHandler", (HealthHandler,), {"health": health})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Health em http://127.0.0.1:{port}/health e métricas em /metrics")
+    return server
+
+class WarmBrowser:
+    """Mantém navegador, contexto autenticado e página vivos entre as coletas."""
+
+    def __init__(self, playwright, headless: bool = True):
+        self.playwright = playwright
+        self.headless = headless
+        self.browser = None
+        self.context = None
+        self.page = None
+
+    def ensure(self):
+        if self.browser is None or not self.browser.is_connected():
+            print("[INFO] Iniciando navegador do daemon...")
+            self.browser = launch_browser(self.playwright, headless=self.headless)
+            self.context = None
+        if self.context is None:
+            # relê o arquivo: pode ter sido regenerado enquanto o daemon rodava
+            self.context = new_scraping_context(self.browser, STORAGE_STATE_FILE)
+            self.page = None
+        if self.page is None or self.page.is_closed():
+            self.page = self.context.new_page()
+            watch_page(self.page)
+        return self.page
+
+    def reset_context(self):
+        try:
+            if self.context:
+                self.context.close()
+        except Exception:
+            pass
+        self.context = None
+        self.page = None
+
+    def close(self):
+        self.reset_context()
+        try:
+            if self.browser:
+                self.browser.close()
+        except Exception:
+            pass
+        self.browser = None
+
+def daemon_cycle(warm: WarmBrowser, health: DaemonHealth) -> Dict:
+    """Uma coleta com o navegador aquecido; se a sessão caiu, recria o contexto uma vez."""
+    for tentativa in range(2):
+        page = warm.ensure()
+        start_playwright_trace(warm.context)
+        try:
+            # página aquecida: reaproveita dashboard, desbloqueio e período do ciclo anterior
+            snapshot = fetch_snapshot(page, reaproveitar=True)
+            # mantém o arquivo (e o cache) tão novo quanto o contexto aquecido
+            save_session(warm.context.storage_state())
+            return snapshot
+        except SessionExpired as e:
+            if tentativa:
+                raise
+            print(f"[WARN] Sessão expirada no daemon ({e}); recriando contexto a partir de {STORAGE_STATE_FILE}...")
+            health.session_recovered()
+            warm.reset_context()
+        except Exception:
+            # página/contexto possivelmente em estado ruim: começa do zero na próxima
+            warm.reset_context()
+            raise
+        finally:
+            if warm.context is not None:
+                stop_playwright_trace(warm.context)
+    raise SessionExpired("sessão continua expirada")
+
+def run_daemon(interval_s: float, health_port: int = HEALTH_PORT, headless: bool = True):
+    """Coleta em intervalo fixo mantendo o navegador aquecido, até SIGINT/SIGTERM."""
+    if interval_s < DAEMON_MIN_INTERVAL_S:
+        print(f"[WARN] Intervalo de {interval_s:.0f}s abaixo do mínimo; usando {DAEMON_MIN_INTERVAL_S:.0f}s.")
+        interval_s = DAEMON_MIN_INTERVAL_S
+    health = DaemonHealth()
+    server = start_health_server(health, health_port)
+    parar = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: parar.set())
+    print(f"[INFO] Daemon iniciado: coleta a cada {interval_s:.0f}s.")
+
+    with sync_playwright() as p:
+        warm = WarmBrowser(p, headless=headless)
+        proxima = time.monotonic()
+        try:
+            while not parar.is_set():
+                health.begin()
+                reset_latency_budget()
+                start_trace()
+                try:
+                    snapshot = collect_snapshot(lambda: daemon_cycle(warm, health))
+                    if snapshot is None:
+                        raise RuntimeError("coleta sem resultado (sessão vencida ou leitura incompleta)")
+                    mudou = record_snapshot(snapshot)
+                    health.success(snapshot, mudou)
+                    TRACE.finish(ok=True)
+                    print(f"[INFO] Coleta concluída em {health.ultima_duracao_s:.1f}s.")
+                except Exception as e:
+                    health.failure(e)
+                    TRACE.finish(ok=False)
+                    print(f"[ERROR] Coleta do daemon falhou: {e}")
+
+                # agenda pela grade fixa; se atrasou, roda de novo imediatamente
+                proxima += interval_s
+                espera = proxima - time.monotonic()
+                if espera < 0:
+                    print(f"[WARN] Coleta passou do intervalo em {-espera:.1f}s.")
+                    proxima = time.monotonic()
+                    espera = 0
+                parar.wait(espera)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            warm.close()
+
+    shutdown_publisher(flush_all=True)
+    if server:
+        server.shutdown()
+    print("[INFO] Daemon encerrado.")
+
+# ====================== MULTI-CONTA ======================
+# Conexões simultâneas no modo --jobs (cada conta roda em um processo isolado)
+JOBS_CONCURRENCY = int(os.environ.get("ASSINY_JOBS_CONCURRENCY", str(os.cpu_count() or 2)))
+
+def load_job_spec(path: str) -> Dict:
+    """
+    Lê o arquivo de contas (JSON ou YAML):
+
+        {"concurrency": 4,
+         "accounts": [{"name": "empresa-a", "storage_state": "sessions/a.json",
+                       "products": ["..."], "url": "...", "transactions_path": "...",
+                       "engine": "browser", "output_dir": "accounts/empresa-a",
+                       "range": "all_time", "extra_ranges": ["today", "month_to_date"]}]}
+
+    Só `name` é obrigatório; os demais campos herdam a configuração do módulo.
+    """
+    texto = Path(path).read_text(encoding="utf-8")
+    if Path(path).suffix.lower() in (".yml", ".yaml"):
+        import yaml  # só é necessário para specs em YAML
+
+        spec = yaml.safe_load(texto) or {}
+    else:
+        spec = json.loads(texto)
+    contas = spec.get("accounts") or []
+    nomes = [c.get("name") for c in contas]
+    if not contas or not all(nomes):
+        raise ValueError(f"{path}: cada item de 'accounts' precisa de 'name'")
+    if len(set(nomes)) != len(nomes):
+        raise ValueError(f"{path}: nomes de conta repetidos")
+    return spec
+
+# Configuração de import: o pool reaproveita processos, então cada conta parte
+# destes valores, e não do que a conta anterior deixou nos globais
+_ACCOUNT_DEFAULTS = {
+    nome: globals()[nome] for nome in (
+        "ASSINY_URL", "TRANSACOES_PATH", "STORAGE_STATE_FILE", "PRODUTOS", "PRODUCT_PATTERNS",
+        "FETCH_ENGINE", "DATE_RANGE", "EXTRA_RANGES", "OUTPUT_CSV", "STATE_FILE", "API_BASE_URL",
+    )
+}
+
+def apply_account(conta: Dict):
+    """Aponta a configuração do módulo para uma conta (válido só no processo atual)."""
+    global ASSINY_URL, TRANSACOES_PATH, STORAGE_STATE_FILE, PRODUTOS
+    global OUTPUT_CSV, STATE_FILE, API_BASE_URL, FETCH_ENGINE, ACCOUNT_NAME
+    global DATE_RANGE, EXTRA_RANGES, PRODUCT_PATTERNS, PRODUCTS_REMOVED
+    padrao = _ACCOUNT_DEFAULTS
+    saida = Path(conta.get("output_dir") or Path("accounts") / conta["name"])
+    ASSINY_URL = conta.get("url", padrao["ASSINY_URL"])
+    TRANSACOES_PATH = conta.get("transactions_path", padrao["TRANSACOES_PATH"])
+    STORAGE_STATE_FILE = conta.get("storage_state", padrao["STORAGE_STATE_FILE"])
+    PRODUTOS = list(conta.get("products", padrao["PRODUTOS"]))
+    PRODUCT_PATTERNS = list(conta.get("product_patterns", padrao["PRODUCT_PATTERNS"]))
+    PRODUCTS_REMOVED = set()
+    # conta com outra URL e sem api_url: a API fica no mesmo host; senão vale ASSINY_API_URL
+    API_BASE_URL = conta.get("api_url", conta["url"] + "/api" if "url" in conta else padrao["API_BASE_URL"])
+    FETCH_ENGINE = conta.get("engine", padrao["FETCH_ENGINE"])
+    DATE_RANGE = conta.get("range", padrao["DATE_RANGE"])
+    EXTRA_RANGES = list(conta.get("extra_ranges", padrao["EXTRA_RANGES"]))
+    ACCOUNT_NAME = conta["name"]
+    OUTPUT_CSV = str(saida / Path(padrao["OUTPUT_CSV"]).name)
+    STATE_FILE = str(saida / "state" / Path(padrao["STATE_FILE"]).name)
+
+def run_account_job(conta: Dict) -> Dict:
+    """Executa uma conta inteira no processo do pool; nunca levanta exceção."""
+    inicio = time.monotonic()
+    resultado = {"name": conta["name"], "ok": False, "changed": False, "files": []}
+    try:
+        apply_account(conta)
+        reset_latency_budget()
+        start_trace()
+        print(f"[INFO] [{conta['name']}] Iniciando coleta ({len(PRODUTOS)} produtos).")
+        snapshot = collect_snapshot()
+        if snapshot is None:
+            resultado["error"] = "sessão expirada" if not SESSION_STATUS.get("valid") else "coleta incompleta"
+        else:
+            resultado["ok"] = True
+            resultado["changed"] = record_snapshot(snapshot, publicar=False)
+            resultado["files"] = snapshot_files()
+            resultado["snapshot"] = snapshot
+    except Exception as e:
+        resultado["error"] = f"{type(e).__name__}: {e}"
+    TRACE.finish(ok=resultado["ok"])
+    resultado["session"] = SESSION_STATUS
+    resultado["duration_s"] = round(time.monotonic() - inicio, 2)
+    return resultado
+
+def run_jobs(spec_path: str, concurrency: Optional[int] = None, publicar: bool = True) -> List[Dict]:
+    """Roda todas as contas do spec em paralelo e enfileira as alterações num único lote."""
+    spec = load_job_spec(spec_path)
+    limite = max(1, concurrency or spec.get("concurrency") or JOBS_CONCURRENCY)
+    contas = spec["accounts"]
+    print(f"[INFO] {len(contas)} contas, até {limite} em paralelo.")
+
+    resultados = []
+    with ProcessPoolExecutor(max_workers=min(limite, len(contas))) as pool:
+        futuros = {pool.submit(run_account_job, c): c["name"] for c in contas}
+        for futuro in as_completed(futuros):
+            try:
+                r = futuro.result()
+            except Exception as e:
+                # processo do worker morreu (ex.: falta de memória)
+                r = {"name": futuros[futuro], "ok": False, "changed": False, "files": [], "error": str(e)}
+            status = "OK" if r["ok"] else f"FALHA ({r.get('error')})"
+            print(f"[SUMMARY] [{r['name']}] {status} em {r.get('duration_s', 0)}s, mudou={r['changed']}")
+            resultados.append(r)
+
+    if publicar:
+        for r in resultados:
+            if r["changed"]:
+                get_publisher().submit(r["snapshot"], r["files"], account=r["name"])
+    return resultados
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Coleta os valores do painel Assiny.")
+    parser.add_argument("--headed", action="store_true", help="abre o navegador visível")
+    parser.add_argument("--daemon", action="store_true", help="mantém o navegador aquecido e coleta em intervalo")
+    parser.add_argument("--interval", default=DAEMON_INTERVAL, help="intervalo do daemon (ex.: 30m, 45s)")
+    parser.add_argument("--health-port", type=int, default=HEALTH_PORT, help="porta do /health e /metrics (0 desliga)")
+    parser.add_argument("--stream", default=STREAM_TARGET, metavar="DESTINO",
+                        help="envia cada snapshot como linha JSON (stdout, stderr, tcp://h:p, unix:/sock ou arquivo)")
+    parser.add_argument("--jobs", metavar="ARQUIVO", help="spec JSON/YAML com várias contas")
+    parser.add_argument("--concurrency", type=int, help="contas simultâneas no modo --jobs")
+    parser.add_argument("--flush", action="store_true",
+                        help="publica toda a fila ao final, mesmo sem lote completo")
+    parser.add_argument("--trace-report", nargs="?", const=0, type=int, metavar="N",
+                        help="mostra p50/p95 por etapa (últimas N execuções) e sai")
+    parser.add_argument("--migrate", action="store_true",
+                        help="importa os CSVs históricos para o store (ASSINY_STORE) e sai")
+    parser.add_argument("--session-status", action="store_true",
+                        help="mostra validade/idade das sessões (arquivo e cache) e sai")
+    parser.add_argument("--discover-products", action="store_true",
+                        help="redescobre o catálogo de produtos do filtro, mostra e sai")
+    parser.add_argument("--check-contract", action="store_true",
+                        help="confere no painel real o contrato de API que o mock do bench supõe e sai")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="no modo incremental, força a releitura completa nesta execução")
+
+    comandos = parser.add_subparsers(dest="command")
+    query = comandos.add_parser("query", help="consulta o histórico (reamostragem, deltas, taxas)")
+    query.add_argument("--series", help="séries separadas por vírgula: total, prod_N ou nome do produto")
+    query.add_argument("--start", help="início (dd/mm/aaaa, aaaa-mm-dd ou ISO 8601)")
+    query.add_argument("--end", help="fim exclusivo (mesmos formatos)")
+    query.add_argument("--freq", help="hourly, daily ou intervalo (15m, 6h, 1d)")
+    query.add_argument("--metric", choices=QUERY_METRICS, default="value")
+    query.add_argument("--window", type=int, help="janela móvel em pontos")
+    query.add_argument("--last", type=int, help="só as últimas N linhas")
+    query.add_argument("--account", help="conta (padrão: a atual)")
+    query.add_argument("--source", choices=("store", "csv"), help="padrão: store se ASSINY_STORE != csv")
+    query.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    return parser.parse_args(argv)
+
+def main():
+    args = parse_args()
+    if args.command == "query":
+        run_query_cli(args)
+        return
+    if args.trace_report is not None:
+        print_trace_summary(ultimas=args.trace_report or None)
+        return
+    if args.session_status:
+        for caminho in [STORAGE_STATE_FILE] + sorted(map(str, session_cache_dir().glob("*.json")), reverse=True):
+            print(json.dumps(session_status(caminho), ensure_ascii=False))
+        return
+    if args.discover_products:
+        catalogo = discover_products_browser() or {}
+        for opcao in catalogo.get("options", []):
+            marca = "*" if opcao["label"] in match_products(PRODUCT_PATTERNS, [opcao["label"]]) else " "
+            print(f"{marca} [{opcao['index']}] {opcao['label']}")
+        return
+    if args.check_contract:
+        sys.exit(0 if check_api_contract() else 1)
+    if args.migrate:
+        backend = STORE_BACKEND if STORE_BACKEND != "csv" else "sqlite"
+        with open_store(backend) as store:
+            n = migrate_csvs(store)
+        print(f"[SUCCESS] {n} snapshots migrados para {backend}.")
+        return
+    # só os modos que coletam usam o stream (e, com stdout, desviam o log para o stderr)
+    configure_stream(args.stream)
+    if args.jobs:
+        resultados = run_jobs(args.jobs, args.concurrency)
+        shutdown_publisher()
+        if not all(r["ok"] for r in resultados):
+            sys.exit(1)
+        return
+    if args.daemon:
+        run_daemon(parse_interval(args.interval), args.health_port, headless=not args.headed)
+        return
+
+    reset_latency_budget()
+    start_trace()
+    snapshot = collect_snapshot(reconciliar=args.reconcile)
+    if snapshot is None:
+        TRACE.finish(ok=False)
+        return
+
+    # ======================
+    #  Comparação e registro
+    # ======================
+    record_snapshot(snapshot)
+    TRACE.finish(ok=True)
+    # publica só se o lote venceu (tamanho/idade); o resto fica na fila para a próxima execução
+    shutdown_publisher(flush_all=args.flush or EPHEMERAL_RUNNER)
 
 if __name__ == "__main__":
     main()
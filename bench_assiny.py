@@ -0,0 +1,626 @@
+# bench_assiny.py
+"""
+Painel Assiny falso (local) + benchmark do assiny_scraper sem rede.
+
+    python bench_assiny.py serve --port 8000          # só o mock, para depurar no navegador
+    python bench_assiny.py run --runs 3               # benchmark ponta a ponta
+    python bench_assiny.py run --baseline bench.json  # falha se regredir (uso no CI)
+
+O mock implementa o contrato de API que o próprio scraper supõe, não um contrato
+gravado do painel real: GET API_TOTAL_PATH com startDate/endDate/API_PRODUCT_PARAM
+respondendo {"data": {"netAmount": ..., "currency": "BRL"}}. "correto" aqui quer
+dizer que o scraper lê de volta o que o mock serviu (regressão e desempenho), não
+que a suposição vale na Assiny. Isso é conferido à parte, com sessão real:
+
+    python assiny_scraper.py --check-contract
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import assiny_scraper as scraper
+
+# ====================== MOCK ======================
+# Caminho suposto pelo scraper (ver docstring do módulo); o mock não o valida
+MOCK_API_PATH = "/api" + scraper.API_TOTAL_PATH
+# Valores "desde sempre" (01/01/2025 até hoje); períodos menores são proporcionais
+MOCK_ORIGEM = date(2025, 1, 1)
+MOCK_TOTAL = 3254522.05
+# Tamanho de cada imagem/fonte estática servida pelo mock
+MOCK_ASSET_BYTES = 60_000
+MOCK_PRODUTOS = {
+    "Início Próspero": 1963.08,
+    "Mentoria Individual": 6132.06,
+    "Mentoria individual online": 9974.49,
+    "Mentoria individual presencial": 0.0,
+    "Workshop Avançado": 4200.00,
+    "Comunidade VIP": 12890.50,
+}
+
+class MockConfig:
+    """Latências do mock, em ms."""
+
+    def __init__(self, api_ms: int = 150, render_ms: int = 300, stage_ms: int = 200,
+                 calendar_ms: int = 30, debounce_ms: int = 120):
+        self.api_ms = api_ms            # resposta do /api (lado servidor)
+        self.render_ms = render_ms      # do JSON até o card mostrar o valor
+        self.stage_ms = stage_ms        # cada etapa do desbloqueio
+        self.calendar_ms = calendar_ms  # troca de mês no calendário
+        self.debounce_ms = debounce_ms  # filtro do react-select ao digitar
+        self.api_calls = 0
+
+def mock_value(produto: Optional[str], inicio: Optional[date], fim: Optional[date]) -> float:
+    """Valor do período: fração do total 'desde sempre' proporcional aos dias cobertos."""
+    hoje = date.today()
+    inicio = max(inicio or MOCK_ORIGEM, MOCK_ORIGEM)
+    fim = min(fim or hoje, hoje)
+    dias_total = (hoje - MOCK_ORIGEM).days + 1
+    dias = max(0, (fim - inicio).days + 1)
+    if produto:
+        base = sum(MOCK_PRODUTOS.get(p.strip(), 0.0) for p in produto.split(","))
+    else:
+        base = MOCK_TOTAL
+    return round(base * dias / dias_total, 2)
+
+# HTML de página única que reproduz a estrutura (e os seletores CSS) usada pelo scraper
+MOCK_HTML = r"""<!doctype html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Assiny (mock)</title>
+<style>.hidden{display:none} .rdp-day_selected{font-weight:bold}
+@font-face{font-family:Mock;src:url(/static/inter.woff2) format("woff2")} body{font-family:Mock,sans-serif}</style></head>
+<body><div id="root"></div>
+<script>
+const CFG = __CFG__;
+const root = document.getElementById("root");
+const sleep = (ms) => new Promise((r) => setTimeout(r, ms));
+const MESES = ["janeiro","fevereiro","março","abril","maio","junho","julho","agosto",
+               "setembro","outubro","novembro","dezembro"];
+const pad = (n) => String(n).padStart(2, "0");
+const iso = (d) => `${d.getFullYear()}-${pad(d.getMonth() + 1)}-${pad(d.getDate())}`;
+const br = (d) => `${pad(d.getDate())}/${pad(d.getMonth() + 1)}/${d.getFullYear()}`;
+function brl(v) {
+  const [int, dec] = v.toFixed(2).split(".");
+  return "R$ " + int.replace(/\B(?=(\d{3})+(?!\d))/g, ".") + "," + dec;
+}
+
+const hoje = new Date();
+const state = {
+  start: new Date(hoje.getFullYear(), hoje.getMonth(), hoje.getDate() - 29),
+  end: new Date(hoje.getFullYear(), hoje.getMonth(), hoje.getDate()),
+  from: null,
+  to: null,
+  view: new Date(hoje.getFullYear(), hoje.getMonth(), 1),
+  selected: [],
+  applied: [],
+};
+
+function stageOrgs() {
+  root.innerHTML = `<main><section class="sectionContent"><section><div><table><tbody><tr>
+    <td>Organização Mock</td>
+    <td class="sc-1b6ce047-7 cFNGWb last-item"><button id="org-btn">Acessar</button></td>
+  </tr></tbody></table></div></section></section></main>`;
+  document.getElementById("org-btn").onclick = async () => { await sleep(CFG.stage_ms); stageInner(); };
+}
+
+function stageInner() {
+  root.innerHTML = `<div><div class="sc-88f1a04b-3 waZHj"><main><main><div><section><div><table><tbody><tr>
+    <td>Loja Mock</td>
+    <td class="sc-1b6ce047-7 cFNGWb last-item"><div><button id="inner-btn">Entrar</button></div></td>
+  </tr></tbody></table></div></section></div></main></main></div></div>`;
+  document.getElementById("inner-btn").onclick = async () => { await sleep(CFG.stage_ms); stageShell(); };
+}
+
+function sidebar() {
+  const nomes = ["Início", "Produtos", "Vendas", "Clientes", "Relatórios", "Assinaturas", "Transações"];
+  const links = nomes.map((t, i) => `<a href="#/${i === 6 ? "transacoes" : "item" + i}">${t}</a>`).join("");
+  return `<div class="sc-a939683d-0 kLVHsl"><img src="/static/logo.png" alt=""><div class="sc-a939683d-2 enkYbp">
+    <div class="sc-a939683d-3 fzYEAU"><div>${links}</div></div></div></div>`;
+}
+
+function bindSidebar() {
+  const link = root.querySelector(".fzYEAU > div > a:nth-child(7)");
+  link.onclick = async (e) => { e.preventDefault(); await sleep(CFG.stage_ms); stageDashboard(); };
+}
+
+function stageShell() {
+  root.innerHTML = `<div>${sidebar()}<div class="sc-88f1a04b-3 waZHj"><main><div>
+    <p>Selecione uma opção no menu</p></div></main></div></div>`;
+  bindSidebar();
+}
+
+function stageDashboard() {
+  state.instancia = (state.instancia || 1) + 1;
+  root.innerHTML = `<div>${sidebar()}<div class="sc-88f1a04b-3 waZHj"><main><div><div>
+  <section class="sectionContent"><div>
+    <div class="sc-901aedfc-0 hankki">
+      <div class="sc-901aedfc-2 jJUZpK">
+        <span>Transações</span>
+        <span><div><div><button id="period-btn">Últimos 30 dias</button></div></div><button id="filters-btn">Filtros</button></span>
+      </div>
+      <div class="sc-b1ed7421-0 lbZwDZ"><div class="sc-b1ed7421-2 eEgcfp hidden" id="panel"><div>
+        <div class="sc-b1ed7421-9 jdpVbC"><div><div><div class="filter-middle_selects">
+          <div><div><div class="react-select__control"><div class="react-select__value-container css-0">Status</div></div></div></div>
+          <div><div><div class="react-select__control" id="ctl"><div class="react-select__value-container css-1lm0gyh" id="vc"><input class="react-select__input" id="inp" autocomplete="off"></div></div></div></div>
+        </div></div></div></div>
+        <div class="sc-b1ed7421-5 kALddI"><button id="apply-btn">Aplicar</button></div>
+      </div></div></div>
+    </div>
+    <img src="/static/banner.jpg" alt="">
+    <div class="sc-6b5fc9f9-0 fgkMrj"><div><div><div><div class="sc-6b5fc9f9-7 blobef"><div><div id="valor"></div></div></div></div></div></div></div>
+  </div></section></div></div></main></div></div>`;
+  bindSidebar();
+  document.getElementById("period-btn").onclick = openCalendar;
+  document.getElementById("filters-btn").onclick = () => document.getElementById("panel").classList.remove("hidden");
+  document.getElementById("apply-btn").onclick = () => {
+    document.getElementById("panel").classList.add("hidden");
+    state.applied = [...state.selected];
+    refresh();
+  };
+  bindSelect();
+  refresh();
+}
+
+// ---------- card de valor ----------
+let seq = 0;
+async function refresh() {
+  const meu = ++seq;
+  const params = new URLSearchParams({ startDate: iso(state.start), endDate: iso(state.end) });
+  if (state.applied.length) params.set("product", state.applied.join(","));
+  const r = await fetch(CFG.api_path + "?" + params.toString(), { headers: { Accept: "application/json" } });
+  const j = await r.json();
+  await sleep(CFG.render_ms);
+  if (meu === seq) document.getElementById("valor").textContent = brl(j.data.netAmount);
+}
+
+// ---------- react-select ----------
+function renderChips() {
+  const vc = document.getElementById("vc");
+  vc.querySelectorAll(".react-select__multi-value").forEach((el) => el.remove());
+  const inp = document.getElementById("inp");
+  state.selected.forEach((nome) => {
+    const chip = document.createElement("div");
+    chip.className = "react-select__multi-value";
+    chip.innerHTML = `<div class="react-select__multi-value__label"></div><div class="react-select__multi-value__remove">×</div>`;
+    chip.firstChild.textContent = nome;
+    chip.lastChild.onclick = (e) => {
+      e.stopPropagation();
+      state.selected = state.selected.filter((n) => n !== nome);
+      renderChips();
+    };
+    vc.insertBefore(chip, inp);
+  });
+  const ctl = document.getElementById("ctl");
+  let clear = ctl.querySelector(".react-select__clear-indicator");
+  if (state.selected.length && !clear) {
+    clear = document.createElement("div");
+    clear.className = "react-select__clear-indicator";
+    clear.textContent = "✕";
+    clear.onclick = (e) => { e.stopPropagation(); state.selected = []; renderChips(); };
+    ctl.appendChild(clear);
+  } else if (!state.selected.length && clear) {
+    clear.remove();
+  }
+}
+
+function closeMenu() {
+  const menu = document.querySelector(".react-select__menu");
+  if (menu) menu.remove();
+}
+
+function bindSelect() {
+  const vc = document.getElementById("vc");
+  const ctl = document.getElementById("ctl");
+  const inp = document.getElementById("inp");
+  // como o react-select: clicar no campo abre o menu sem filtro
+  vc.onclick = () => { inp.focus(); if (!document.querySelector(".react-select__menu")) renderMenu(""); };
+  inp.onfocus = () => ctl.classList.add("react-select__control--is-focused");
+  inp.onblur = () => ctl.classList.remove("react-select__control--is-focused");
+  inp.oninput = () => {
+    clearTimeout(state.timer);
+    state.timer = setTimeout(() => renderMenu(inp.value), CFG.debounce_ms);
+  };
+  inp.onkeydown = (e) => {
+    if (e.key === "ArrowDown" || e.key === " ") renderMenu(inp.value);
+    if (e.key === "Escape") closeMenu();
+  };
+}
+
+function renderMenu(termo) {
+  closeMenu();
+  const alvo = termo.trim().toLowerCase();
+  // como no react-select multi: opções já escolhidas somem do menu (hideSelectedOptions)
+  const opcoes = CFG.produtos.filter((p) => p.nome.toLowerCase().includes(alvo) && !state.selected.includes(p.nome));
+  const menu = document.createElement("div");
+  menu.className = "react-select__menu";
+  menu.innerHTML = `<div class="react-select__menu-list"></div>`;
+  opcoes.forEach((p, i) => {
+    const op = document.createElement("div");
+    op.className = "react-select__option";
+    // id gerado pelo react-select: prefixo da instância (muda a cada montagem) + posição na lista exibida
+    op.id = `react-select-${state.instancia}-option-${i}`;
+    op.dataset.value = p.id;
+    op.textContent = p.nome;
+    op.onclick = () => {
+      clearTimeout(state.timer);
+      if (!state.selected.includes(p.nome)) state.selected.push(p.nome);
+      document.getElementById("inp").value = "";
+      renderChips();
+      closeMenu();
+    };
+    menu.firstChild.appendChild(op);
+  });
+  document.getElementById("ctl").parentElement.appendChild(menu);
+}
+
+// ---------- calendário (react-day-picker, modo range) ----------
+const mesmoDia = (a, b) => !!a && !!b && a.getTime() === b.getTime();
+function addToRange(d, from, to) {
+  if (from && to) {
+    if (mesmoDia(to, d) && mesmoDia(from, d)) return [null, null];
+    if (mesmoDia(to, d)) return [to, null];
+    if (mesmoDia(from, d)) return [null, null];
+    if (from > d) return [d, to];
+    return [from, d];
+  }
+  if (to) return d > to ? [to, d] : [d, to];
+  if (from) return d < from ? [d, from] : [from, d];
+  return [d, null];
+}
+
+function monthHtml(d, nav) {
+  const dias = new Date(d.getFullYear(), d.getMonth() + 1, 0).getDate();
+  let botoes = "";
+  for (let i = 1; i <= dias; i++) {
+    const dia = new Date(d.getFullYear(), d.getMonth(), i);
+    const sel = mesmoDia(state.from, dia) || mesmoDia(state.to, dia) ||
+      (!!state.from && !!state.to && dia > state.from && dia < state.to);
+    botoes += `<button class="rdp-day${sel ? " rdp-day_selected" : ""}" aria-selected="${sel}" data-y="${d.getFullYear()}" data-m="${d.getMonth()}">${i}</button>`;
+  }
+  return `<div class="rdp-month"><div class="rdp-caption">
+    <span class="rdp-caption_label">${MESES[d.getMonth()]} ${d.getFullYear()}</span>${nav}</div>
+    <div class="rdp-table">${botoes}</div></div>`;
+}
+
+function renderCalendar() {
+  const cal = document.getElementById("cal");
+  const anterior = new Date(state.view.getFullYear(), state.view.getMonth() - 1, 1);
+  cal.innerHTML = `<div class="rdp"><div class="rdp-months">
+      ${monthHtml(anterior, '<button name="previous-month">‹</button>')}
+      ${monthHtml(state.view, '<button name="next-month">›</button>')}
+    </div>
+    <div class="Button-apply"><button class="sc-8a29c332-0 kjexZj size-sm radius-rounded type-accent width-stretch iconPosition-left periodButton">Aplicar</button></div>
+  </div>`;
+  cal.querySelector("button[name='previous-month']").onclick = async () => {
+    await sleep(CFG.calendar_ms);
+    state.view = new Date(state.view.getFullYear(), state.view.getMonth() - 1, 1);
+    renderCalendar();
+  };
+  cal.querySelector("button[name='next-month']").onclick = async () => {
+    await sleep(CFG.calendar_ms);
+    state.view = new Date(state.view.getFullYear(), state.view.getMonth() + 1, 1);
+    renderCalendar();
+  };
+  cal.querySelectorAll(".rdp-day").forEach((b) => {
+    b.onclick = () => {
+      [state.from, state.to] = addToRange(new Date(+b.dataset.y, +b.dataset.m, +b.textContent), state.from, state.to);
+      renderCalendar();
+    };
+  });
+  cal.querySelector(".Button-apply > button").onclick = () => {
+    if (state.from && state.to) [state.start, state.end] = [state.from, state.to];
+    cal.remove();
+    document.getElementById("period-btn").textContent = `${br(state.start)} - ${br(state.end)}`;
+    refresh();
+  };
+}
+
+function openCalendar() {
+  if (document.getElementById("cal")) return;
+  const cal = document.createElement("div");
+  cal.id = "cal";
+  document.body.appendChild(cal);
+  state.view = new Date(state.end.getFullYear(), state.end.getMonth(), 1);
+  [state.from, state.to] = [state.start, state.end];
+  setTimeout(renderCalendar, CFG.calendar_ms);
+}
+
+stageOrgs();
+</script></body></html>
+"""
+
+class MockHandler(BaseHTTPRequestHandler):
+    config: MockConfig = MockConfig()
+
+    def _json(self, dados: Dict, status: int = 200):
+        corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == MOCK_API_PATH:
+            qs = parse_qs(url.query)
+
+            def data(chave):
+                valor = qs.get(chave, [""])[0]
+                return date.fromisoformat(valor) if valor else None
+
+            self.config.api_calls += 1
+            time.sleep(self.config.api_ms / 1000)
+            produto = qs.get(scraper.API_PRODUCT_PARAM, [""])[0] or None
+            valor = mock_value(produto, data("startDate"), data("endDate"))
+            self._json({"data": {"netAmount": valor, "currency": "BRL"}})
+            return
+        if url.path.startswith("/static/"):
+            # imagens e fontes de mentira, só para pesar na rede como as reais
+            tipos = {".png": "image/png", ".jpg": "image/jpeg", ".woff2": "font/woff2"}
+            corpo = b"\0" * MOCK_ASSET_BYTES
+            self.send_response(200)
+            self.send_header("Content-Type", tipos.get(Path(url.path).suffix, "application/octet-stream"))
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+            return
+        if url.path.startswith("/api/"):
+            self._json({"error": "not found"}, 404)
+            return
+        cfg = dict(vars(self.config))
+        cfg["api_path"] = MOCK_API_PATH
+        cfg["produtos"] = [{"id": f"p{i + 1}", "nome": n} for i, n in enumerate(MOCK_PRODUTOS)]
+        corpo = MOCK_HTML.replace("__CFG__", json.dumps(cfg, ensure_ascii=False)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_mock(config: MockConfig, port: int = 0) -> ThreadingHTTPServer:
+    handler = type("BoundMockHandler", (MockHandler,), {"config": config})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# ====================== BENCHMARK ======================
+class TreeRssSampler:
+    """Pico de RSS somado do processo e de todos os descendentes (Chromium incluso), via /proc."""
+
+    def __init__(self, intervalo_s: float = 0.05):
+        self.intervalo_s = intervalo_s
+        self.pico_kib = 0
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    @staticmethod
+    def _arvore_kib(raiz: int) -> int:
+        filhos: Dict[int, List[int]] = {}
+        rss: Dict[int, int] = {}
+        for entrada in os.listdir("/proc"):
+            if not entrada.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entrada}/status", encoding="utf-8") as f:
+                    campos = dict(l.split(":", 1) for l in f if ":" in l)
+            except OSError:
+                continue
+            pid = int(entrada)
+            filhos.setdefault(int(campos["PPid"].strip()), []).append(pid)
+            rss[pid] = int(campos.get("VmRSS", "0 kB").split()[0])
+        total, pilha = 0, [raiz]
+        while pilha:
+            pid = pilha.pop()
+            total += rss.get(pid, 0)
+            pilha.extend(filhos.get(pid, []))
+        return total
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                self.pico_kib = max(self.pico_kib, self._arvore_kib(os.getpid()))
+            except Exception:
+                pass
+            self._parar.wait(self.intervalo_s)
+
+    def __enter__(self):
+        if os.path.isdir("/proc"):
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._parar.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if not self.pico_kib:
+            # sem /proc: só o maior processo já encerrado (aproximação)
+            kib = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+            self.pico_kib = kib // 1024 if sys.platform == "darwin" else kib
+
+def cpu_seconds() -> float:
+    """CPU de usuário + sistema deste processo e dos filhos já encerrados (driver e Chromium)."""
+    total = 0.0
+    for quem in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        uso = resource.getrusage(quem)
+        total += uso.ru_utime + uso.ru_stime
+    return total
+
+def configure_scraper(base_url: str, workdir: Path, engine: str, capture: str, concurrency: int,
+                      ranges: Optional[List[str]] = None, collect: str = "full", profile: str = "default",
+                      products: Optional[List[str]] = None):
+    """Aponta o scraper para o mock, com sessão vazia e caches isolados em `workdir`."""
+    storage = workdir / "storage_state.json"
+    storage.write_text(json.dumps({"cookies": [], "origins": []}), encoding="utf-8")
+    scraper.ASSINY_URL = base_url
+    scraper.API_BASE_URL = base_url + "/api"
+    scraper.STORAGE_STATE_FILE = str(storage)
+    scraper.FETCH_ENGINE = engine
+    scraper.COLLECT_MODE = collect
+    scraper.BROWSER_PROFILE = profile
+    scraper.STATE_FILE = str(workdir / "state" / "latest.json")
+    scraper.CAPTURE_MODE = capture
+    scraper.PRODUCT_CONCURRENCY = concurrency
+    scraper.PRODUTOS = list(MOCK_PRODUTOS)[:4]
+    scraper.PRODUCT_PATTERNS = list(products or [])
+    scraper.DATE_ORIGIN = MOCK_ORIGEM.isoformat()
+    scraper.EXTRA_RANGES = list(ranges or [])
+    scraper.PLAYWRIGHT_TRACE_MODE = "off"
+    scraper.SELECTORS = scraper.SelectorRegistry(scraper.SELECTOR_STRATEGIES, str(workdir / "selectors.json"))
+
+def expected_snapshot() -> Dict[str, float]:
+    esperado = {"total": mock_value(None, None, None)}
+    for i, nome in enumerate(scraper.PRODUTOS):
+        esperado[f"prod_{i+1}"] = mock_value(nome, None, None)
+    for spec in scraper.EXTRA_RANGES:
+        esperado[scraper.range_field(spec)] = mock_value(None, *scraper.resolve_range(spec))
+    return esperado
+
+def bench_once() -> Dict:
+    scraper.reset_latency_budget()
+    scraper.start_trace()
+    cpu0 = cpu_seconds()
+    inicio = time.perf_counter()
+    with TreeRssSampler() as rss:
+        snapshot = scraper.collect_snapshot()
+    parede = time.perf_counter() - inicio
+    esperado = expected_snapshot()
+    # base + janela soma dois arredondamentos no modo incremental
+    errados = [k for k, v in esperado.items() if not snapshot or abs(snapshot.get(k, -1) - v) > 0.02]
+    return {
+        "wall_s": round(parede, 3),
+        "cpu_s": round(cpu_seconds() - cpu0, 3),
+        "peak_rss_mib": round(rss.pico_kib / 1024, 1),
+        "waits": scraper.BUDGET.chamadas,
+        "wait_s": round(scraper.BUDGET.espera_total_ms / 1000, 3),
+        "requests": scraper.TRACE.requests,
+        "blocked": scraper.TRACE.bloqueadas,
+        # índice do catálogo errado cai no fallback digitado e passaria despercebido
+        "catalog_misses": scraper.TRACE.catalogo_erros,
+        "correct": not errados and not scraper.TRACE.catalogo_erros,
+        "wrong_fields": errados,
+    }
+
+def run_benchmark(runs: int = 3, engine: str = "browser", capture: str = "network",
+                  concurrency: int = 1, config: Optional[MockConfig] = None,
+                  ranges: Optional[List[str]] = None, collect: str = "full",
+                  profile: str = "default", products: Optional[List[str]] = None) -> Dict:
+    config = config or MockConfig()
+    server = start_mock(config)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            configure_scraper(base_url, Path(tmp), engine, capture, concurrency, ranges, collect, profile, products)
+            resultados = []
+            for i in range(runs):
+                r = bench_once()
+                print(f"[BENCH] run {i + 1}/{runs}: {r}")
+                resultados.append(r)
+    finally:
+        server.shutdown()
+
+    def mediana(campo):
+        return sorted(r[campo] for r in resultados)[len(resultados) // 2]
+
+    return {
+        "when": datetime.now().isoformat(timespec="seconds"),
+        "params": {"runs": runs, "engine": engine, "capture": capture, "concurrency": concurrency,
+                   "ranges": list(ranges or []), "collect": collect, "profile": profile,
+                   "products": list(products or []),
+                   "mock": {k: v for k, v in vars(config).items() if k != "api_calls"},
+                   # suposição do scraper, não medida no painel real (ver --check-contract)
+                   "mock_contract": {"path": MOCK_API_PATH, "field": "data.netAmount"}},
+        "median": {c: mediana(c) for c in ("wall_s", "cpu_s", "peak_rss_mib", "waits", "wait_s", "requests", "blocked")},
+        "all_correct": all(r["correct"] for r in resultados),
+        "runs": resultados,
+    }
+
+def print_report(rel: Dict):
+    m = rel["median"]
+    print(f"{'métrica':<14}{'mediana':>12}")
+    for campo, unidade in (("wall_s", "s"), ("cpu_s", "s"), ("peak_rss_mib", "MiB"),
+                           ("waits", ""), ("wait_s", "s"), ("requests", ""), ("blocked", "")):
+        print(f"{campo:<14}{m[campo]:>10} {unidade}")
+    print(f"{'correto (mock)':<14}{'sim' if rel['all_correct'] else 'NÃO':>12}")
+
+def compare_baseline(rel: Dict, baseline_path: str, tolerancia: float) -> List[str]:
+    """Métricas de custo que pioraram mais que `tolerancia` (fração) em relação à baseline."""
+    base = json.loads(Path(baseline_path).read_text(encoding="utf-8"))["median"]
+    regressoes = []
+    for campo in ("wall_s", "cpu_s", "peak_rss_mib", "waits"):
+        antes, agora = base.get(campo), rel["median"][campo]
+        if antes and agora > antes * (1 + tolerancia):
+            regressoes.append(f"{campo}: {antes} -> {agora} (+{(agora / antes - 1) * 100:.0f}%)")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock local do painel Assiny e benchmark do scraper.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    def latencias(p):
+        p.add_argument("--api-ms", type=int, default=150)
+        p.add_argument("--render-ms", type=int, default=300)
+        p.add_argument("--stage-ms", type=int, default=200)
+        p.add_argument("--calendar-ms", type=int, default=30)
+        p.add_argument("--debounce-ms", type=int, default=120)
+
+    serve = sub.add_parser("serve", help="só sobe o mock")
+    serve.add_argument("--port", type=int, default=8000)
+    latencias(serve)
+
+    run = sub.add_parser("run", help="roda o benchmark ponta a ponta")
+    run.add_argument("--runs", type=int, default=3)
+    run.add_argument("--engine", choices=("browser", "http"), default="browser")
+    run.add_argument("--capture", choices=("network", "dom"), default="network")
+    run.add_argument("--concurrency", type=int, default=1)
+    run.add_argument("--profile", choices=("default", "lean"), default="default")
+    run.add_argument("--collect", choices=("full", "incremental"), default="full")
+    run.add_argument("--ranges", default="", help="períodos extras, ex.: today,month_to_date")
+    run.add_argument("--products", default="", help="padrões do catálogo, ex.: 'Mentoria*,!*online'")
+    run.add_argument("--json", metavar="ARQUIVO", help="grava o relatório em JSON")
+    run.add_argument("--baseline", metavar="ARQUIVO", help="relatório anterior para comparar")
+    run.add_argument("--tolerance", type=float, default=0.25, help="regressão aceita (fração)")
+    latencias(run)
+
+    args = parser.parse_args()
+    config = MockConfig(args.api_ms, args.render_ms, args.stage_ms, args.calendar_ms, args.debounce_ms)
+
+    if args.cmd == "serve":
+        server = start_mock(config, args.port)
+        print(f"[INFO] Mock em http://127.0.0.1:{server.server_port}/organizations (Ctrl+C para sair)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    ranges = [r.strip() for r in args.ranges.split(",") if r.strip()]
+    produtos = [p.strip() for p in args.products.split(",") if p.strip()]
+    rel = run_benchmark(args.runs, args.engine, args.capture, args.concurrency, config, ranges,
+                        args.collect, args.profile, produtos)
+    print_report(rel)
+    if args.json:
+        Path(args.json).write_text(json.dumps(rel, ensure_ascii=False, indent=2), encoding="utf-8")
+    falhou = not rel["all_correct"]
+    if args.baseline:
+        regressoes = compare_baseline(rel, args.baseline, args.tolerance)
+        for r in regressoes:
+            print(f"[REGRESSION] {r}")
+        falhou = falhou or bool(regressoes)
+    sys.exit(1 if falhou else 0)
+
+if __name__ == "__main__":
+    main()
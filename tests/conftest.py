@@ -0,0 +1,106 @@
+"""Testes offline: servidores locais no lugar da Assiny, nada sai da máquina."""
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+# o scraper importa o Playwright no topo do módulo
+pytest.importorskip("playwright.sync_api")
+
+import assiny_scraper  # noqa: E402
+
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    """Módulo com estado, CSV e sessão isolados num diretório temporário."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(assiny_scraper, "STATE_FILE", str(tmp_path / "state" / "latest.json"))
+    monkeypatch.setattr(assiny_scraper, "OUTPUT_CSV", str(tmp_path / "valor_assiny.csv"))
+    monkeypatch.setattr(assiny_scraper, "STORAGE_STATE_FILE", str(tmp_path / "google_login.json"))
+    return assiny_scraper
+
+
+class StubServer:
+    """
+    Servidor HTTP local com respostas programáveis. `responder(req)` recebe
+    {"method", "path", "headers", "body"} e devolve (status, dict_json | bytes)
+    ou (status, bytes, content_type[, {cabeçalhos extras}]).
+    """
+
+    def __init__(self, responder):
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                tamanho = int(self.headers.get("Content-Length") or 0)
+                req = {
+                    "method": self.command,
+                    "path": self.path,
+                    "headers": dict(self.headers),
+                    "body": self.rfile.read(tamanho) if tamanho else b"",
+                }
+                stub.requests.append(req)
+                status, corpo, *extra = responder(req)
+                if not isinstance(corpo, bytes):
+                    corpo = json.dumps(corpo).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", extra[0] if extra else "application/json")
+                for nome, valor in (extra[1] if len(extra) > 1 else {}).items():
+                    self.send_header(nome, valor)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    servidores = []
+
+    def iniciar(responder):
+        servidor = StubServer(responder)
+        servidores.append(servidor)
+        return servidor
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.close()
+
+
+@pytest.fixture
+def browser_page():
+    """Página do Chromium real; pula o teste se o navegador não estiver instalado."""
+    from playwright.sync_api import sync_playwright
+
+    try:
+        playwright = sync_playwright().start()
+    except Exception as e:
+        pytest.skip(f"Playwright indisponível: {e}")
+    try:
+        browser = playwright.chromium.launch()
+    except Exception as e:
+        playwright.stop()
+        pytest.skip(f"Chromium indisponível: {e}")
+    page = browser.new_page()
+    yield page
+    browser.close()
+    playwright.stop()
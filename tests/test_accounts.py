@@ -0,0 +1,44 @@
+import pytest
+
+
+@pytest.fixture
+def contas(scraper, monkeypatch):
+    # apply_account troca os globais do módulo: restaura tudo no fim do teste
+    for nome in list(scraper._ACCOUNT_DEFAULTS) + ["ACCOUNT_NAME", "PRODUCTS_REMOVED"]:
+        monkeypatch.setattr(scraper, nome, getattr(scraper, nome))
+    # como se ASSINY_API_URL estivesse definido no ambiente
+    monkeypatch.setitem(scraper._ACCOUNT_DEFAULTS, "API_BASE_URL", "https://api.exemplo/v2")
+    return scraper
+
+
+def test_api_url_follows_env_default_and_account_url(contas):
+    contas.apply_account({"name": "a"})
+    assert contas.API_BASE_URL == "https://api.exemplo/v2"
+    contas.apply_account({"name": "b", "url": "https://outra.exemplo"})
+    assert contas.API_BASE_URL == "https://outra.exemplo/api"
+    contas.apply_account({"name": "c", "url": "https://outra.exemplo", "api_url": "https://api.outra/v1"})
+    assert contas.API_BASE_URL == "https://api.outra/v1"
+
+
+def test_two_accounts_in_one_process_do_not_leak(contas, monkeypatch):
+    vistos = []
+
+    def coletar():
+        vistos.append((contas.ACCOUNT_NAME, contas.API_BASE_URL, list(contas.PRODUTOS), contas.DATE_RANGE))
+        return {"timestamp": contas.now_brasilia_str(), "total": 100.0,
+                **{f"prod_{i + 1}": 1.0 for i in range(len(contas.PRODUTOS))}}
+
+    monkeypatch.setattr(contas, "collect_snapshot", coletar)
+    # o pool reaproveita o processo: a segunda conta roda depois da primeira, nos mesmos globais
+    primeira = contas.run_account_job({"name": "loja", "url": "https://loja.exemplo", "products": ["X"],
+                                       "range": "month_to_date"})
+    segunda = contas.run_account_job({"name": "padrao"})
+    assert primeira["ok"] and segunda["ok"]
+    assert vistos == [
+        ("loja", "https://loja.exemplo/api", ["X"], "month_to_date"),
+        ("padrao", "https://api.exemplo/v2", contas._ACCOUNT_DEFAULTS["PRODUTOS"],
+         contas._ACCOUNT_DEFAULTS["DATE_RANGE"]),
+    ]
+    assert primeira["files"][0].startswith("accounts/loja/") and segunda["files"][0].startswith("accounts/padrao/")
+    with open(segunda["files"][0], encoding="utf-8") as f:
+        assert f.readline().strip().split(",")[2:] == [f"prod_{i + 1}" for i in range(len(vistos[1][2]))]
@@ -0,0 +1,79 @@
+import json
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pytest
+
+FIXTURES = {p.stem: json.loads(p.read_text(encoding="utf-8"))
+            for p in (Path(__file__).parent / "fixtures" / "capture").glob("*.json")}
+
+
+def test_summary_value_is_extracted(scraper):
+    assert scraper.extract_total_from_json(FIXTURES["summary"]["body"]) == 3254522.05
+
+
+def test_row_count_total_is_not_revenue(scraper):
+    assert scraper.extract_total_from_json(FIXTURES["transactions_page"]["body"]) is None
+
+
+def test_generic_total_needs_currency_sibling(scraper):
+    assert scraper.extract_total_from_json(FIXTURES["summary_generic"]["body"]) == 12890.5
+    assert scraper.extract_total_from_json({"result": {"total": 12890.5}}) is None
+
+
+@pytest.mark.parametrize("nome, esperado", [
+    ("summary", True), ("summary_generic", True), ("transactions_page", False),
+])
+def test_url_pattern_skips_paginated_listing(scraper, nome, esperado):
+    assert bool(scraper.CAPTURE_URL_PATTERN.search(FIXTURES[nome]["url"])) is esperado
+
+
+def replay_server(stub_server, chamadas):
+    """Página que chama, em ordem, as URLs gravadas nos fixtures (servidas pelo mesmo host)."""
+    caminhos = {}
+    for nome in chamadas:
+        url = urlparse(FIXTURES[nome]["url"])
+        caminhos[url.path] = FIXTURES[nome]["body"]
+    script = "".join(
+        f"await fetch({json.dumps(urlparse(FIXTURES[n]['url']).path + '?' + urlparse(FIXTURES[n]['url']).query)});"
+        "await new Promise(r => setTimeout(r, 100));"
+        for n in chamadas
+    )
+    html = f"<html><body><script>(async () => {{ {script} }})();</script></body></html>".encode()
+
+    def responder(req):
+        caminho = urlparse(req["path"]).path
+        if caminho == "/":
+            return 200, html, "text/html"
+        if caminho in caminhos:
+            return 200, caminhos[caminho]
+        return 404, {}
+
+    return stub_server(responder)
+
+
+def test_replay_reads_summary_not_listing(scraper, stub_server, browser_page):
+    servidor = replay_server(stub_server, ["transactions_page", "summary"])
+    capture = scraper.ResponseCapture(browser_page)
+    try:
+        browser_page.goto(servidor.url + "/")
+        assert capture.wait_for_value(0, timeout_ms=5000) == 3254522.05
+    finally:
+        capture.detach()
+
+
+def test_replay_miss_falls_back_fast(scraper, stub_server, browser_page):
+    servidor = replay_server(stub_server, ["transactions_page"])
+    capture = scraper.ResponseCapture(browser_page)
+    try:
+        browser_page.goto(servidor.url + "/")
+        inicio = time.monotonic()
+        assert capture.wait_for_value(0, timeout_ms=800) is None
+        assert time.monotonic() - inicio < 3
+        # sem nenhuma resposta candidata: as próximas leituras nem esperam
+        inicio = time.monotonic()
+        assert capture.wait_for_value(capture.mark()) is None
+        assert time.monotonic() - inicio < 0.1
+    finally:
+        capture.detach()
@@ -0,0 +1,96 @@
+import csv
+import json
+
+import pytest
+
+
+def opcoes(*nomes):
+    return [{"label": n, "index": i} for i, n in enumerate(nomes)]
+
+
+@pytest.fixture
+def catalogo(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "_CATALOG", {})
+    monkeypatch.setattr(scraper, "PRODUTOS", list(scraper.PRODUTOS))
+    monkeypatch.setattr(scraper, "PRODUCTS_REMOVED", set())
+    return scraper
+
+
+def test_removed_option_keeps_later_positions(catalogo):
+    catalogo.update_catalog(opcoes("A", "B", "C"))
+    catalogo.update_catalog(opcoes("A", "C", "D"))
+    entradas = catalogo.load_catalog()["options"]
+    assert [o["label"] for o in entradas] == ["A", "B", "C", "D"]
+    assert entradas[1]["index"] is None and entradas[1]["removed_at"]
+    assert catalogo.catalog_option_index("C") == 1
+    # voltou ao menu: sai da lápide
+    catalogo.update_catalog(opcoes("A", "B", "C", "D"))
+    assert "removed_at" not in catalogo.load_catalog()["options"][1]
+
+
+def test_patterns_keep_tombstones_but_skip_collection(catalogo, monkeypatch):
+    monkeypatch.setattr(catalogo, "PRODUCT_PATTERNS", ["*", "!D"])
+    catalogo.update_catalog(opcoes("A", "B", "C"))
+    catalogo.update_catalog(opcoes("A", "C"))
+    assert catalogo.apply_product_patterns()
+    assert catalogo.PRODUTOS == ["A", "B", "C"]
+    assert catalogo.PRODUCTS_REMOVED == {"B"}
+    assert catalogo.SnapshotValidator.fields() == ["total", "prod_1", "prod_3"]
+
+
+def ler_csv(scraper):
+    with open(scraper.OUTPUT_CSV, encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_csv_widens_when_products_are_appended(catalogo, monkeypatch):
+    monkeypatch.setattr(catalogo, "PRODUTOS", ["A", "B"])
+    catalogo.append_csv_row({"timestamp": "t1", "total": 1, "prod_1": 1, "prod_2": 2})
+    monkeypatch.setattr(catalogo, "PRODUTOS", ["A", "B", "C"])
+    catalogo.append_csv_row({"timestamp": "t2", "total": 2, "prod_1": 1, "prod_2": 2, "prod_3": 3})
+    linhas = ler_csv(catalogo)
+    assert linhas[0] == ["timestamp", "total", "prod_1", "prod_2", "prod_3"]
+    assert {len(l) for l in linhas} == {5}
+    assert catalogo.csv_versions() == []
+
+
+def test_csv_is_versioned_when_columns_change_meaning(catalogo, monkeypatch):
+    monkeypatch.setattr(catalogo, "PRODUTOS", ["A", "B"])
+    catalogo.append_csv_row({"timestamp": "t1", "total": 1, "prod_1": 1, "prod_2": 2})
+    monkeypatch.setattr(catalogo, "PRODUTOS", ["B"])
+    catalogo.append_csv_row({"timestamp": "t2", "total": 2, "prod_1": 2})
+    assert ler_csv(catalogo) == [["timestamp", "total", "prod_1"], ["t2", "2", "2"]]
+    (versao,) = catalogo.csv_versions()
+    assert open(versao, encoding="utf-8").read().startswith("timestamp,total,prod_1,prod_2\n")
+    assert json.loads(catalogo.csv_columns_file().read_text(encoding="utf-8")) == {"products": ["B"]}
+    assert versao in catalogo.snapshot_files()
+
+
+def test_validator_baseline_follows_product_name(catalogo, monkeypatch):
+    monkeypatch.setattr(catalogo, "PRODUTOS", ["A", "B"])
+    validador = catalogo.SnapshotValidator()
+    validador.accept({"total": 10.0, "prod_1": 1.0, "prod_2": 9.0}, ["total", "prod_1", "prod_2"])
+    validador.save()
+    monkeypatch.setattr(catalogo, "PRODUTOS", ["B", "C"])
+    assert catalogo.SnapshotValidator().ultimos == {"total": 10.0, "prod_1": 9.0}
+
+
+def test_legacy_csv_without_columns_file_is_kept(catalogo, monkeypatch):
+    # cabeçalho real do valor_assiny.csv publicado, anterior ao columns.json
+    monkeypatch.setattr(catalogo, "PRODUTOS", ["Início Próspero", "Mentoria Individual",
+                                               "Mentoria individual online", "Mentoria individual presencial"])
+    cabecalho = "DataHoraGMT-3,Valor Total," + ",".join(catalogo.PRODUTOS)
+    antigas = ["10/10/2025 - 13:40,3166165.66,1963.08,6132.06,9974.49,0.0",
+               "11/10/2025 - 13:40,3166200.00,1963.08,6132.06,9974.49,0.0"]
+    with open(catalogo.OUTPUT_CSV, "w", encoding="utf-8") as f:
+        f.write(cabecalho + "\n" + "\n".join(antigas) + "\n")
+    catalogo.append_csv_row({"timestamp": "12/10/2025 - 13:40", "total": 3, "prod_1": 1, "prod_2": 2, "prod_3": 3, "prod_4": 4})
+    linhas = ler_csv(catalogo)
+    assert catalogo.csv_versions() == []
+    assert ",".join(linhas[0]) == cabecalho and len(linhas) == 4
+    assert json.loads(catalogo.csv_columns_file().read_text(encoding="utf-8")) == {"products": catalogo.PRODUTOS}
+    assert len(catalogo.read_legacy_csv(catalogo.OUTPUT_CSV)) == 3
+    # produto novo no fim alarga o arquivo mantendo os nomes
+    monkeypatch.setattr(catalogo, "PRODUTOS", catalogo.PRODUTOS + ["Novo"])
+    catalogo.append_csv_row({"timestamp": "t4", "total": 4})
+    assert ler_csv(catalogo)[0][-1] == "Novo" and catalogo.csv_versions() == []
@@ -0,0 +1,25 @@
+import threading
+
+import pytest
+
+
+@pytest.mark.parametrize("txt, segundos", [("45s", 45), ("30m", 1800), ("2h", 7200), ("90", 90)])
+def test_parse_interval(scraper, txt, segundos):
+    assert scraper.parse_interval(txt) == segundos
+
+
+@pytest.mark.parametrize("txt", ["0", "0m", "abc"])
+def test_parse_interval_rejects_zero_and_garbage(scraper, txt):
+    with pytest.raises(ValueError):
+        scraper.parse_interval(txt)
+
+
+def test_session_recoveries_counted_under_lock(scraper):
+    health = scraper.DaemonHealth()
+    threads = [threading.Thread(target=lambda: [health.session_recovered() for _ in range(500)])
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert health.metrics_snapshot()["recuperacoes_sessao"] == 2000
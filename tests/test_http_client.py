@@ -0,0 +1,109 @@
+import base64
+import json
+import time
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("httpx")
+
+
+def jwt(exp):
+    corpo = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).rstrip(b"=").decode()
+    return f"eyJhbGciOiJIUzI1NiJ9.{corpo}.assinatura"
+
+
+def gravar_sessao(scraper, cookies, origins=()):
+    with open(scraper.STORAGE_STATE_FILE, "w", encoding="utf-8") as f:
+        json.dump({"cookies": cookies, "origins": list(origins)}, f)
+
+
+def cookie(nome, valor, dominio="127.0.0.1"):
+    return {"name": nome, "value": valor, "domain": dominio, "path": "/", "expires": -1}
+
+
+def api(stub_server, valores, status=200):
+    """Stand-in da API: valor por produto (None = total geral)."""
+    def responder(req):
+        if status != 200:
+            return status, {"error": "unauthorized"}
+        produto = parse_qs(urlparse(req["path"]).query).get("product", [None])[0]
+        return 200, {"data": {"netAmount": valores[produto], "currency": "BRL"}}
+    return stub_server(responder)
+
+
+def test_bearer_comes_from_token_cookie(scraper):
+    token = jwt(time.time() + 3600)
+    estado = {"cookies": [cookie("token", token, "admin.assiny.com.br"),
+                          cookie("refreshToken", "r", "admin.assiny.com.br")], "origins": []}
+    assert scraper.storage_bearer_token(estado) == token
+    # localStorage continua tendo prioridade
+    estado["origins"] = [{"origin": "https://admin.assiny.com.br",
+                          "localStorage": [{"name": "accessToken", "value": "ls"}]}]
+    assert scraper.storage_bearer_token(estado) == "ls"
+
+
+def test_client_sends_cookie_jwt_and_range(scraper, stub_server):
+    token = jwt(time.time() + 3600)
+    gravar_sessao(scraper, [cookie("token", token)])
+    servidor = api(stub_server, {None: 1500.25, "Curso A": 300.0})
+    client = scraper.AssinyApiClient(base_url=servidor.url + "/api")
+    try:
+        assert client.get_total() == 1500.25
+        assert client.get_total("Curso A") == 300.0
+    finally:
+        client.close()
+    req = servidor.requests[0]
+    assert req["headers"]["Authorization"] == f"Bearer {token}"
+    assert f"token={token}" in req["headers"]["Cookie"]
+    params = parse_qs(urlparse(req["path"]).query)
+    assert {"startDate", "endDate"} <= set(params)
+
+
+@pytest.mark.parametrize("status", [401, 403])
+def test_rejected_session_raises(scraper, stub_server, status):
+    gravar_sessao(scraper, [cookie("token", jwt(time.time() - 60))])
+    servidor = api(stub_server, {}, status=status)
+    client = scraper.AssinyApiClient(base_url=servidor.url + "/api")
+    try:
+        with pytest.raises(scraper.SessionExpired):
+            client.get_total()
+    finally:
+        client.close()
+
+
+def test_redirect_to_login_raises(scraper, stub_server):
+    gravar_sessao(scraper, [])
+    servidor = stub_server(lambda req: (302, b"", "text/html", {"Location": "/login?next=/api"}))
+    client = scraper.AssinyApiClient(base_url=servidor.url + "/api")
+    try:
+        with pytest.raises(scraper.SessionExpired):
+            client.get_total()
+    finally:
+        client.close()
+
+
+def test_expired_api_session_uses_a_single_browser(scraper, stub_server, monkeypatch):
+    gravar_sessao(scraper, [cookie("token", jwt(time.time() - 60))])
+    servidor = api(stub_server, {}, status=401)
+    monkeypatch.setattr(scraper, "API_BASE_URL", servidor.url + "/api")
+    monkeypatch.setattr(scraper, "FETCH_ENGINE", "http")
+    navegadores = []
+    monkeypatch.setattr(scraper, "refresh_and_collect",
+                        lambda: navegadores.append("renovação") or {"timestamp": "t", "total": 1.0})
+    monkeypatch.setattr(scraper, "run_browser_snapshot",
+                        lambda: navegadores.append("coleta") or None)
+    assert scraper.fetch_once() == {"timestamp": "t", "total": 1.0}
+    assert navegadores == ["renovação"]
+
+
+def test_api_failure_falls_back_to_browser_once(scraper, stub_server, monkeypatch):
+    gravar_sessao(scraper, [])
+    servidor = stub_server(lambda req: (500, {"error": "boom"}))
+    monkeypatch.setattr(scraper, "API_BASE_URL", servidor.url + "/api")
+    monkeypatch.setattr(scraper, "FETCH_ENGINE", "http")
+    navegadores = []
+    monkeypatch.setattr(scraper, "refresh_and_collect", lambda: navegadores.append("renovação"))
+    monkeypatch.setattr(scraper, "run_browser_snapshot", lambda: navegadores.append("coleta") or {"total": 2.0})
+    assert scraper.fetch_once() == {"total": 2.0}
+    assert navegadores == ["coleta"]
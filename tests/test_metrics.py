@@ -0,0 +1,97 @@
+import re
+
+import pytest
+
+AMOSTRA = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$')
+# sufixos de amostra aceitos por tipo, em cada formato
+SUFIXOS = {
+    False: {"gauge": [""], "counter": [""], "histogram": ["_bucket", "_sum", "_count"]},
+    True: {"gauge": [""], "counter": ["_total"], "histogram": ["_bucket", "_sum", "_count"]},
+}
+
+
+def familias(texto, openmetrics):
+    """Confere a estrutura da exposição e devolve {família: (tipo, [(nome, labels, valor)])}."""
+    assert texto.endswith("\n")
+    linhas = texto.rstrip("\n").split("\n")
+    if openmetrics:
+        assert linhas.pop() == "# EOF"
+    assert "# EOF" not in linhas
+    vistas = {}
+    atual = None
+    for i, linha in enumerate(linhas):
+        if linha.startswith("# HELP "):
+            nome = linha.split()[2]
+            assert linhas[i + 1].startswith(f"# TYPE {nome} ")
+            assert nome not in vistas, f"família repetida: {nome}"
+        elif linha.startswith("# TYPE "):
+            _, _, nome, tipo = linha.split()
+            atual = nome
+            vistas[nome] = (tipo, [])
+        else:
+            m = AMOSTRA.match(linha)
+            assert m, f"linha inválida: {linha!r}"
+            tipo, amostras = vistas[atual]
+            assert m.group(1) in [atual + s for s in SUFIXOS[openmetrics][tipo]], linha
+            float(m.group(3).replace("Inf", "inf"))
+            amostras.append((m.group(1), m.group(2) or "", m.group(3)))
+    return vistas
+
+
+@pytest.fixture
+def health(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "PRODUTOS", ['Mentoria "VIP"'])
+    monkeypatch.setattr(scraper, "SESSION_STATUS", {})
+    saude = scraper.DaemonHealth()
+    saude.begin()
+    saude.success({"timestamp": "18/10/2026 - 10:00", "total": 1234.5, "prod_1": 10.0, "confidence": 1.0},
+                  mudou=True)
+    saude.begin()
+    saude.failure(TimeoutError("painel lento"))
+    return saude
+
+
+def test_prometheus_text_format(scraper, health):
+    vistas = familias(scraper.render_metrics(health), openmetrics=False)
+    # contador declarado e amostrado já com _total
+    assert vistas["assiny_runs_total"] == ("counter", [("assiny_runs_total", '{account="default"}', "2")])
+    assert "assiny_runs" not in vistas
+    tipo, valores = vistas["assiny_value"]
+    assert tipo == "gauge"
+    # aspas no nome do produto escapadas no label
+    assert ("assiny_value", '{account="default",field="prod_1",name="Mentoria \\"VIP\\""}', "10") in valores
+    _, baldes = vistas["assiny_run_duration_seconds"]
+    acumulados = [int(v) for n, _, v in baldes if n.endswith("_bucket")]
+    assert acumulados == sorted(acumulados) and acumulados[-1] == 2
+    assert ("assiny_run_duration_seconds_bucket", '{account="default",le="+Inf"}', "2") in baldes
+    assert ("assiny_run_duration_seconds_count", '{account="default"}', "2") in baldes
+
+
+def test_openmetrics_format(scraper, health):
+    texto = scraper.render_metrics(health, openmetrics=True)
+    assert texto.endswith("# EOF\n")
+    vistas = familias(texto, openmetrics=True)
+    # OpenMetrics: família sem _total, amostra com _total
+    assert vistas["assiny_failures"] == ("counter", [
+        ("assiny_failures_total", '{account="default",error="TimeoutError"}', "1"),
+    ])
+    assert vistas["assiny_snapshot_changes"][1] == [("assiny_snapshot_changes_total", '{account="default"}', "1")]
+    assert "assiny_runs_total" not in vistas
+
+
+@pytest.mark.parametrize("openmetrics", [False, True])
+def test_family_without_samples_is_still_declared(scraper, monkeypatch, openmetrics):
+    monkeypatch.setattr(scraper, "SESSION_STATUS", {})
+    vistas = familias(scraper.render_metrics(scraper.DaemonHealth(), openmetrics), openmetrics)
+    falhas = "assiny_failures" if openmetrics else "assiny_failures_total"
+    assert vistas[falhas] == ("counter", [])
+    assert vistas["assiny_value"] == ("gauge", [])
+    # sem sucesso ainda: nada de timestamp zerado
+    assert "assiny_last_success_timestamp_seconds" not in vistas
+    assert vistas["assiny_up"][1] == [("assiny_up", '{account="default"}', "1")]
+
+
+def test_parses_with_prometheus_client(scraper, health):
+    parser = pytest.importorskip("prometheus_client.parser")
+    nomes = {f.name for f in parser.text_string_to_metric_families(scraper.render_metrics(health))}
+    assert {"assiny_runs", "assiny_value", "assiny_run_duration_seconds"} <= nomes
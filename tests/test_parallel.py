@@ -0,0 +1,104 @@
+import queue
+
+import pytest
+
+
+class Pagina:
+    """Página falsa: o filtro aplicado e quantas vezes o dashboard foi preparado."""
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.preparos = 0
+        self.filtro = None
+
+
+@pytest.fixture
+def fake_pages(scraper, monkeypatch):
+    eventos = []
+    falhas = {}
+
+    def prepare_dashboard(page, capture=None, reaproveitar=False):
+        page.preparos += 1
+        eventos.append(("prepara", page.tag))
+        return 0.0
+
+    def start_product(page, nome, capture=None):
+        page.filtro = nome
+        eventos.append(("aplica", page.tag, nome))
+        # requisição que a página fez para este filtro
+        scraper.TRACE.count_request(Requisicao(), page.tag)
+        return {"nome": nome}
+
+    def finish_product(page, pendente, capture=None):
+        eventos.append(("le", page.tag, pendente["nome"]))
+        if falhas.get(pendente["nome"], 0) > 0:
+            falhas[pendente["nome"]] -= 1
+            return None
+        return float(len(pendente["nome"]))
+
+    monkeypatch.setattr(scraper, "prepare_dashboard", prepare_dashboard)
+    monkeypatch.setattr(scraper, "start_product", start_product)
+    monkeypatch.setattr(scraper, "finish_product", finish_product)
+    monkeypatch.setattr(scraper, "PRODUCT_RETRIES", 1)
+    scraper.start_trace()
+
+    def paginas(n):
+        return [{"page": Pagina(t), "capture": None, "tag": t, "preparado": t == "main"}
+                for t in ["main"] + [f"w{i + 1}" for i in range(n - 1)]]
+    return paginas, eventos, falhas
+
+
+class Requisicao:
+    def sizes(self):
+        return {"responseBodySize": 100, "responseHeadersSize": 0}
+
+
+def fila_de(*nomes):
+    fila = queue.Queue()
+    for item in enumerate(nomes):
+        fila.put(item)
+    return fila
+
+
+def test_filters_are_applied_on_every_page_before_waiting(scraper, fake_pages):
+    paginas, eventos, _ = fake_pages
+    resultados = [None] * 4
+    scraper.drain_products(paginas(2), fila_de("a", "bb", "ccc", "dddd"), resultados)
+    assert resultados == [1.0, 2.0, 3.0, 4.0]
+    # rodada: os dois filtros saem antes da primeira leitura
+    primeira_leitura = next(i for i, e in enumerate(eventos) if e[0] == "le")
+    assert {e[1] for e in eventos[:primeira_leitura] if e[0] == "aplica"} == {"main", "w1"}
+    # a principal já estava pronta; a extra prepara uma vez só
+    assert [e for e in eventos if e[0] == "prepara"] == [("prepara", "w1")]
+
+
+def test_failed_product_is_retried_after_reload(scraper, fake_pages):
+    paginas, eventos, falhas = fake_pages
+    falhas.update({"bb": 1, "ccc": 5})
+    resultados = [None] * 3
+    lista = paginas(2)
+    scraper.drain_products(lista, fila_de("a", "bb", "ccc"), resultados)
+    # "bb" falha uma vez e passa na nova tentativa; "ccc" esgota PRODUCT_RETRIES
+    assert resultados == [1.0, 2.0, None]
+    assert sum(e[2] == "ccc" for e in eventos if e[0] == "aplica") == 2
+    assert sum(p["page"].preparos for p in lista) >= 2
+
+
+def test_product_spans_count_only_their_own_page(scraper, fake_pages):
+    paginas, _, _ = fake_pages
+    scraper.drain_products(paginas(3), fila_de("a", "bb", "ccc"), [None] * 3)
+    spans = [s for s in scraper.TRACE.spans if s["name"].startswith("produto:")]
+    assert sorted(s["worker"] for s in spans) == ["main", "w1", "w2"]
+    # spans abertos ao mesmo tempo não somam as requisições das outras páginas
+    assert all(s["requests"] == 1 and s["bytes"] == 100 for s in spans)
+    assert scraper.TRACE.requests == 3
+
+
+def test_parallel_pages_match_the_mock(scraper, browser_page, monkeypatch):
+    bench = pytest.importorskip("bench_assiny")
+    for nome in ("ASSINY_URL", "API_BASE_URL", "STORAGE_STATE_FILE", "FETCH_ENGINE", "COLLECT_MODE",
+                 "BROWSER_PROFILE", "STATE_FILE", "CAPTURE_MODE", "PRODUCT_CONCURRENCY", "PRODUTOS",
+                 "PRODUCT_PATTERNS", "DATE_ORIGIN", "EXTRA_RANGES", "PLAYWRIGHT_TRACE_MODE", "SELECTORS"):
+        monkeypatch.setattr(scraper, nome, getattr(scraper, nome))
+    rel = bench.run_benchmark(runs=1, capture="dom", concurrency=3)
+    assert rel["all_correct"], rel["runs"]
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import subprocess
+
+import pytest
+
+
+def test_webhook_posts_batch_with_idempotency_keys(scraper, stub_server):
+    servidor = stub_server(lambda req: (200, {"ok": True}))
+    itens = [{"key": "default:abc", "account": "default", "snapshot": {"total": 1.0}}]
+
+    assert scraper.WebhookSink(servidor.url + "/hook").publish(itens)
+
+    req = servidor.requests[0]
+    assert req["method"] == "POST" and req["path"] == "/hook"
+    assert json.loads(req["body"]) == {
+        "items": [{"idempotency_key": "default:abc", "account": "default", "snapshot": {"total": 1.0}}]
+    }
+    assert req["headers"]["Idempotency-Key"] == hashlib.md5(b"default:abc").hexdigest()
+
+
+def test_webhook_conflict_means_already_received(scraper, stub_server):
+    servidor = stub_server(lambda req: (409, {"error": "duplicate"}))
+    assert scraper.WebhookSink(servidor.url).publish([{"key": "k", "account": "a", "snapshot": {}}])
+
+
+def test_publisher_keeps_batch_until_webhook_accepts(scraper, stub_server, monkeypatch):
+    monkeypatch.setattr(scraper, "PUBLISH_RETRIES", 1)
+    estado = {"status": 500}
+    servidor = stub_server(lambda req: (estado["status"], {}))
+    publisher = scraper.Publisher(
+        [scraper.WebhookSink(servidor.url)], batch_size=10, queue_file="state/publish_queue.jsonl"
+    )
+    try:
+        publisher.submit({"timestamp": "t1", "total": 1.0}, [])
+        publisher.submit({"timestamp": "t2", "total": 2.0}, [])
+        publisher.flush()
+        assert len(publisher.pendentes) == 2
+
+        estado["status"] = 200
+        publisher.flush()
+        assert publisher.pendentes == []
+        assert json.loads(servidor.requests[-1]["body"])["items"][1]["snapshot"]["total"] == 2.0
+    finally:
+        publisher.close()
+    # a fila em disco acompanha a memória
+    assert open("state/publish_queue.jsonl").read() == ""
+
+
+def _git(cwd, *args):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def git_clone(tmp_path, monkeypatch):
+    remoto = tmp_path / "remote.git"
+    clone = tmp_path / "clone"
+    _git(tmp_path, "init", "-q", "--bare", "-b", "main", str(remoto))
+    _git(tmp_path, "clone", "-q", str(remoto), str(clone))
+    _git(clone, "checkout", "-q", "-b", "main")
+    _git(clone, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "--allow-empty", "-m", "init")
+    _git(clone, "push", "-q", "origin", "main")
+    monkeypatch.chdir(clone)
+    return remoto, clone
+
+
+def _remote_log(remoto):
+    return subprocess.run(["git", "log", "--format=%s", "main"], cwd=remoto,
+                          capture_output=True, text=True).stdout.split("\n")
+
+
+def test_git_publish_pushes_commit_left_by_failed_push(scraper, git_clone):
+    remoto, clone = git_clone
+    (clone / "valor.csv").write_text("x\n")
+    # tentativa anterior: commit feito, push falhou
+    _git(clone, "add", "valor.csv")
+    _git(clone, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "pendente")
+
+    assert scraper.git_publish(["valor.csv"], "nada novo")
+    assert _remote_log(remoto)[0] == "pendente"
+
+
+def test_git_publish_commits_and_pushes_changes(scraper, git_clone):
+    remoto, clone = git_clone
+    (clone / "valor.csv").write_text("y\n")
+    assert scraper.git_publish(["valor.csv"], "lote")
+    assert _remote_log(remoto)[0] == "lote"
+    # nada novo e nada sem push: sucesso sem commit
+    assert scraper.git_publish(["valor.csv"], "vazio")
+    assert _remote_log(remoto)[0] == "lote"
@@ -0,0 +1,116 @@
+import math
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+BRASILIA = timezone(timedelta(hours=-3))
+
+
+def snap(quando, total, **produtos):
+    return {"timestamp": quando, "total": total, **produtos}
+
+
+@pytest.fixture
+def historico(scraper, monkeypatch):
+    """Store SQLite com deltas: só os campos que mudaram são gravados em cada instante."""
+    monkeypatch.setattr(scraper, "PRODUTOS", ["A", "B"])
+    monkeypatch.setattr(scraper, "STORE_BACKEND", "sqlite")
+    monkeypatch.setattr(scraper, "_SERIES_CACHE", {})
+    scraper.ensure_dirs()
+
+    def gravar(quando, total, campos=None, **produtos):
+        with scraper.open_store() as store:
+            store.append_snapshot(snap(quando, total, **produtos), campos=campos)
+
+    gravar("18/10/2026 - 10:00", 100.0, prod_1=10.0, prod_2=20.0)
+    gravar("18/10/2026 - 11:00", 110.0, campos=["total", "prod_1"], prod_1=15.0)
+    gravar("18/10/2026 - 11:30", 130.0, campos=["total"])
+    gravar("19/10/2026 - 09:00", 160.0, campos=["total", "prod_2"], prod_2=30.0)
+    return scraper, gravar
+
+
+def horario(txt):
+    return datetime.strptime(txt, "%d/%m/%Y %H:%M").replace(tzinfo=BRASILIA)
+
+
+def linhas(resultado):
+    return [(r["timestamp"][:16], *[r[n] for n in resultado.names]) for r in resultado.rows()]
+
+
+def test_values_are_forward_filled_between_deltas(historico):
+    scraper, _ = historico
+    resultado = scraper.query_series(["total", "prod_1", "prod_2"])
+    assert resultado.names == ["total", "A", "B"]
+    assert linhas(resultado) == [
+        ("2026-10-18T10:00", 100.0, 10.0, 20.0),
+        ("2026-10-18T11:00", 110.0, 15.0, 20.0),
+        ("2026-10-18T11:30", 130.0, 15.0, 20.0),
+        ("2026-10-19T09:00", 160.0, 15.0, 30.0),
+    ]
+
+
+def test_start_end_select_half_open_interval(historico):
+    scraper, _ = historico
+    resultado = scraper.query_series(["total"], start=horario("18/10/2026 11:00"), end=horario("19/10/2026 09:00"))
+    assert linhas(resultado) == [("2026-10-18T11:00", 110.0), ("2026-10-18T11:30", 130.0)]
+
+
+def test_hourly_and_daily_buckets_keep_last_value(historico):
+    scraper, _ = historico
+    assert linhas(scraper.query_series(["total"], freq="hourly")) == [
+        ("2026-10-18T10:00", 100.0), ("2026-10-18T11:00", 130.0), ("2026-10-19T09:00", 160.0),
+    ]
+    # dias alinhados à meia-noite de Brasília, não de UTC
+    assert linhas(scraper.query_series(["total", "prod_2"], freq="daily")) == [
+        ("2026-10-18T00:00", 130.0, 20.0), ("2026-10-19T00:00", 160.0, 30.0),
+    ]
+
+
+def test_delta_and_rate(historico):
+    scraper, _ = historico
+    delta = scraper.query_series(["total"], freq="daily", metric="delta").rows()
+    assert delta[0]["total"] is None and delta[1]["total"] == 30.0
+    # R$/hora entre pontos: +10 em 1h, +20 em 30min
+    rate = scraper.query_series(["total"], end=horario("19/10/2026 00:00"), metric="rate").rows()
+    assert [r["total"] for r in rate] == [None, 10.0, 40.0]
+    with pytest.raises(ValueError):
+        scraper.query_series(metric="media")
+
+
+def test_rolling_waits_for_a_full_window(scraper):
+    valores = np.array([[1.0], [2.0], [np.nan], [4.0], [5.0], [6.0]])
+    media = scraper.rolling(valores, 2)[:, 0]
+    assert math.isnan(media[0]) and media[1] == 1.5
+    # janela com lacuna não vira média de meia janela
+    assert math.isnan(media[2]) and math.isnan(media[3])
+    assert list(media[4:]) == [4.5, 5.5]
+    assert list(scraper.rolling(valores, 3, soma=True)[5:, 0]) == [15.0]
+
+
+def test_resample_last_on_empty_input(scraper):
+    ts, valores = scraper.resample_last(np.empty(0, dtype=np.int64), np.empty((0, 1)), 3600)
+    assert len(ts) == 0 and valores.shape == (0, 1)
+
+
+def test_index_refresh_reads_only_new_rows(historico):
+    scraper, gravar = historico
+    indice = scraper.series_index()
+    assert len(indice.ts) == 4
+    gravar("19/10/2026 - 10:00", 170.0, campos=["total", "prod_1"], prod_1=18.0)
+    resultado = scraper.query_series(["prod_1", "prod_2"])
+    # mesmo índice em cache, com a linha nova e o valor de B propagado
+    assert scraper.series_index() is indice and len(indice.ts) == 5
+    assert linhas(resultado)[-1] == ("2026-10-19T10:00", 18.0, 30.0)
+
+
+def test_csv_source_follows_appended_lines(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "PRODUTOS", ["A"])
+    monkeypatch.setattr(scraper, "_SERIES_CACHE", {})
+    with open(scraper.OUTPUT_CSV, "w", encoding="utf-8") as f:
+        f.write("DataHoraGMT-3,Valor Total,A\n18/10/2026 - 10:00,100.0,10.0\n")
+    assert linhas(scraper.query_series(source="csv")) == [("2026-10-18T10:00", 100.0, 10.0)]
+    with open(scraper.OUTPUT_CSV, "a", encoding="utf-8") as f:
+        f.write("18/10/2026 - 11:00,120.0,12.0\n")
+    assert linhas(scraper.query_series(source="csv"))[-1] == ("2026-10-18T11:00", 120.0, 12.0)
@@ -0,0 +1,78 @@
+from datetime import date
+
+import pytest
+
+HOJE = date(2026, 3, 15)
+
+
+@pytest.fixture
+def periodos(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "DATE_ORIGIN", "2025-01-01")
+    return scraper
+
+
+@pytest.mark.parametrize("nome, esperado", [
+    ("all_time", (date(2025, 1, 1), HOJE)),
+    ("today", (HOJE, HOJE)),
+    ("yesterday", (date(2026, 3, 14), date(2026, 3, 14))),
+    ("last_7d", (date(2026, 3, 9), HOJE)),
+    ("last_30d", (date(2026, 2, 14), HOJE)),
+    ("month_to_date", (date(2026, 3, 1), HOJE)),
+    ("year_to_date", (date(2026, 1, 1), HOJE)),
+    ("2026-02-01:2026-02-28", (date(2026, 2, 1), date(2026, 2, 28))),
+])
+def test_named_and_explicit_ranges(periodos, nome, esperado):
+    assert periodos.resolve_range(nome, HOJE) == esperado
+
+
+def test_ranges_are_clamped_at_origin(periodos, monkeypatch):
+    monkeypatch.setattr(periodos, "DATE_ORIGIN", "2026-03-10")
+    assert periodos.resolve_range("last_30d", HOJE) == (date(2026, 3, 10), HOJE)
+    assert periodos.resolve_range("year_to_date", HOJE) == (date(2026, 3, 10), HOJE)
+    assert periodos.resolve_range("2026-01-01:2026-03-12", HOJE) == (date(2026, 3, 10), date(2026, 3, 12))
+    with pytest.raises(ValueError, match="vazio"):
+        periodos.resolve_range("2026-01-01:2026-02-01", HOJE)
+    with pytest.raises(ValueError, match="desconhecido"):
+        periodos.resolve_range("last_week", HOJE)
+
+
+D1, D2, D3 = date(2026, 3, 1), date(2026, 3, 10), date(2026, 3, 20)
+
+
+@pytest.mark.parametrize("dia, atual, esperado", [
+    (D2, (None, None), (D2, None)),
+    (D3, (D2, None), (D2, D3)),
+    (D1, (D2, None), (D1, D2)),
+    (D2, (D2, None), (D2, D2)),
+    (D1, (D2, D3), (D1, D3)),        # antes do início: estende para trás
+    (D3, (D1, D2), (D1, D3)),        # depois do fim: estende para frente
+    (D2, (D1, D3), (D1, D2)),        # no meio: vira o novo fim
+    (D1, (D1, D3), (None, None)),    # no início: limpa
+    (D3, (D1, D3), (D3, None)),      # no fim: recomeça dali
+    (D2, (D2, D2), (None, None)),
+])
+def test_rdp_add_to_range(periodos, dia, atual, esperado):
+    assert periodos.rdp_add_to_range(dia, *atual) == esperado
+
+
+def aplicar(scraper, cliques, atual):
+    de, ate = atual
+    for dia in cliques:
+        de, ate = scraper.rdp_add_to_range(dia, de, ate)
+    return de, ate
+
+
+@pytest.mark.parametrize("alvo, atual, n_cliques", [
+    ((D1, D3), (None, None), 2),
+    ((D1, D3), (date(2026, 1, 1), D3), 2),    # início avança: clicar dentro só move o fim
+    ((D1, D3), (date(2026, 3, 5), D3), 1),    # início recua: um clique antes estende
+    ((D1, D3), (D1, D2), 1),                  # mesmo início: só o novo fim
+    ((D1, D3), (D2, D3), 1),
+    ((D1, D3), (D1, D3), 2),                  # já selecionado: reseleciona
+    ((D2, D2), (D1, D3), 3),                  # um dia só dentro da seleção atual
+    ((D2, D2), (None, None), 2),
+])
+def test_plan_range_clicks_from_current_selection(periodos, alvo, atual, n_cliques):
+    cliques = periodos.plan_range_clicks(*alvo, atual)
+    assert len(cliques) == n_cliques
+    assert aplicar(periodos, cliques, atual) == alvo
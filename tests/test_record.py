@@ -0,0 +1,26 @@
+from pathlib import Path
+
+
+def snap(minuto, total, **extras):
+    return {"timestamp": f"18/10/2026 - 10:{minuto:02d}", "total": total, "prod_1": 5.0, **extras}
+
+
+def linhas_csv(scraper):
+    return Path(scraper.OUTPUT_CSV).read_text(encoding="utf-8").splitlines()[1:]
+
+
+def test_period_only_change_writes_no_csv_row(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "PRODUTOS", ["A"])
+    assert scraper.record_snapshot_csv(snap(0, 10.0, total_today=1.0)) is True
+    # só o total do dia mudou: não é coluna do CSV, a linha sairia idêntica
+    assert scraper.record_snapshot_csv(snap(5, 10.0, total_today=2.0)) is False
+    assert len(linhas_csv(scraper)) == 1
+    assert scraper.record_snapshot_csv(snap(10, 11.0, total_today=2.0)) is True
+    assert len(linhas_csv(scraper)) == 2
+
+
+def test_changed_fields_limited_to_columns(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "PRODUTOS", ["A"])
+    anterior, atual = snap(0, 10.0, total_today=1.0), snap(5, 10.0, total_today=2.0)
+    assert scraper.changed_fields(anterior, atual) == ["total_today"]
+    assert scraper.changed_fields(anterior, atual, campos=scraper.csv_fields()) == []
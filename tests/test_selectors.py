@@ -0,0 +1,68 @@
+import json
+
+
+class Pagina:
+    """Página falsa: só os seletores em `presentes` existem (e estão visíveis)."""
+
+    def __init__(self, presentes):
+        self.presentes = set(presentes)
+
+    def locator(self, seletor):
+        pagina = self
+
+        class Locator:
+            first = None
+
+            def count(self):
+                return int(seletor in pagina.presentes)
+
+            def is_visible(self):
+                return seletor in pagina.presentes
+
+        loc = Locator()
+        loc.first = loc
+        return loc
+
+
+def registry(scraper, tmp_path):
+    return scraper.SelectorRegistry(scraper.SELECTOR_STRATEGIES, str(tmp_path / "selectors.json"))
+
+
+def test_specific_strategy_is_cached(scraper, tmp_path):
+    reg = registry(scraper, tmp_path)
+    alternativa = scraper.SELECTOR_STRATEGIES["apply_filters"][1]
+    assert reg.find(Pagina([alternativa]), "apply_filters") == alternativa
+    assert json.loads((tmp_path / "selectors.json").read_text())["apply_filters"] == alternativa
+    assert registry(scraper, tmp_path).get("apply_filters") == alternativa
+
+
+def test_generic_fallback_is_used_but_never_cached(scraper, tmp_path):
+    reg = registry(scraper, tmp_path)
+    fallback = scraper.SELECTOR_FALLBACKS["apply_filters"][0]
+    assert reg.ranked("apply_filters")[-1] == fallback
+    assert reg.find(Pagina([fallback]), "apply_filters") == fallback
+    assert not (tmp_path / "selectors.json").exists()
+    # próxima execução não começa pelo fallback
+    assert registry(scraper, tmp_path).get("apply_filters") != fallback
+
+
+def test_fallbacks_are_scoped_to_their_container(scraper):
+    for nome, seletores in scraper.SELECTOR_FALLBACKS.items():
+        for seletor in seletores:
+            assert " >> " in seletor, nome
+    # nenhum seletor de href solto sobrou nas estratégias
+    assert not any(s.startswith("a[href") for lista in scraper.SELECTOR_STRATEGIES.values() for s in lista)
+
+
+def test_cache_tmp_is_per_process(scraper, tmp_path, monkeypatch):
+    escritos = []
+    original = scraper.Path.write_text
+
+    def espia(self, *args, **kwargs):
+        escritos.append(self.name)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(scraper.Path, "write_text", espia)
+    reg = registry(scraper, tmp_path)
+    reg.find(Pagina([scraper.SELECTOR_STRATEGIES["open_filters"][1]]), "open_filters")
+    assert escritos == [f"selectors.{scraper.os.getpid()}.tmp"]
@@ -0,0 +1,63 @@
+import base64
+import json
+import time
+
+
+def jwt(exp):
+    corpo = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).rstrip(b"=").decode()
+    return f"eyJhbGciOiJIUzI1NiJ9.{corpo}.assinatura"
+
+
+def cookie(nome, valor, expires=-1):
+    return {"name": nome, "value": valor, "domain": "admin.assiny.com.br", "path": "/", "expires": expires}
+
+
+def test_expiry_read_from_token_cookie_jwt(scraper):
+    exp = int(time.time()) + 3600
+    estado = {"cookies": [cookie("token", jwt(exp)), cookie("_ga", "x", time.time() + 10**7)], "origins": []}
+    assert scraper.session_expiry(estado) == exp
+
+
+def test_refresh_token_bounds_the_session(scraper):
+    curto, longo = int(time.time()) + 600, int(time.time()) + 30 * 86400
+    estado = {"cookies": [cookie("token", jwt(curto)), cookie("refreshToken", jwt(longo))], "origins": []}
+    assert scraper.session_expiry(estado) == longo
+
+
+def test_save_session_skips_unchanged_cookies(scraper):
+    estado = {"cookies": [cookie("token", jwt(int(time.time()) + 3600))], "origins": []}
+    assert scraper.save_session(estado) is True
+    # mesmo token, só cookies de terceiros mudaram: nada regravado
+    outro = {**estado, "cookies": estado["cookies"] + [cookie("_ga", "novo")]}
+    assert scraper.save_session(outro) is False
+    assert len(list(scraper.session_cache_dir().glob("*.json"))) == 1
+    renovado = {"cookies": [cookie("token", jwt(int(time.time()) + 7200))], "origins": []}
+    assert scraper.save_session(renovado) is True
+    assert len(list(scraper.session_cache_dir().glob("*.json"))) == 2
+
+
+def test_session_cookie_outlives_short_access_token(scraper, capsys):
+    # formato do google_login.json: token Firebase de 1h (cookie do navegador),
+    # refreshToken opaco e o cookie `session` do servidor com data própria
+    agora = time.time()
+    sessao = agora + 7 * 86400
+    estado = {"cookies": [
+        cookie("session", jwt(int(sessao)), sessao),
+        cookie("token", jwt(int(agora) - 3600)),
+        cookie("refreshToken", "AMf-vBx_opaco"),
+        cookie("firebaseUserId", "uid", sessao),
+    ], "origins": []}
+    assert scraper.session_expiry(estado) == sessao
+    scraper.save_session(estado)
+    assert scraper.ensure_session() is True
+    assert "[INFO] Sessão válida" in capsys.readouterr().out
+
+
+def test_past_or_unknown_expiry_only_warns(scraper, capsys):
+    vencido = {"cookies": [cookie("token", jwt(int(time.time()) - 60))], "origins": []}
+    scraper.save_session(vencido)
+    assert scraper.ensure_session() is True
+    assert "[WARN] Sessão" in capsys.readouterr().out
+    scraper.save_session({"cookies": [cookie("sid", "opaco")], "origins": []})
+    assert scraper.ensure_session() is True
+    assert "desconhecida" in capsys.readouterr().out
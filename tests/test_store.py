@@ -0,0 +1,54 @@
+import pytest
+
+
+def snap(minuto, total, **produtos):
+    return {"timestamp": f"18/10/2026 - 10:{minuto:02d}", "total": total, **produtos}
+
+
+def test_store_interface_is_abstract(scraper):
+    with pytest.raises(TypeError):
+        scraper.SnapshotStore()
+
+
+def test_sqlite_latest_merges_deltas(scraper, tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper, "PRODUTOS", ["A", "B"])
+    with scraper.SQLiteStore(str(tmp_path / "s.db")) as store:
+        store.append_snapshot(snap(0, 10.0, prod_1=4.0, prod_2=6.0))
+        store.append_snapshot(snap(5, 12.0, prod_1=6.0), campos=["total", "prod_1"])
+        ultimo = store.latest_snapshot()
+    assert ultimo == snap(5, 12.0, prod_1=6.0, prod_2=6.0)
+
+
+@pytest.fixture
+def parquet(scraper, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(scraper, "PRODUTOS", ["A", "B"])
+    return lambda **kw: scraper.ParquetStore(str(tmp_path / "pq"), **kw)
+
+
+def test_parquet_compacts_small_parts(parquet, tmp_path):
+    # uma gravação por execução, como no cron
+    for minuto in range(7):
+        with parquet(compact_files=4) as store:
+            store.append_snapshot(snap(minuto, 10.0 + minuto, prod_1=1.0 + minuto))
+    partes = sorted((tmp_path / "pq").glob("*.parquet"))
+    assert len(partes) <= 4
+    with parquet() as store:
+        linhas = store.query()
+    assert len(linhas) == 7 * 2
+    assert [r[3] for r in linhas if r[2] == "A"] == [1.0 + m for m in range(7)]
+
+
+def test_parquet_latest_from_sidecar_matches_scan(parquet, tmp_path):
+    with parquet() as store:
+        store.append_snapshot(snap(0, 10.0, prod_1=4.0, prod_2=6.0))
+    with parquet() as store:
+        store.append_snapshot(snap(5, 12.0, prod_1=6.0), campos=["total", "prod_1"])
+    assert (tmp_path / "pq" / "latest.json").exists()
+    with parquet() as store:
+        assert store.latest_snapshot() == snap(5, 12.0, prod_1=6.0, prod_2=6.0)
+    # sidecar perdido (dataset antigo): reconstruído do dataset
+    (tmp_path / "pq" / "latest.json").unlink()
+    with parquet() as store:
+        assert store.latest_snapshot() == snap(5, 12.0, prod_1=6.0, prod_2=6.0)
+    assert (tmp_path / "pq" / "latest.json").exists()
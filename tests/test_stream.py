@@ -0,0 +1,18 @@
+import json
+import sys
+
+
+def test_stdout_stream_moves_logs_to_stderr(scraper, capfd):
+    anterior = sys.stdout
+    scraper.configure_stream("stdout")
+    try:
+        print("[INFO] log da coleta")
+        scraper.emit_snapshot({"timestamp": "18/10/2026 - 10:00", "total": 12.5}, True)
+    finally:
+        scraper.configure_stream("")
+    assert sys.stdout is anterior
+    saida, erros = capfd.readouterr()
+    linhas = saida.splitlines()
+    assert len(linhas) == 1
+    assert json.loads(linhas[0])["values"] == {"total": 12.5}
+    assert "[INFO] log da coleta" in erros
@@ -0,0 +1,58 @@
+import json
+
+
+class Requisicao:
+    def __init__(self, sizes=None, headers=None):
+        self._sizes = sizes
+        self._headers = headers or {}
+
+    def sizes(self):
+        if self._sizes is None:
+            raise RuntimeError("sizes indisponível")
+        return self._sizes
+
+    def response(self):
+        requisicao = self
+
+        class Resposta:
+            headers = requisicao._headers
+        return Resposta()
+
+
+def test_chunked_response_counted_from_measured_sizes(scraper):
+    trace = scraper.RunTrace()
+    # resposta chunked: sem content-length, mas o navegador mediu o corpo
+    trace.count_request(Requisicao({"responseBodySize": 48_000, "responseHeadersSize": 300}))
+    assert trace.requests == 1
+    assert trace.bytes == 48_300
+
+
+def test_falls_back_to_content_length(scraper):
+    trace = scraper.RunTrace()
+    trace.count_request(Requisicao(headers={"content-length": "1200"}))
+    trace.count_request(Requisicao({"responseBodySize": -1, "responseHeadersSize": -1}))
+    assert trace.requests == 2
+    assert trace.bytes == 1200
+
+
+def test_playwright_trace_off_by_default(scraper):
+    assert scraper.PLAYWRIGHT_TRACE_MODE == "off"
+    assert scraper.playwright_har_options() == {}
+
+
+def test_blocked_requests_counted_by_type_without_byte_guess(scraper, tmp_path):
+    trace = scraper.RunTrace()
+    for tipo in ("image", "image", "font"):
+        trace.count_blocked(tipo)
+    registro = trace.finish(path=str(tmp_path / "traces.jsonl"))
+    assert registro["blocked_requests"] == 3
+    assert registro["blocked_by_type"] == {"image": 2, "font": 1}
+    assert "blocked_bytes_est" not in registro
+
+
+def test_trace_file_keeps_only_recent_runs(scraper, tmp_path, monkeypatch):
+    monkeypatch.setattr(scraper, "TRACE_KEEP_RUNS", 3)
+    caminho = str(tmp_path / "traces.jsonl")
+    ids = [scraper.RunTrace().finish(path=caminho)["run_id"] for _ in range(5)]
+    with open(caminho, encoding="utf-8") as f:
+        assert [json.loads(l)["run_id"] for l in f] == ids[-3:]
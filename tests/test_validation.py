@@ -0,0 +1,16 @@
+def test_fresh_checkout_seeds_baseline_from_last_snapshot(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "PRODUTOS", ["A"])
+    monkeypatch.setattr(scraper, "STORE_BACKEND", "csv")
+    scraper.ensure_dirs()
+    scraper.save_snapshot({"timestamp": "01/10/2026 - 10:00", "total": 3166165.66, "prod_1": 100.0})
+
+    validador = scraper.SnapshotValidator()
+    assert validador.ultimos == {"total": 3166165.66, "prod_1": 100.0}
+    assert validador.check({"total": 2576295.1, "prod_1": 100.0})["total"][0] == "queda"
+
+
+def test_validation_state_is_published(scraper, monkeypatch):
+    monkeypatch.setattr(scraper, "STORE_BACKEND", "csv")
+    assert str(scraper.validation_state_file()) in scraper.snapshot_files()
+    monkeypatch.setattr(scraper, "VALIDATION_ENABLED", False)
+    assert str(scraper.validation_state_file()) not in scraper.snapshot_files()
@@ -0,0 +1,53 @@
+import time
+
+PAGINA = b"""<html><body>
+<div id="card">R$ 10,00</div>
+<button id="filtro" onclick="aplicar()">Filtrar</button>
+<script>
+async function aplicar() {
+  const r = await fetch("/api/transactions/summary");
+  const j = await r.json();
+  setTimeout(() => { document.getElementById("card").textContent = j.texto; }, 50);
+}
+</script></body></html>"""
+
+
+def servidor_card(stub_server, texto):
+    def responder(req):
+        if req["path"] == "/":
+            return 200, PAGINA, "text/html"
+        return 200, {"texto": texto}
+    return stub_server(responder)
+
+
+def abrir(scraper, browser_page, servidor):
+    browser_page.add_init_script(scraper.JS_REDE_INIT)
+    browser_page.goto(servidor.url + "/")
+    marca = scraper.network_mark(browser_page)
+    browser_page.click("#filtro")
+    return marca
+
+
+def test_same_value_settles_on_network_signal(scraper, stub_server, browser_page):
+    marca = abrir(scraper, browser_page, servidor_card(stub_server, "R$ 10,00"))
+    inicio = time.monotonic()
+    txt = scraper.wait_for_valor_atualizado(browser_page, "#card", timeout_ms=5000,
+                                            anterior="R$ 10,00", marca=marca)
+    assert txt == "R$ 10,00"
+    assert time.monotonic() - inicio < 2
+
+
+def test_new_value_is_returned(scraper, stub_server, browser_page):
+    marca = abrir(scraper, browser_page, servidor_card(stub_server, "R$ 25,50"))
+    assert scraper.wait_for_valor_atualizado(browser_page, "#card", timeout_ms=5000,
+                                             anterior="R$ 10,00", marca=marca) == "R$ 25,50"
+
+
+def test_no_response_returns_none_not_old_text(scraper, stub_server, browser_page):
+    servidor = servidor_card(stub_server, "R$ 10,00")
+    browser_page.add_init_script(scraper.JS_REDE_INIT)
+    browser_page.goto(servidor.url + "/")
+    marca = scraper.network_mark(browser_page)
+    # filtro não aplicado: nada muda e nenhuma requisição sai
+    assert scraper.wait_for_valor_atualizado(browser_page, "#card", timeout_ms=800,
+                                             anterior="R$ 10,00", marca=marca) is None